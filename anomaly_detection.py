@@ -0,0 +1,250 @@
+import argparse
+import logging
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from data_collector import initialize_db, MarketBar, MBBCoupon, QuarantinedBar, BAR_COLUMNS
+from storage import session_scope
+
+logger = logging.getLogger(__name__)
+
+# Trailing bars behind each robust baseline (one session of 1m bars)
+ANOMALY_WINDOW = int(os.getenv('ANOMALY_WINDOW', 390))
+# Robust z-score beyond which a return, range or volume is anomalous
+ANOMALY_Z_THRESHOLD = float(os.getenv('ANOMALY_Z_THRESHOLD', 8))
+# Consecutive flat, unchanged bars before a price is considered stale
+ANOMALY_STALE_BARS = int(os.getenv('ANOMALY_STALE_BARS', 30))
+# Share of a spike the next bar must give back for it to count as spike-and-revert
+ANOMALY_REVERT_FRACTION = float(os.getenv('ANOMALY_REVERT_FRACTION', 0.75))
+
+# MAD -> standard deviation for normally distributed data
+MAD_SCALE = 1.4826
+
+SCORE_COLUMNS = ['timestamp', 'return_z', 'range_z', 'volume_z', 'stale', 'spike_revert', 'reasons', 'score',
+                 'anomalous']
+
+
+def _trailing_medians(values, window, min_periods, stride):
+    """
+    Median of the window values before each position, evaluated every stride positions
+
+    Positions between two evaluation points reuse the earlier one's median,
+    so the baseline lags by less than stride bars; NaNs are ignored.
+    """
+    anchors = np.arange(0, len(values), stride)
+    padded = np.concatenate((np.full(window, np.nan), values))
+    # windows[i] holds values[i - window:i], the window that ends just before position i
+    windows = np.lib.stride_tricks.sliding_window_view(padded, window)[anchors]
+    counts = np.count_nonzero(~np.isnan(windows), axis=1)
+    # Sorting puts NaNs last, so each row's median sits in its first counts values;
+    # much faster than np.nanmedian on wide arrays
+    ordered = np.sort(windows, axis=1)
+    lower = np.take_along_axis(ordered, np.maximum(counts - 1, 0)[:, None] // 2, axis=1)[:, 0]
+    upper = np.take_along_axis(ordered, counts[:, None] // 2 - (counts[:, None] == 0), axis=1)[:, 0]
+    medians = np.where(counts >= min_periods, (lower + upper) / 2, np.nan)
+    return np.repeat(medians, stride)[:len(values)]
+
+
+def robust_zscores(values, window=ANOMALY_WINDOW, stride=None):
+    """
+    Rolling robust z-scores against the trailing window (the current value excluded)
+
+    The baseline is the trailing median and the spread the trailing median
+    of earlier values' absolute deviations from their baselines, scaled to a
+    standard deviation. Both are evaluated every stride bars (default: a
+    tenth of the window) rather than at every bar, which keeps a multi-year
+    minute history to a few vectorized medians. Where the spread is zero
+    the score is NaN.
+
+    Args:
+        values: Series to score
+        window: Trailing values behind each baseline
+        stride: Bars between baseline evaluations
+
+    Returns:
+        Series of z-scores aligned with values
+    """
+    stride = stride or max(window // 10, 1)
+    min_periods = max(window // 4, 5)
+    data = values.to_numpy(dtype=float)
+    if len(data) == 0:
+        return pd.Series(np.nan, index=values.index)
+    deviation = data - _trailing_medians(data, window, min_periods, stride)
+    spread = _trailing_medians(np.abs(deviation), window, min_periods, stride) * MAD_SCALE
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = np.where(spread > 0, deviation / spread, np.nan)
+    return pd.Series(scores, index=values.index)
+
+
+def _run_lengths(flags):
+    """Length of the run of True values each element belongs to (0 where False)"""
+    flags = np.asarray(flags, dtype=bool)
+    if not flags.any():
+        return np.zeros(len(flags), dtype=int)
+    run_id = np.cumsum(np.concatenate(([True], flags[1:] != flags[:-1])))
+    lengths = np.bincount(run_id)[run_id]
+    return np.where(flags, lengths, 0)
+
+
+def detect_anomalies(bars, window=ANOMALY_WINDOW, z_threshold=ANOMALY_Z_THRESHOLD, stale_bars=ANOMALY_STALE_BARS,
+                     revert_fraction=ANOMALY_REVERT_FRACTION):
+    """
+    Score every bar of a history in one vectorized pass
+
+    Daily bars (stamped at midnight) and intraday bars are scored as
+    separate series; intraday returns never span the overnight break.
+
+    Args:
+        bars: DataFrame with BAR_COLUMNS (see data_collector.frame_to_bars)
+        window: Trailing bars behind each robust baseline
+        z_threshold: Robust z-score beyond which a bar is anomalous
+        stale_bars: Consecutive flat, unchanged bars that make a price stale
+        revert_fraction: Share of a spike the next bar must give back
+
+    Returns:
+        DataFrame with SCORE_COLUMNS, one row per bar in timestamp order;
+        reasons is a comma-separated subset of return, range, volume, stale
+        and spike_revert
+    """
+    if bars is None or bars.empty:
+        return pd.DataFrame(columns=SCORE_COLUMNS)
+
+    bars = bars.sort_values('timestamp').reset_index(drop=True)
+    timestamps = pd.DatetimeIndex(bars['timestamp'])
+    days = timestamps.to_numpy().astype('datetime64[D]')
+    at_midnight = timestamps.to_numpy() == days
+    if at_midnight.any() and not at_midnight.all():
+        parts = [bars[at_midnight], bars[~at_midnight]]
+        scored = [detect_anomalies(part, window, z_threshold, stale_bars, revert_fraction) for part in parts]
+        return pd.concat(scored).sort_values('timestamp', kind='stable').reset_index(drop=True)
+
+    close, high, low = (bars[col].astype(float) for col in ('close', 'high', 'low'))
+    volume = bars['volume'].astype(float)
+    returns = np.log(close.where(close > 0)).diff()
+    if not at_midnight.all():
+        # The first bar of each session would otherwise carry the overnight move
+        returns[np.concatenate(([True], days[1:] != days[:-1]))] = np.nan
+
+    return_z = robust_zscores(returns, window)
+    range_z = robust_zscores(np.log(high.where(high > 0) / low.where(low > 0)), window)
+    # Indices and yields report no volume
+    volume_z = robust_zscores(np.log1p(volume), window) if (volume > 0).any() else pd.Series(np.nan, index=bars.index)
+
+    big_move = (return_z.abs() > z_threshold).to_numpy()
+    next_return = returns.shift(-1).to_numpy()
+    spike_revert = big_move & (np.sign(next_return) == -np.sign(returns.to_numpy())) & (
+        np.abs(next_return) >= revert_fraction * np.abs(returns.to_numpy())
+    )
+    # The bar that reverts a spike is returning to normal, not a new anomaly
+    reverting = np.concatenate(([False], spike_revert[:-1]))
+    flat = ((close.diff() == 0) & (high == low)).to_numpy()
+    stale = _run_lengths(flat) >= stale_bars
+
+    checks = {
+        'return': big_move & ~spike_revert & ~reverting,
+        'range': (range_z > z_threshold).to_numpy(),
+        'volume': (volume_z > z_threshold).to_numpy(),
+        'stale': stale,
+        'spike_revert': spike_revert
+    }
+    reasons = np.full(len(bars), '', dtype=object)
+    for name, hit in checks.items():
+        reasons[hit] = np.where(reasons[hit] == '', name, reasons[hit] + ',' + name)
+
+    scores = pd.DataFrame({
+        'timestamp': timestamps,
+        'return_z': return_z.to_numpy(),
+        'range_z': range_z.to_numpy(),
+        'volume_z': volume_z.to_numpy(),
+        'stale': stale,
+        'spike_revert': spike_revert,
+        'reasons': reasons
+    })
+    scores['score'] = np.fmax(scores['return_z'].abs(), np.fmax(scores['range_z'], scores['volume_z'])).fillna(0.0)
+    scores['anomalous'] = scores['reasons'] != ''
+    return scores
+
+
+def _load_bars(session, ticker, since=None, context=ANOMALY_WINDOW):
+    """Stored bars from since onward, plus the context bars before it that the baselines need"""
+    model = MBBCoupon if ticker == 'MBB' else MarketBar
+    columns = [getattr(model, col) for col in BAR_COLUMNS]
+
+    def query():
+        q = session.query(*columns)
+        return q.filter(MarketBar.ticker == ticker) if model is MarketBar else q
+
+    rows = []
+    if since is not None:
+        rows = query().filter(model.timestamp < since).order_by(model.timestamp.desc()).limit(context).all()[::-1]
+        rows += query().filter(model.timestamp >= since).order_by(model.timestamp).all()
+    else:
+        rows = query().order_by(model.timestamp).all()
+    bars = pd.DataFrame(rows, columns=BAR_COLUMNS)
+    bars['timestamp'] = pd.to_datetime(bars['timestamp'])
+    return bars
+
+
+def scan(ticker, since=None, db_path=None, **options):
+    """
+    Score stored bars and refresh the quarantine for the scanned range
+
+    Quarantine rows in the range are replaced, so bars that no longer look
+    anomalous (e.g. after a corrected refetch) are released.
+
+    Args:
+        ticker: Instrument to scan (MBB reads mbb_coupons, others market_bars)
+        since: Only rescore bars from this timestamp on (default: full history)
+        db_path: Database file (default: MBB_DB_PATH)
+        **options: Passed to detect_anomalies
+
+    Returns:
+        Number of bars quarantined in the scanned range
+    """
+    initialize_db(db_path)
+    with session_scope(db_path) as session:
+        bars = _load_bars(session, ticker, since, options.get('window', ANOMALY_WINDOW))
+        scores = detect_anomalies(bars, **options)
+        if since is not None:
+            scores = scores[scores['timestamp'] >= pd.Timestamp(since)]
+        if scores.empty:
+            return 0
+
+        session.query(QuarantinedBar).filter(
+            QuarantinedBar.ticker == ticker,
+            QuarantinedBar.timestamp >= scores['timestamp'].iloc[0].to_pydatetime()
+        ).delete(synchronize_session=False)
+
+        flagged = scores[scores['anomalous']]
+        detected_at = datetime.now()
+        rows = [
+            {'ticker': ticker, 'timestamp': timestamp.to_pydatetime(), 'reasons': reasons,
+             'score': float(score), 'detected_at': detected_at}
+            for timestamp, reasons, score in zip(flagged['timestamp'], flagged['reasons'], flagged['score'])
+        ]
+        for start in range(0, len(rows), 500):
+            statement = sqlite_insert(QuarantinedBar.__table__).values(rows[start:start + 500])
+            session.execute(statement.on_conflict_do_update(
+                index_elements=['ticker', 'timestamp'],
+                set_={col: statement.excluded[col] for col in ('reasons', 'score', 'detected_at')}
+            ))
+
+    if rows:
+        logger.warning(f"Quarantined {len(rows)} of {len(scores)} scanned {ticker} bars")
+    return len(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score stored bars and quarantine anomalies")
+    parser.add_argument('--ticker', action='append', help="Instrument to scan (repeatable; default: MBB)")
+    parser.add_argument('--since', help="Only rescore bars from this date on")
+    parser.add_argument('--db', help="Database file (default: MBB_DB_PATH)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    for ticker in args.ticker or ['MBB']:
+        print(f"{ticker}: {scan(ticker, since=args.since, db_path=args.db)} bars quarantined")
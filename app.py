@@ -1,37 +1,156 @@
-from flask import Flask, render_template, jsonify, request, Response
-from sqlalchemy import create_engine, text, desc
-from sqlalchemy.orm import sessionmaker
-from data_collector import initialize_db, MBBCoupon
+import time
+_import_started = time.perf_counter()
+
+from flask import Flask, Blueprint, render_template, jsonify, request, Response, current_app
+from data_collector import initialize_db
 from calculations import calculate_roi, calculate_monthly_payment
-from visualization import BuydownVisualizer
-import pandas as pd
+from market_snapshot import get_snapshot
+from profiling import init_profiling
+from storage import init_app as init_storage, get_scoped_session
 from datetime import datetime, timedelta
 import io
-import csv
 import logging
 
+# Heavy dependencies (pandas, matplotlib via visualization, yfinance via the
+# collector) are imported on first use so workers and CLI scripts boot fast
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
+_import_seconds = time.perf_counter() - _import_started
+
+bp = Blueprint('main', __name__)
+
+# Request-scoped session registry; removed on app-context teardown (see create_app)
+Session = get_scoped_session()
+
+# CSV export columns and their headers, in output order
+EXPORT_COLUMNS = {
+    'timestamp': 'Timestamp',
+    'open': 'Open',
+    'high': 'High',
+    'low': 'Low',
+    'close': 'Close',
+    'volume': 'Volume',
+    'implied_rate': 'Implied Rate',
+}
+
+_visualizer = None
+
+def get_visualizer():
+    """Return the shared BuydownVisualizer, creating it on first use"""
+    global _visualizer
+    if _visualizer is None:
+        from visualization import BuydownVisualizer
+        _visualizer = BuydownVisualizer()
+    return _visualizer
+
+def include_quarantined():
+    """Whether the request asked for quarantined bars too (?include_quarantined=true)"""
+    return request.args.get('include_quarantined', 'false').lower() in ('1', 'true', 'yes')
+
+def read_mbb_bars(start=None, columns=None):
+    """
+    MBB bars for read endpoints, from the memory-mapped price cache (see price_cache)
+
+    Quarantined bars are left out unless ?include_quarantined=true.
+
+    Returns:
+        BarSeries (see bar_series)
+    """
+    from price_cache import read_cached_bars
+    return read_cached_bars('MBB', start=start, columns=columns, include_quarantined=include_quarantined(),
+                            session=Session)
+
+def read_mbb_series(start, end=None, max_resolution=None):
+    """
+    MBB bars with implied rates, or the coarsest rollup that still resolves the range
+
+    Args:
+        start: Range start
+        end: Range end (default: now)
+        max_resolution: Widest rollup bucket the caller can use (see rollups.choose_resolution)
+
+    Returns:
+        (resolution, series): the rollup used ('raw' for bars) and a BarSeries
+        with OHLCV columns (rollups also carry their precomputed implied rates)
+    """
+    from bar_series import BarSeries
+    from price_cache import read_cached_bars
+    from rollups import choose_resolution, covers_range, read_rollups
+    resolution = None if include_quarantined() else choose_resolution(start, end, max_resolution=max_resolution)
+    if resolution is not None:
+        rollup = read_rollups('MBB', resolution, start, end, session=Session)
+        # Fall back to bars until the rollups have been built (see rollups.py), and over
+        # daily-only stretches that hourly buckets leave out
+        if covers_range('MBB', resolution, rollup, start, end, session=Session):
+            return resolution, BarSeries.from_frame(rollup)
+    return 'raw', read_cached_bars('MBB', start=start, end=end, include_quarantined=include_quarantined(),
+                                   session=Session)
+
+def create_app():
+    """
+    Application factory: build the Flask app and initialize the database
+
+    Per-phase timings are logged as a startup report and kept in
+    app.config['STARTUP_TIMINGS'] (also served at /admin/startup).
+    """
+    timings = {'imports': _import_seconds}
+
+    t0 = time.perf_counter()
+    app = Flask(__name__)
+    app.register_blueprint(bp)
+    timings['flask_app'] = time.perf_counter() - t0
+
+    # Opt-in per-request profiling (gated by PROFILING_ENABLED)
+    t0 = time.perf_counter()
+    init_profiling(app)
+    timings['profiling'] = time.perf_counter() - t0
+
+    # Initialize database; sessions are scoped to the request and removed on teardown
+    t0 = time.perf_counter()
+    initialize_db()
+    init_storage(app)
+    timings['database'] = time.perf_counter() - t0
+
+    timings['total'] = sum(timings.values())
+    app.config['STARTUP_TIMINGS'] = timings
 
-# Initialize database
-engine = initialize_db()
-Session = sessionmaker(bind=engine)
+    report = ', '.join(f"{phase}={seconds * 1000:.1f}ms" for phase, seconds in timings.items())
+    logger.info(f"Startup timing report: {report}")
+    return app
 
-# Initialize visualizer
-visualizer = BuydownVisualizer()
+_app = None
 
-@app.route('/')
+def __getattr__(name):
+    # Keep `app:app` (gunicorn, flask run) working without building the app at import time
+    global _app
+    if name == 'app':
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+@bp.route('/admin/startup')
+def startup_report():
+    return jsonify(current_app.config.get('STARTUP_TIMINGS', {}))
+
+@bp.route('/admin/rate_limits')
+def rate_limit_report():
+    # Collectors run in their own processes and publish their limiter metrics to files
+    from rate_limiter import read_published_metrics
+    return jsonify(read_published_metrics())
+
+@bp.route('/')
 def home():
     return render_template('index.html')
 
-@app.route('/dashboard')
+@bp.route('/dashboard')
 def dashboard():
     return render_template('dashboard.html')
 
-@app.route('/api/mbb_data')
+@bp.route('/api/mbb_data')
 def get_mbb_data():
     try:
         # Get time range from query parameter
@@ -52,57 +171,44 @@ def get_mbb_data():
         else:
             start_date = end_date - timedelta(days=1)
         
-        # Query database
-        session = Session()
-        data = session.query(MBBCoupon).filter(
-            MBBCoupon.timestamp >= start_date
-        ).order_by(MBBCoupon.timestamp).all()
-        session.close()
-        
-        # Format data for charts
-        timestamps = [entry.timestamp.isoformat() for entry in data]
-        prices = [entry.close for entry in data]
-        volumes = [entry.volume for entry in data]
+        # Query database; long ranges read a precomputed rollup instead of every bar
+        resolution, series = read_mbb_series(start_date, end_date)
         
-        # Calculate implied rates
-        rates = [calculate_implied_rate(price) for price in prices]
+        # Format data for charts (whole columns at a time)
+        columns = series.to_dict(['timestamp', 'close', 'volume'])
+        rates = series.implied_rates().tolist()
         
         # Format full data for table
-        full_data = [{
-            'timestamp': entry.timestamp.isoformat(),
-            'open': entry.open,
-            'high': entry.high,
-            'low': entry.low,
-            'close': entry.close,
-            'volume': entry.volume
-        } for entry in data]
+        full_data = series.records(['timestamp', 'open', 'high', 'low', 'close', 'volume'])
         
         return jsonify({
-            'timestamps': timestamps,
-            'prices': prices,
-            'volumes': volumes,
+            'timestamps': columns['timestamp'],
+            'prices': columns['close'],
+            'volumes': columns['volume'],
             'rates': rates,
-            'full_data': full_data
+            'full_data': full_data,
+            'resolution': resolution
         })
     except Exception as e:
         logger.error(f"Error fetching MBB data: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/charts/roi_vs_coupon')
+@bp.route('/api/charts/roi_vs_coupon')
 def get_roi_vs_coupon_chart():
     try:
+        import pandas as pd
+        visualizer = get_visualizer()
+        
         # Get date parameter
         date_str = request.args.get('date')
         date = pd.to_datetime(date_str) if date_str else None
         
         # Query database for data
-        session = Session()
-        data = session.query(MBBCoupon).all()
-        session.close()
+        series = read_mbb_bars(columns=['close'])
         
         # Convert to DataFrame
-        df = pd.DataFrame([(d.close, calculate_roi(d.close)) for d in data],
-                         columns=['original_rate', 'roi'])
+        closes = series.close.tolist()
+        df = pd.DataFrame({'original_rate': closes, 'roi': [calculate_roi(close) for close in closes]})
         
         # Generate chart
         fig = visualizer.plot_roi_vs_coupon(df, date=date)
@@ -115,20 +221,25 @@ def get_roi_vs_coupon_chart():
         logger.error(f"Error generating ROI vs Coupon chart: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/charts/roi_vs_time')
+@bp.route('/api/charts/roi_vs_time')
 def get_roi_vs_time_chart():
     try:
+        import pandas as pd
+        visualizer = get_visualizer()
+        
         # Get rate parameter
         rate = request.args.get('rate', type=float)
         
         # Query database for data
-        session = Session()
-        data = session.query(MBBCoupon).all()
-        session.close()
+        series = read_mbb_bars(columns=['close'])
         
         # Convert to DataFrame
-        df = pd.DataFrame([(d.timestamp, d.close, calculate_roi(d.close)) for d in data],
-                         columns=['date', 'original_rate', 'roi'])
+        closes = series.close.tolist()
+        df = pd.DataFrame({
+            'date': series.timestamp,
+            'original_rate': closes,
+            'roi': [calculate_roi(close) for close in closes]
+        })
         
         # Generate chart
         fig = visualizer.plot_roi_vs_time(df, rate=rate)
@@ -141,21 +252,26 @@ def get_roi_vs_time_chart():
         logger.error(f"Error generating ROI vs Time chart: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/charts/cost_effectiveness')
+@bp.route('/api/charts/cost_effectiveness')
 def get_cost_effectiveness_chart():
     try:
+        import pandas as pd
+        visualizer = get_visualizer()
+        
         # Get parameters
         metric = request.args.get('metric', 'buydown_cost')
         rate = request.args.get('rate', type=float)
         
         # Query database for data
-        session = Session()
-        data = session.query(MBBCoupon).all()
-        session.close()
+        series = read_mbb_bars(columns=['close'])
         
         # Convert to DataFrame
-        df = pd.DataFrame([(d.timestamp, d.close, calculate_roi(d.close)) for d in data],
-                         columns=['date', 'original_rate', 'roi'])
+        closes = series.close.tolist()
+        df = pd.DataFrame({
+            'date': series.timestamp,
+            'original_rate': closes,
+            'roi': [calculate_roi(close) for close in closes]
+        })
         
         # Add cost metrics
         df['buydown_cost'] = df['original_rate'] * 1000  # Example calculation
@@ -172,7 +288,7 @@ def get_cost_effectiveness_chart():
         logger.error(f"Error generating Cost Effectiveness chart: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/roi/<float:loan_amount>/<float:original_rate>/<float:buydown_rate>')
+@bp.route('/api/roi/<float:loan_amount>/<float:original_rate>/<float:buydown_rate>')
 def get_roi(loan_amount, original_rate, buydown_rate):
     try:
         # Get loan term from query parameter (default to 30 years)
@@ -203,7 +319,7 @@ def get_roi(loan_amount, original_rate, buydown_rate):
         logger.error(f"Error calculating ROI: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/query', methods=['POST'])
+@bp.route('/api/query', methods=['POST'])
 def process_query():
     try:
         query = request.json.get('query', '')
@@ -217,7 +333,7 @@ def process_query():
         logger.error(f"Error processing query: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/export_data')
+@bp.route('/api/export_data')
 def export_data():
     try:
         # Get time range from query parameter
@@ -239,31 +355,15 @@ def export_data():
             start_date = end_date - timedelta(days=30)
         
         # Query database
-        session = Session()
-        data = session.query(MBBCoupon).filter(
-            MBBCoupon.timestamp >= start_date
-        ).order_by(MBBCoupon.timestamp).all()
-        session.close()
+        series = read_mbb_bars(start_date)
+        frame = series.to_frame()
+        frame['implied_rate'] = series.implied_rates()
         
         # Create CSV in memory
         output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # Write header
-        writer.writerow(['Timestamp', 'Open', 'High', 'Low', 'Close', 'Volume', 'Implied Rate'])
-        
-        # Write data
-        for entry in data:
-            implied_rate = calculate_implied_rate(entry.close)
-            writer.writerow([
-                entry.timestamp,
-                entry.open,
-                entry.high,
-                entry.low,
-                entry.close,
-                entry.volume,
-                implied_rate
-            ])
+        frame[list(EXPORT_COLUMNS)].rename(columns=EXPORT_COLUMNS).to_csv(
+            output, index=False, lineterminator='\r\n'
+        )
         
         # Prepare response
         output.seek(0)
@@ -287,48 +387,70 @@ def calculate_monthly_payment(loan_amount, annual_rate, loan_term_years):
     payment = (monthly_rate * loan_amount) / (1 - (1 + monthly_rate) ** -loan_term_months)
     return payment
 
-# Add this function definition after the imports and before the app initialization
-def calculate_implied_rate(price):
-    """Calculate implied interest rate from MBS price
-    
-    Args:
-        price: MBS price (e.g., 95.5)
-        
-    Returns:
-        Implied interest rate as a percentage
-    """
-    # Simple conversion model: higher price = lower rate
-    if price <= 0:
-        return 0
-    implied_rate = 100 / price * 6  # Simple conversion model
-    return implied_rate
-
 def process_natural_language_query(query):
     # Placeholder for NLP processing
     # This will be implemented with more sophisticated NLP in nlu_queries.py
     query = query.lower()
     
     if 'current rate' in query or 'latest rate' in query:
-        session = Session()
-        latest = session.query(MBBCoupon).order_by(desc(MBBCoupon.timestamp)).first()
-        session.close()
+        # Served from the in-memory snapshot, no database round trip
+        latest = get_snapshot()
         
         if latest:
-            rate = calculate_implied_rate(latest.close)
-            return f"The current implied mortgage rate is {rate}% based on the latest MBB price of ${latest.close:.2f}."
+            return f"The current implied mortgage rate is {latest.implied_rate}% based on the latest MBB price of ${latest.close:.2f}."
     
     if 'breakeven' in query or 'break even' in query:
         return "The breakeven period is calculated by dividing the buydown cost by the monthly payment savings. You can use our calculator on the home page to get a personalized breakeven analysis."
     
     return "I'm sorry, I don't have enough information to answer that question yet. Please try a different query or check back later as our natural language capabilities are being enhanced."
 
-@app.route('/chat')
+@bp.route('/api/snapshot')
+def get_market_snapshot():
+    snapshot = get_snapshot()
+    if snapshot is None:
+        return jsonify({'error': 'No market data available'}), 404
+    return jsonify(snapshot.to_dict())
+
+@bp.route('/api/correlations')
+def get_reference_correlations():
+    """
+    Rolling MBB daily-return correlations with ^MORT and Treasury yields
+
+    Query params: window and reference narrow the result; days > 0 adds
+    that many calendar days of history per returned series.
+    """
+    try:
+        # Imported here so the web app doesn't pay for the validator at startup
+        from correlation_tracker import get_tracker
+        
+        tracker = get_tracker()
+        window = request.args.get('window', type=int)
+        reference = request.args.get('reference')
+        days = request.args.get('days', 0, type=int)
+        
+        latest = tracker.latest(window=window, reference=reference)
+        if days > 0:
+            start = datetime.now() - timedelta(days=days)
+            for row in latest:
+                row['history'] = [
+                    {'date': point['date'], 'correlation': point['correlation']}
+                    for point in tracker.history(row['reference'], row['window'], start)
+                ]
+        return jsonify({'ticker': tracker.ticker, 'windows': tracker.windows, 'correlations': latest})
+    except Exception as e:
+        logger.error(f"Error fetching reference correlations: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/chat')
 def chat():
     return render_template('chat.html')
 
-@app.route('/api/payback_comparison')
+@bp.route('/api/payback_comparison')
 def get_payback_comparison():
     try:
+        import pandas as pd
+        visualizer = get_visualizer()
+        
         # Get time range from query parameter (default to 1 month)
         time_range = request.args.get('range', '1m')
         loan_amount = float(request.args.get('loan_amount', 300000))
@@ -348,24 +470,15 @@ def get_payback_comparison():
         else:
             start_date = end_date - timedelta(days=30)
         
-        # Query database
-        session = Session()
-        data = session.query(MBBCoupon).filter(
-            MBBCoupon.timestamp >= start_date
-        ).order_by(MBBCoupon.timestamp).all()
-        session.close()
-        
-        # Format data for analysis
-        formatted_data = []
-        for entry in data:
-            formatted_data.append({
-                'date': entry.timestamp,
-                'original_rate': calculate_implied_rate(entry.close),
-                'original_price': entry.close
-            })
+        # Query database; pairs need several implied rates per day, so at most hourly rollups
+        resolution, series = read_mbb_series(start_date, end_date, max_resolution='1h')
         
-        # Convert to DataFrame
-        df = pd.DataFrame(formatted_data)
+        # Format data for analysis: implied rates (decimal) grouped by trading day
+        df = pd.DataFrame({
+            'date': series.timestamp.astype('datetime64[D]').astype('datetime64[ns]'),
+            'original_rate': series.implied_rates() / 100,
+            'original_price': series.close
+        })
         
         # Prepare data for payback period comparison
         payback_data = visualizer.prepare_payback_data(df, loan_amount=loan_amount)
@@ -385,18 +498,17 @@ def get_payback_comparison():
         one_point_values = [float(v) for v in one_point_avg['payback_years_1pt'].values]
         two_point_values = [float(v) for v in two_point_avg['payback_years_2pt'].values]
         
-        # Get deal quality metrics
-        good_deals = payback_data[payback_data['deal_quality'] == 'Good'].to_dict('records')
-        bad_deals = payback_data[payback_data['deal_quality'] == 'Bad'].to_dict('records')
+        # Top 5 good deals (shortest 1-point payback) via partial selection
+        good_deals = visualizer.select_top_deals(payback_data, k=5)
         
         # Format deals for response
         good_deals_formatted = [{
-            'from_rate': f"{d['original_rate']*100:.2f}%",
-            'to_rate': f"{d['target_rate']*100:.2f}%",
-            'points': 1 if d['buydown_cost_1pt'] == loan_amount * 0.01 else 2,
-            'reduction': f"{d['rate_reduction_1pt']/100:.2f}%",
-            'payback': f"{d['payback_years_1pt']:.1f} years"
-        } for d in good_deals[:5]]  # Top 5 good deals
+            'from_rate': f"{d.original_rate*100:.2f}%",
+            'to_rate': f"{d.target_rate*100:.2f}%",
+            'points': 1 if d.buydown_cost_1pt == loan_amount * 0.01 else 2,
+            'reduction': f"{d.rate_reduction_1pt/100:.2f}%",  # basis points -> percentage points
+            'payback': f"{d.payback_years_1pt:.1f} years"
+        } for d in good_deals.itertuples(index=False)]
         
         return jsonify({
             'dates': dates,
@@ -413,7 +525,7 @@ def get_payback_comparison():
 # Add this new route to handle ROI calculations
 # Around line 413
 # Change the function name to avoid the conflict
-@app.route('/api/roi/<int:loan_amount>/<float:current_rate>/<float:buydown_amount>', methods=['GET'])
+@bp.route('/api/roi/<int:loan_amount>/<float:current_rate>/<float:buydown_amount>', methods=['GET'])
 def calculate_roi_endpoint(loan_amount, current_rate, buydown_amount):
     term = request.args.get('term', default=30, type=int)
     
@@ -448,4 +560,4 @@ def calculate_roi_endpoint(loan_amount, current_rate, buydown_amount):
     })
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=True)
\ No newline at end of file
@@ -0,0 +1,187 @@
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from check_mbb_data import daily_bar_stats
+from data_collector import initialize_db
+from data_sources import get_bar_source
+from instrument_collector import default_rate_limiter, store_bars, COLLECTOR_MAX_WORKERS
+from market_calendar import trading_days
+from storage import session_scope
+
+logger = logging.getLogger(__name__)
+
+# Present sessions between two gaps that are cheaper to refetch than to split a window
+BACKFILL_BRIDGE_SESSIONS = int(os.getenv('BACKFILL_BRIDGE_SESSIONS', 2))
+
+# Longest window (in sessions) a single request may cover for a given bar size;
+# Yahoo only serves 1m bars in 7-day requests and other intraday sizes within 60 days
+MAX_WINDOW_SESSIONS = {'1m': 5, '2m': 40, '5m': 40, '15m': 40, '30m': 40, '60m': 500, '1h': 500}
+
+
+def find_missing_sessions(counts, start, end, min_bars=1):
+    """
+    Find trading sessions with no (or too few) stored bars
+
+    Args:
+        counts: Series of bar counts per day (the 'bars' column of daily_bar_stats)
+        start: First session to check
+        end: Last session to check
+        min_bars: Sessions with fewer bars than this count as missing
+
+    Returns:
+        DatetimeIndex of missing session dates
+    """
+    sessions = trading_days(start, end)
+    present = counts.reindex(sessions, fill_value=0).to_numpy()
+    return sessions[present < min_bars]
+
+
+def plan_fetch_windows(missing, start, end, max_window_sessions=None, bridge_sessions=BACKFILL_BRIDGE_SESSIONS):
+    """
+    Merge missing sessions into the fewest contiguous fetch windows
+
+    Consecutive missing sessions always share a window; windows separated by
+    at most ``bridge_sessions`` already-present sessions are merged as well,
+    as long as the result stays within ``max_window_sessions``.
+
+    Args:
+        missing: DatetimeIndex of missing sessions (see find_missing_sessions)
+        start: First session of the checked range
+        end: Last session of the checked range
+        max_window_sessions: Upper bound on sessions per window (None = unbounded)
+        bridge_sessions: Largest run of present sessions to refetch to join two windows
+
+    Returns:
+        List of (start, end) date pairs; end is exclusive, as fetchers expect
+    """
+    if len(missing) == 0:
+        return []
+
+    sessions = trading_days(start, end)
+    # Position of every missing session in the trading calendar
+    positions = sessions.get_indexer(missing)
+    positions = positions[positions >= 0]
+    positions.sort()
+
+    windows = []
+    first = last = positions[0]
+    for pos in positions[1:]:
+        gap = pos - last - 1
+        too_long = max_window_sessions is not None and pos - first + 1 > max_window_sessions
+        if gap <= bridge_sessions and not too_long:
+            last = pos
+        else:
+            windows.append((first, last))
+            first = last = pos
+    windows.append((first, last))
+
+    return [
+        (sessions[first].date(), (sessions[last] + timedelta(days=1)).date())
+        for first, last in windows
+    ]
+
+
+def backfill(ticker='MBB', interval='1d', start=None, end=None, min_bars=1, fetcher=None, rate_limiter=None,
+             max_workers=COLLECTOR_MAX_WORKERS, db_path=None, dry_run=False):
+    """
+    Heal gaps in a ticker's stored history
+
+    Missing sessions are found with one aggregate query, merged into the
+    fewest fetch windows, fetched concurrently and bulk-upserted.
+
+    Args:
+        ticker: Instrument to heal
+        interval: Bar size to fetch
+        start: First session to check (default: first stored bar)
+        end: Last session to check (default: today)
+        min_bars: Sessions with fewer stored bars count as missing
+        fetcher: DataSource (default: configured bar source)
+        rate_limiter: Shared per-host limiter (default: process-wide)
+        max_workers: Thread pool size
+        db_path: Database file (default: MBB_DB_PATH)
+        dry_run: Only plan, don't fetch
+
+    Returns:
+        dict with the planned windows, missing session count and upsert totals
+    """
+    fetcher = fetcher or get_bar_source()
+    rate_limiter = rate_limiter or default_rate_limiter
+    initialize_db(db_path)
+
+    with session_scope(db_path) as session:
+        counts = daily_bar_stats(session, ticker)['bars']
+
+    if start is None:
+        if counts.empty:
+            logger.warning(f"No stored bars for {ticker}; nothing to backfill (pass start to seed a range)")
+            return {'windows': [], 'missing_sessions': 0, 'inserted': 0, 'updated': 0, 'skipped': 0}
+        start = counts.index[0]
+    end = end or datetime.now().date()
+
+    missing = find_missing_sessions(counts, start, end, min_bars=min_bars)
+    windows = plan_fetch_windows(missing, start, end, max_window_sessions=MAX_WINDOW_SESSIONS.get(interval))
+    logger.info(f"{ticker}: {len(missing)} missing sessions between {pd.Timestamp(start).date()} and {end}, "
+                f"planned {len(windows)} fetch windows")
+
+    summary = {'windows': windows, 'missing_sessions': len(missing), 'inserted': 0, 'updated': 0, 'skipped': 0}
+    if dry_run or not windows:
+        return summary
+
+    def fetch_window(window):
+        rate_limiter.acquire(fetcher.host)
+        return fetcher.fetch(ticker, interval=interval, start=window[0].isoformat(), end=window[1].isoformat())
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='backfill') as pool:
+        futures = {pool.submit(fetch_window, window): window for window in windows}
+        # Writes stay on this thread so SQLite only sees one writer
+        for future in as_completed(futures):
+            window = futures[future]
+            try:
+                hist_data = future.result()
+                if hist_data is None or hist_data.empty:
+                    logger.warning(f"No data returned for {ticker} {window[0]} - {window[1]}")
+                    continue
+                for key, value in store_bars(ticker, hist_data, db_path=db_path).items():
+                    summary[key] += value
+            except Exception as e:
+                logger.error(f"Error backfilling {ticker} {window[0]} - {window[1]}: {str(e)}")
+
+    logger.info(f"Backfilled {ticker} in {time.perf_counter() - started:.2f}s: {summary['inserted']} inserted, "
+                f"{summary['updated']} updated, {summary['skipped']} skipped")
+
+    if summary['inserted'] or summary['updated']:
+        from price_cache import cache_stored_bars
+        cache_stored_bars(ticker, since=min(window[0] for window in windows), db_path=db_path)
+        from rollups import roll_up_stored_bars
+        roll_up_stored_bars(ticker, min(window[0] for window in windows), max(window[1] for window in windows),
+                            db_path=db_path)
+
+    if ticker == 'MBB' and (summary['inserted'] or summary['updated']):
+        # Publish the new latest bar to in-process readers
+        from market_snapshot import refresh_snapshot
+        refresh_snapshot()
+
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fill gaps in stored bar history")
+    parser.add_argument('--ticker', default='MBB')
+    parser.add_argument('--interval', default='1d')
+    parser.add_argument('--start', help="First session to check (default: first stored bar)")
+    parser.add_argument('--end', help="Last session to check (default: today)")
+    parser.add_argument('--min-bars', type=int, default=1, help="Sessions with fewer bars count as missing")
+    parser.add_argument('--dry-run', action='store_true', help="Print the plan without fetching")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    result = backfill(args.ticker, args.interval, args.start, args.end, args.min_bars, dry_run=args.dry_run)
+    for window_start, window_end in result['windows']:
+        print(f"  {window_start} -> {window_end}")
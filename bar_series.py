@@ -0,0 +1,90 @@
+import numpy as np
+
+from calculations import calculate_implied_rate
+
+# Columns a series can carry; timestamp is datetime64[ns], the rest float64
+SERIES_COLUMNS = ('timestamp', 'open', 'high', 'low', 'close', 'volume', 'implied_rate')
+
+
+class BarSeries:
+    """
+    Bars as one array per column (struct of arrays) instead of one object per bar
+
+    Columns that were not loaded are None. Slicing, window() and column
+    access return views of the same arrays (for the price cache, of the
+    memory-mapped files), so nothing is copied until a caller converts the
+    series to pandas or JSON, and those conversions run over whole columns.
+    """
+
+    __slots__ = SERIES_COLUMNS
+
+    def __init__(self, timestamp, open=None, high=None, low=None, close=None, volume=None, implied_rate=None):
+        """
+        Args:
+            timestamp: datetime64 array (stored exchange wall-clock time), ascending
+            open, high, low, close, volume: Column arrays aligned with timestamp
+            implied_rate: Precomputed implied rates (e.g. from a rollup); see implied_rates()
+        """
+        self.timestamp = np.asarray(timestamp).astype('datetime64[ns]', copy=False)
+        for column, values in zip(SERIES_COLUMNS[1:], (open, high, low, close, volume, implied_rate)):
+            setattr(self, column, np.asarray(values, dtype='float64') if values is not None else None)
+
+    @classmethod
+    def from_frame(cls, frame):
+        """Series over a DataFrame's columns (see data_collector.BAR_COLUMNS)"""
+        return cls(frame['timestamp'].to_numpy(), **{
+            column: frame[column].to_numpy() for column in SERIES_COLUMNS[1:] if column in frame
+        })
+
+    @property
+    def columns(self):
+        """Names of the loaded columns, timestamp first"""
+        return [column for column in SERIES_COLUMNS if getattr(self, column) is not None]
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    def __getitem__(self, index):
+        """Slices give a series of views; boolean or integer arrays give a (copied) selection"""
+        if isinstance(index, (int, np.integer)):
+            raise TypeError("BarSeries is indexed by slices or masks; use records() for single bars")
+        return BarSeries(**{column: getattr(self, column)[index] for column in self.columns})
+
+    def window(self, start=None, end=None):
+        """View of the bars in [start, end), found by binary search on the timestamps"""
+        i = int(np.searchsorted(self.timestamp, np.datetime64(start, 'ns'), 'left')) if start is not None else 0
+        j = int(np.searchsorted(self.timestamp, np.datetime64(end, 'ns'), 'left')) if end is not None else len(self)
+        return self[i:max(i, j)]
+
+    def implied_rates(self):
+        """Implied rate per bar (calculations.calculate_implied_rate over the close column)"""
+        if self.implied_rate is None:
+            self.implied_rate = calculate_implied_rate(self.close)
+        return self.implied_rate
+
+    def isoformat(self):
+        """Timestamps as ISO 8601 strings (second resolution)"""
+        return np.datetime_as_string(self.timestamp, unit='s').tolist()
+
+    def to_frame(self):
+        """DataFrame of the loaded columns (volume as integers, as stored)"""
+        import pandas as pd
+        frame = pd.DataFrame({column: getattr(self, column) for column in self.columns})
+        if 'volume' in frame:
+            frame['volume'] = frame['volume'].astype('int64')
+        return frame
+
+    def _json_column(self, column):
+        if column == 'timestamp':
+            return self.isoformat()
+        values = getattr(self, column)
+        return (values.astype('int64') if column == 'volume' else values).tolist()
+
+    def to_dict(self, columns=None):
+        """JSON-serializable dict of column name -> list"""
+        return {column: self._json_column(column) for column in (columns or self.columns)}
+
+    def records(self, columns=None):
+        """JSON-serializable list of one dict per bar"""
+        columns = columns or self.columns
+        return [dict(zip(columns, row)) for row in zip(*(self._json_column(column) for column in columns))]
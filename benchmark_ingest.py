@@ -0,0 +1,100 @@
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+
+from data_collector import initialize_db, frame_to_bars
+from data_sources import set_data_source
+from data_validation import validate_volume, validate_price_variance, validate_time_continuity
+from instrument_collector import DEFAULT_INSTRUMENTS, fetch_instruments, write_bars
+from market_simulator import SimulatedMarketSource
+from rate_limiter import RateLimiter
+from storage import session_scope
+
+logger = logging.getLogger(__name__)
+
+
+def benchmark_instruments(scale):
+    """Production instrument list, padded with synthetic tickers to scale x its size"""
+    count = len(DEFAULT_INSTRUMENTS) * scale
+    synthetic = [f"SIM{i:04d}" for i in range(count - len(DEFAULT_INSTRUMENTS))]
+    return DEFAULT_INSTRUMENTS + synthetic
+
+
+def run_benchmark(scale=10, days=5, interval='1m', latency=0.0, max_workers=8, db_path=None, seed=0):
+    """
+    Time the fetch -> validate -> store path against the simulated feed
+
+    Production volume is one trading week of 1m bars for DEFAULT_INSTRUMENTS;
+    scale multiplies the number of instruments. Nothing touches the network.
+
+    Args:
+        scale: Instrument multiplier (10-100 for load tests)
+        days: Trading sessions of history per instrument
+        interval: Bar size
+        latency: Simulated seconds per upstream request
+        max_workers: Fetch thread pool size
+        db_path: Database file (default: a fresh temporary file)
+        seed: Simulator seed
+
+    Returns:
+        dict with bar counts and per-phase seconds and throughput
+    """
+    source = SimulatedMarketSource(seed=seed, latency=latency)
+    tickers = benchmark_instruments(scale)
+    db_path = db_path or os.path.join(tempfile.mkdtemp(), 'benchmark.db')
+    initialize_db(db_path)
+
+    set_data_source(source)
+    try:
+        timings = {}
+
+        started = time.perf_counter()
+        frames = fetch_instruments(tickers, fetcher=source, rate_limiter=RateLimiter(),
+                                   max_workers=max_workers, period=f"{days}d", interval=interval)
+        bars = {ticker: frame_to_bars(frame) for ticker, frame in frames.items() if frame is not None}
+        timings['fetch'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        failed = [
+            ticker for ticker, frame in bars.items()
+            if not (validate_volume(frame) and validate_price_variance(frame) and validate_time_continuity(frame))
+        ]
+        timings['validate'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        with session_scope(db_path) as session:
+            for ticker, frame in bars.items():
+                write_bars(session, ticker, frame)
+        timings['store'] = time.perf_counter() - started
+    finally:
+        set_data_source(None)
+
+    total_bars = sum(len(frame) for frame in bars.values())
+    timings['total'] = sum(timings.values())
+    return {
+        'instruments': len(tickers),
+        'bars': total_bars,
+        'failed_validation': failed,
+        'seconds': {phase: round(seconds, 4) for phase, seconds in timings.items()},
+        'bars_per_second': {
+            phase: round(total_bars / seconds) if seconds > 0 else None for phase, seconds in timings.items()
+        }
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark ingestion against the simulated market feed")
+    parser.add_argument('--scale', type=int, default=10, help="Multiple of the production instrument count")
+    parser.add_argument('--days', type=int, default=5, help="Trading sessions of history per instrument")
+    parser.add_argument('--interval', default='1m')
+    parser.add_argument('--latency', type=float, default=0.0, help="Simulated seconds per request")
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--db', help="Database file (default: temporary)")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    result = run_benchmark(args.scale, args.days, args.interval, args.latency, args.workers, args.db)
+    print(json.dumps(result, indent=2))
@@ -37,4 +37,28 @@ def calculate_roi(rate, loan_amount=300000, buydown_increment=0.25):
     annual_savings = monthly_savings * 12
     roi = (annual_savings / buydown_cost) * 100 if buydown_cost > 0 else 0
     
-    return roi
\ No newline at end of file
+    return roi
+
+def _price_to_rate(price):
+    # Simple conversion model: higher price = lower rate
+    return 100 / price * 6
+
+def calculate_implied_rate(price):
+    """Calculate implied interest rate from MBS price
+    
+    Args:
+        price: MBS price (e.g., 95.5), or a numpy array of prices (converted elementwise)
+        
+    Returns:
+        Implied interest rate as a percentage (0 for non-positive prices), or
+        an array of them
+    """
+    if hasattr(price, 'shape'):
+        # numpy is only needed by callers that already pass arrays
+        import numpy as np
+        price = np.asarray(price, dtype='float64')
+        with np.errstate(divide='ignore'):
+            return np.where(price > 0, _price_to_rate(price), 0.0)
+    if price <= 0:
+        return 0
+    return _price_to_rate(price)
\ No newline at end of file
@@ -1,74 +1,156 @@
-from data_collector import initialize_db, MBBCoupon
-from sqlalchemy.orm import sessionmaker
-from datetime import datetime, timedelta
-
-def check_data_status():
-    """Check the status of MBB data collection"""
-    # Initialize database connection
-    engine = initialize_db()
-    Session = sessionmaker(bind=engine)
-    session = Session()
-    
-    # Count total records
-    total_count = session.query(MBBCoupon).count()
-    print(f"Total MBB records in database: {total_count}")
-    
-    if total_count == 0:
+import argparse
+import json
+import sys
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import func, distinct
+
+from data_collector import initialize_db, MBBCoupon, MarketBar
+from market_calendar import trading_days
+from storage import session_scope
+
+
+def daily_bar_stats(session, ticker='MBB'):
+    """
+    Per-day bar statistics for a ticker in one GROUP BY query
+
+    Returns:
+        DataFrame indexed by date with 'bars' (row count), 'distinct' (distinct
+        timestamps), 'first' and 'last' bar times; empty when there is no data
+    """
+    model = MBBCoupon if ticker == 'MBB' else MarketBar
+    day = func.date(model.timestamp)
+    query = session.query(
+        day, func.count(), func.count(distinct(model.timestamp)), func.min(model.timestamp), func.max(model.timestamp)
+    )
+    if model is MarketBar:
+        query = query.filter(MarketBar.ticker == ticker)
+    rows = query.group_by(day).order_by(day).all()
+
+    stats = pd.DataFrame(rows, columns=['date', 'bars', 'distinct', 'first', 'last'])
+    stats.index = pd.DatetimeIndex(stats.pop('date'))
+    return stats
+
+
+def data_status(session, ticker='MBB', today=None, bars_per_session=None):
+    """
+    Summarize stored history: range, freshness, missing sessions, duplicates
+
+    Args:
+        session: SQLAlchemy session
+        ticker: Instrument to check (MBB reads mbb_coupons, others market_bars)
+        today: Reference date for staleness (default: today)
+        bars_per_session: Expected bars per trading day (default: the median
+                          stored count, i.e. 1 for daily bars)
+
+    Returns:
+        dict suitable for JSON output
+    """
+    stats = daily_bar_stats(session, ticker)
+    status = {'ticker': ticker, 'total_bars': int(stats['bars'].sum()) if not stats.empty else 0}
+    if stats.empty:
+        return status
+
+    today = pd.Timestamp(today or datetime.now().date()).normalize()
+    first_day, last_day = stats.index[0], stats.index[-1]
+    sessions = trading_days(first_day, last_day)
+
+    if bars_per_session is None:
+        bars_per_session = int(stats['bars'].median())
+    counts = stats['bars'].reindex(sessions, fill_value=0)
+
+    missing = sessions.difference(stats.index)
+    partial = counts[(counts > 0) & (counts < bars_per_session)]
+    duplicates = stats[stats['bars'] > stats['distinct']]
+    off_calendar = stats.index.difference(sessions)
+    behind = trading_days(last_day + pd.Timedelta(days=1), today - pd.Timedelta(days=1))
+
+    status.update({
+        'first_bar': stats['first'].iloc[0].isoformat(),
+        'last_bar': stats['last'].iloc[-1].isoformat(),
+        'trading_sessions': len(sessions),
+        'sessions_with_data': len(sessions) - len(missing),
+        'bars_per_session': bars_per_session,
+        # Completed sessions since the last stored bar (today may still be trading)
+        'sessions_behind': len(behind),
+        'missing_sessions': [d.date().isoformat() for d in missing],
+        'partial_sessions': {d.date().isoformat(): int(n) for d, n in partial.items()},
+        'duplicate_bars': {
+            d.date().isoformat(): int(row.bars - row.distinct) for d, row in duplicates.iterrows()
+        },
+        'non_trading_days_with_data': [d.date().isoformat() for d in off_calendar],
+        'daily_counts': {d.date().isoformat(): int(n) for d, n in stats['bars'].items()}
+    })
+    return status
+
+
+def _print_dates(label, dates, limit=10):
+    """Print the first few entries of a date list"""
+    print(f"Found {len(dates)} {label}:")
+    for date in list(dates)[:limit]:
+        print(f"  - {date}")
+    if len(dates) > limit:
+        print(f"  ... and {len(dates) - limit} more")
+
+
+def check_data_status(ticker='MBB', as_json=False, db_path=None):
+    """
+    Check the status of MBB data collection
+
+    Args:
+        ticker: Instrument to check
+        as_json: Print the full status as JSON (for monitoring) instead of a report
+        db_path: Database file (default: MBB_DB_PATH)
+
+    Returns:
+        Status dict (see data_status)
+    """
+    initialize_db(db_path)
+    with session_scope(db_path) as session:
+        status = data_status(session, ticker)
+
+    if as_json:
+        print(json.dumps(status, indent=2))
+        return status
+
+    print(f"Total {ticker} records in database: {status['total_bars']}")
+    if status['total_bars'] == 0:
         print("No data found. Run data_collector.py to populate the database.")
-        session.close()
-        return
-    
-    # Get date range
-    first = session.query(MBBCoupon).order_by(MBBCoupon.timestamp).first()
-    last = session.query(MBBCoupon).order_by(MBBCoupon.timestamp.desc()).first()
-    
-    print(f"Date range: {first.timestamp.date()} to {last.timestamp.date()}")
-    
-    # Check for gaps in data
-    current_date = first.timestamp.date()
-    end_date = last.timestamp.date()
-    
-    missing_dates = []
-    weekend_dates = []
-    
-    while current_date <= end_date:
-        # Skip weekends (no trading)
-        if current_date.weekday() >= 5:  # 5=Saturday, 6=Sunday
-            current_date += timedelta(days=1)
-            weekend_dates.append(current_date)
-            continue
-        
-        # Check if we have data for this date
-        count = session.query(MBBCoupon).filter(
-            MBBCoupon.timestamp >= datetime.combine(current_date, datetime.min.time()),
-            MBBCoupon.timestamp < datetime.combine(current_date + timedelta(days=1), datetime.min.time())
-        ).count()
-        
-        if count == 0:
-            missing_dates.append(current_date)
-        
-        current_date += timedelta(days=1)
-    
-    # Check if up to date
-    today = datetime.now().date()
-    days_behind = (today - last.timestamp.date()).days
-    
-    if days_behind > 0:
-        print(f"Data is {days_behind} days behind (last record: {last.timestamp.date()})")
+        return status
+
+    print(f"Date range: {status['first_bar'][:10]} to {status['last_bar'][:10]}")
+    print(f"Trading sessions covered: {status['sessions_with_data']}/{status['trading_sessions']}")
+
+    if status['sessions_behind'] > 0:
+        print(f"Data is {status['sessions_behind']} trading days behind (last record: {status['last_bar'][:10]})")
     else:
         print("Data is up to date!")
-    
-    # Report missing dates (excluding weekends and holidays)
-    if missing_dates:
-        print(f"Found {len(missing_dates)} missing trading days:")
-        for date in missing_dates[:10]:  # Show first 10 only
-            print(f"  - {date}")
-        if len(missing_dates) > 10:
-            print(f"  ... and {len(missing_dates) - 10} more")
+
+    if status['missing_sessions']:
+        _print_dates("missing trading days", status['missing_sessions'])
     else:
         print("No missing trading days found!")
-    
-    session.close()
+
+    if status['partial_sessions']:
+        _print_dates(f"partial trading days (< {status['bars_per_session']} bars)",
+                     [f"{d}: {n} bars" for d, n in status['partial_sessions'].items()])
+    if status['duplicate_bars']:
+        _print_dates("days with duplicate bars",
+                     [f"{d}: {n} duplicates" for d, n in status['duplicate_bars'].items()])
+    if status['non_trading_days_with_data']:
+        _print_dates("non-trading days with data", status['non_trading_days_with_data'])
+
+    return status
+
 
 if __name__ == "__main__":
-    check_data_status()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Report stored bar coverage, gaps and duplicates")
+    parser.add_argument('--ticker', default='MBB')
+    parser.add_argument('--json', action='store_true', help="Print the status as JSON")
+    parser.add_argument('--strict', action='store_true', help="Exit with status 1 when trading days are missing")
+    args = parser.parse_args()
+
+    result = check_data_status(args.ticker, as_json=args.json)
+    if args.strict and (result['total_bars'] == 0 or result['missing_sessions']):
+        sys.exit(1)
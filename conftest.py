@@ -0,0 +1,10 @@
+import os
+import tempfile
+
+# Tests never hit the network. Tests that need market data build a
+# SimulatedMarketSource (or a local fake fetcher) themselves; as a backstop,
+# the live sources run in replay mode against an empty response cache, so any
+# fetch a test forgot to stub is a cache miss, which the fetchers treat like
+# an empty upstream response, rather than a network call.
+os.environ.setdefault('RESPONSE_CACHE_MODE', 'replay')
+os.environ.setdefault('RESPONSE_CACHE_DIR', tempfile.mkdtemp(prefix='response-cache-'))
@@ -1,8 +1,9 @@
-from sqlalchemy import create_engine, inspect
+from sqlalchemy import inspect
+
+from storage import engine_for
 
 def get_database_context():
-    engine = create_engine('sqlite:///mbs_data.db')
-    inspector = inspect(engine)
+    inspector = inspect(engine_for('fred_data'))
     
     context = {
         "tables": {},
@@ -0,0 +1,237 @@
+import logging
+import os
+import threading
+from datetime import datetime
+
+import pandas as pd
+import pytz
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from data_collector import initialize_db, MarketBar, ReferenceCorrelation
+from storage import session_scope
+from streaming_validation import RollingCorrelation
+
+logger = logging.getLogger(__name__)
+
+CORRELATION_TICKER = os.getenv('CORRELATION_TICKER', 'MBB')
+# Reference series in order of preference: ^MORT, then the 10- and 30-year treasury yields
+CORRELATION_REFERENCES = [
+    ticker.strip() for ticker in os.getenv('CORRELATION_REFERENCES', '^MORT,^TNX,^TYX').split(',') if ticker.strip()
+]
+# Rolling windows, in paired daily returns
+CORRELATION_WINDOWS = [
+    int(window) for window in os.getenv('CORRELATION_WINDOWS', '20,60,120').split(',') if window.strip()
+]
+
+EASTERN = pytz.timezone('US/Eastern')
+# Rows per upsert statement, well under SQLite's bound-parameter limit
+_WRITE_CHUNK = 500
+
+
+class _ReferenceState:
+    """Running correlations of the instrument with one reference series"""
+
+    def __init__(self, windows):
+        self.correlations = {window: RollingCorrelation(window) for window in windows}
+
+
+class CorrelationTracker:
+    """
+    Rolling daily-return correlations of an instrument with reference series
+
+    Daily closes come from the daily bars the collectors already store in
+    market_bars, so nothing is fetched. The first update in a process
+    replays the stored history once; after that each new session costs
+    O(1) per reference and window. Every (reference, window, date) value
+    is persisted to reference_correlations, so readers just query the
+    table.
+
+    Returns are taken per series against that series' previous close (as
+    validate_mort_correlation always did) and paired on common dates.
+    """
+
+    def __init__(self, ticker=CORRELATION_TICKER, references=None, windows=None, db_path=None):
+        """
+        Args:
+            ticker: Instrument to correlate (default: CORRELATION_TICKER)
+            references: Reference tickers, most preferred first (default: CORRELATION_REFERENCES)
+            windows: Rolling windows in paired returns (default: CORRELATION_WINDOWS)
+            db_path: Database file (default: MBB_DB_PATH)
+        """
+        self.ticker = ticker
+        self.references = list(references or CORRELATION_REFERENCES)
+        self.windows = sorted(windows or CORRELATION_WINDOWS)
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._states = None
+        self._last_close = {}
+        self._last_date = None
+
+    def _daily_closes(self, session, after=None, through=None):
+        """Daily closes (bars stamped at midnight) for the instrument and references, oldest first"""
+        query = session.query(MarketBar.timestamp, MarketBar.ticker, MarketBar.close).filter(
+            MarketBar.ticker.in_([self.ticker] + self.references),
+            func.time(MarketBar.timestamp) == '00:00:00'
+        )
+        if after is not None:
+            query = query.filter(MarketBar.timestamp > after)
+        if through is not None:
+            query = query.filter(MarketBar.timestamp <= through)
+        return query.order_by(MarketBar.timestamp).all()
+
+    def update(self, through=None):
+        """
+        Fold newly stored sessions into the rolling correlations and persist them
+
+        Args:
+            through: Last session date to include (default: yesterday in New
+                York, so today's still-changing daily bar is never folded in)
+
+        Returns:
+            Number of correlation values written
+        """
+        if through is None:
+            through = datetime.now(EASTERN).replace(tzinfo=None) - pd.Timedelta(days=1)
+        through = pd.Timestamp(through).normalize().to_pydatetime()
+
+        with self._lock:
+            initialize_db(self.db_path)
+            try:
+                rows = self._update(through)
+            except Exception:
+                # The rolling state may be ahead of what was persisted; replay on the next update
+                self._states, self._last_close, self._last_date = None, {}, None
+                raise
+
+        if rows:
+            logger.info(f"Updated {len(rows)} {self.ticker} reference correlations through {self._last_date.date()}")
+        return len(rows)
+
+    def _update(self, through):
+        """Fold and persist sessions after the last one processed, in one transaction"""
+        with session_scope(self.db_path) as session:
+            written_through = None
+            if self._states is None:
+                # Replay stored history once; only dates not yet persisted are written
+                self._states = {reference: _ReferenceState(self.windows) for reference in self.references}
+                written_through = session.query(func.max(ReferenceCorrelation.date)).filter(
+                    ReferenceCorrelation.ticker == self.ticker
+                ).scalar()
+
+            rows = self._fold(self._daily_closes(session, self._last_date, through), written_through)
+            for start in range(0, len(rows), _WRITE_CHUNK):
+                statement = sqlite_insert(ReferenceCorrelation.__table__).values(rows[start:start + _WRITE_CHUNK])
+                session.execute(statement.on_conflict_do_update(
+                    index_elements=['ticker', 'reference', 'window', 'date'],
+                    set_={'correlation': statement.excluded.correlation, 'pairs': statement.excluded.pairs}
+                ))
+
+        return rows
+
+    def _fold(self, closes, written_through=None):
+        """Push each new session's paired returns into every window; O(1) per reference and window"""
+        rows = []
+        for date, day in pd.DataFrame(closes, columns=['date', 'ticker', 'close']).groupby('date', sort=True):
+            returns = {}
+            for ticker, close in zip(day['ticker'], day['close']):
+                previous = self._last_close.get(ticker)
+                if previous and close > 0:
+                    returns[ticker] = close / previous - 1
+                if close > 0:
+                    self._last_close[ticker] = close
+            self._last_date = date.to_pydatetime()
+
+            if self.ticker not in returns:
+                continue
+            for reference, state in self._states.items():
+                if reference not in returns:
+                    continue
+                for window, correlation in state.correlations.items():
+                    correlation.push(returns[self.ticker], returns[reference])
+                    value = correlation.value()
+                    if value is not None and (written_through is None or self._last_date > written_through):
+                        rows.append({
+                            'ticker': self.ticker, 'reference': reference, 'window': window,
+                            'date': self._last_date, 'correlation': value, 'pairs': len(correlation)
+                        })
+        return rows
+
+    def latest(self, window=None, reference=None):
+        """
+        Most recent persisted correlation per reference and window
+
+        Args:
+            window: Only this window (default: all)
+            reference: Only this reference (default: all)
+
+        Returns:
+            List of dicts with reference, window, date, correlation and pairs,
+            ordered by reference preference then window
+        """
+        initialize_db(self.db_path)
+        with session_scope(self.db_path) as session:
+            newest = session.query(
+                ReferenceCorrelation.reference, ReferenceCorrelation.window,
+                func.max(ReferenceCorrelation.date).label('date')
+            ).filter(ReferenceCorrelation.ticker == self.ticker)
+            if window is not None:
+                newest = newest.filter(ReferenceCorrelation.window == window)
+            if reference is not None:
+                newest = newest.filter(ReferenceCorrelation.reference == reference)
+            newest = newest.group_by(ReferenceCorrelation.reference, ReferenceCorrelation.window).subquery()
+
+            rows = session.query(ReferenceCorrelation).join(newest, (
+                (ReferenceCorrelation.reference == newest.c.reference) &
+                (ReferenceCorrelation.window == newest.c.window) &
+                (ReferenceCorrelation.date == newest.c.date)
+            )).filter(ReferenceCorrelation.ticker == self.ticker).all()
+            result = [_as_dict(row) for row in rows]
+
+        preference = {ref: i for i, ref in enumerate(self.references)}
+        return sorted(result, key=lambda row: (preference.get(row['reference'], len(preference)), row['window']))
+
+    def history(self, reference, window, start=None):
+        """Persisted correlations for one reference and window since start, oldest first"""
+        initialize_db(self.db_path)
+        with session_scope(self.db_path) as session:
+            query = session.query(ReferenceCorrelation).filter(
+                ReferenceCorrelation.ticker == self.ticker,
+                ReferenceCorrelation.reference == reference,
+                ReferenceCorrelation.window == window
+            )
+            if start is not None:
+                query = query.filter(ReferenceCorrelation.date >= start)
+            return [_as_dict(row) for row in query.order_by(ReferenceCorrelation.date).all()]
+
+
+def _as_dict(row):
+    return {
+        'reference': row.reference,
+        'window': row.window,
+        'date': row.date.date().isoformat(),
+        'correlation': row.correlation,
+        'pairs': row.pairs
+    }
+
+
+_trackers = {}
+_trackers_lock = threading.Lock()
+
+
+def get_tracker(db_path=None):
+    """Return the process-wide tracker for a database, so its rolling state is built only once"""
+    with _trackers_lock:
+        tracker = _trackers.get(db_path)
+        if tracker is None:
+            tracker = _trackers[db_path] = CorrelationTracker(db_path=db_path)
+        return tracker
+
+
+def window_for_lookback(lookback_days, windows=None):
+    """The configured window closest to the number of daily returns in lookback_days calendar days"""
+    from market_calendar import trading_days
+
+    end = pd.Timestamp.today().normalize()
+    returns = max(len(trading_days(end - pd.Timedelta(days=lookback_days), end)) - 1, 1)
+    return min(windows or CORRELATION_WINDOWS, key=lambda window: abs(window - returns))
@@ -6,12 +6,20 @@ import requests
 
 from data_ingestion import (
     initialize_schema,
+    ingest_fred_data,
     store_data,
+    store_daily_roi,
     send_alert
 )
-from calculations import calculate_roi
+from calculations import calculate_roi, calculate_implied_rate
+from data_collector import initialize_db, frame_to_bars, MarketBar, MBBCoupon
+from data_retention import enforce_data_retention
+from data_validation import validate_volume, validate_price_variance
+from instrument_collector import fetch_instruments, write_bars, COLLECTOR_INSTRUMENTS
+from pipeline import Pipeline, Stage
+from storage import get_engine, session_scope
+import os
 import pandas as pd
-from pandas.tseries.holiday import USFederalHolidayCalendar
 
 # Configure logging
 logging.basicConfig(
@@ -46,20 +54,165 @@ def get_trade_date() -> datetime:
     today = pd.Timestamp.today().normalize()
     return today.to_pydatetime()
 
-def process_update(trade_date: Optional[datetime] = None) -> int:
-    """Main update workflow with retry logic"""
-    try:
+# Window refetched every run; overlapping bars are upserted, so a few days covers missed runs
+DAILY_UPDATE_PERIOD = os.getenv('DAILY_UPDATE_PERIOD', '5d')
+# Buydown sizes (percentage points) materialized into daily_roi
+ROI_BUYDOWN_INCREMENTS = (0.125, 0.25, 0.5, 0.75, 1.0)
+
+def fetch_stage(trade_date, instruments):
+    """Fetch recent daily bars for every instrument"""
+    frames = fetch_instruments(instruments, period=DAILY_UPDATE_PERIOD, interval='1d')
+    raw_bars = {
+        ticker: frame_to_bars(frame) for ticker, frame in frames.items()
+        if frame is not None and not frame.empty
+    }
+    if not raw_bars:
+        raise pd.errors.EmptyDataError(f"No data returned for any of {instruments}")
+    return raw_bars
+
+def validate_stage(raw_bars):
+    """Drop unusable bars and run the data quality checks per instrument"""
+    bars, report = {}, {}
+    for ticker, frame in raw_bars.items():
+        usable = frame[frame[['open', 'high', 'low', 'close']].gt(0).all(axis=1)]
+        if len(usable) < len(frame):
+            logger.warning(f"Dropped {len(frame) - len(usable)} {ticker} bars with missing or non-positive prices")
+        if usable.empty:
+            continue
+        bars[ticker] = usable.reset_index(drop=True)
+        report[ticker] = {
+            'volume_check': bool(validate_volume(usable)),
+            'price_variance_check': bool(validate_price_variance(usable))
+        }
+    return {'bars': bars, 'validation': report}
+
+def roi_rows(bars, loan_amount=300000):
+    """Daily ROI rows for each buydown increment, from MBB closes"""
+    mbb = bars.get('MBB')
+    if mbb is None:
+        return []
+    rows = []
+    for timestamp, close in zip(mbb['timestamp'], mbb['close']):
+        original_rate = calculate_implied_rate(close)
+        for increment in ROI_BUYDOWN_INCREMENTS:
+            roi = calculate_roi(original_rate, loan_amount=loan_amount, buydown_increment=increment)
+            rows.append({
+                'date': timestamp.date(),
+                'original_rate': round(original_rate, 4),
+                'buydown_rate': round(original_rate - increment, 4),
+                'roi': roi,
+                # ROI is annual savings over cost, so cost / monthly savings = 1200 / ROI
+                'breakeven_months': 1200 / roi if roi > 0 else None
+            })
+    return rows
+
+def bar_watermark(db_path=None):
+    """
+    Cheap fingerprint of the stored bars, so stages reading them can be skipped when nothing changed
+
+    Returns:
+        dict of table -> [rows, first, last, total close, total volume]; revised
+        bars change the totals even when rows and span stay the same
+    """
+    from sqlalchemy import func
+    
+    watermark = {}
+    with session_scope(db_path) as session:
+        for model in (MBBCoupon, MarketBar):
+            row = session.query(func.count(), func.min(model.timestamp), func.max(model.timestamp),
+                                func.total(model.close), func.total(model.volume)).one()
+            watermark[model.__tablename__] = [str(value) for value in row]
+    return watermark
+
+def build_pipeline(db_path=None, instruments=None):
+    """
+    Declare the daily update stages
+    
+    fetch -> validate -> (store | materialize_roi) -> bar_state -> anomalies -> rollups,
+    with the price cache and reference correlations following the stored bars and FRED
+    ingestion and retention running alongside; see pipeline.Pipeline for scheduling,
+    skipping and resume semantics.
+    
+    Stages that read stored bars take the bar_state watermark (see bar_watermark)
+    as an input, so they are skipped only while both their inputs and the bars
+    they read are unchanged. Stages whose work depends on something outside the
+    pipeline's inputs (upstream data, the cache files, other databases) and the
+    idempotent store always run; failed runs still resume them.
+    """
+    instruments = list(instruments or COLLECTOR_INSTRUMENTS)
+    
+    def store(bars):
+        initialize_db(db_path)
+        with session_scope(db_path) as session:
+            return {ticker: write_bars(session, ticker, frame) for ticker, frame in bars.items()}
+    
+    def materialize_roi(bars):
         initialize_schema()
-        
+        return store_daily_roi(roi_rows(bars))
+    
+    def retention(trade_date):
+        return enforce_data_retention(get_engine(db_path))
+    
+    def correlations(trade_date, bar_state):
+        from correlation_tracker import get_tracker
+        return get_tracker(db_path).update()
+    
+    def quarantine(bars, bar_state):
+        from anomaly_detection import scan
+        # Rescore from the earliest refetched bar; scan pulls in the history the baselines need
+        return {ticker: scan(ticker, since=frame['timestamp'].min(), db_path=db_path) for ticker, frame in bars.items()}
+    
+    def cache_prices(bars, bar_state):
+        from price_cache import cache_stored_bars, reconcile_price_caches
+        cached = {ticker: cache_stored_bars(ticker, frame, db_path=db_path) for ticker, frame in bars.items()}
+        # Catch up on bars any other writer failed to cache since the last run
+        rebuilt = reconcile_price_caches(db_path=db_path)
+        return {'cached': cached, 'rebuilt': rebuilt}
+    
+    def rollup(bars, quarantined, bar_state):
+        from rollups import update_rollups, ROLLUP_TICKERS
+        # After the anomaly scan, so newly quarantined bars are left out of their buckets
+        return {
+            ticker: update_rollups(ticker, since=frame['timestamp'].min(), db_path=db_path)
+            for ticker, frame in bars.items() if ticker in ROLLUP_TICKERS
+        }
+    
+    return Pipeline('daily_update', [
+        Stage('fetch', lambda trade_date: fetch_stage(trade_date, instruments),
+              inputs=['trade_date'], outputs=['raw_bars'], cacheable=False),
+        Stage('validate', validate_stage, inputs=['raw_bars'], outputs=['bars', 'validation']),
+        Stage('store', store, inputs=['bars'], outputs=['stored'], cacheable=False),
+        Stage('materialize_roi', materialize_roi, inputs=['bars'], outputs=['roi_count'], cacheable=False),
+        Stage('fred', lambda trade_date: ingest_fred_data(),
+              inputs=['trade_date'], outputs=['fred_rows'], cacheable=False),
+        Stage('bar_state', lambda stored: bar_watermark(db_path),
+              inputs=['stored'], outputs=['bar_state'], cacheable=False),
+        Stage('price_cache', cache_prices, inputs=['bars', 'bar_state'], outputs=['cached'], cacheable=False),
+        Stage('correlations', correlations, inputs=['trade_date', 'bar_state'], outputs=['correlations']),
+        Stage('retention', retention, inputs=['trade_date'], outputs=['retention']),
+        Stage('anomalies', quarantine, inputs=['bars', 'bar_state'], outputs=['quarantined']),
+        Stage('rollups', rollup, inputs=['bars', 'quarantined', 'bar_state'], outputs=['rollups'])
+    ], db_path=db_path)
+
+def process_update(trade_date: Optional[datetime] = None, db_path=None) -> int:
+    """Main update workflow; a failed run resumes from its failed stage when rerun for the same date"""
+    try:
         # Get validated trade date
         trade_date = trade_date or get_trade_date()
-        logger.info(f"Processing update for {trade_date.strftime('%Y-%m-%d')}")
+        run_key = trade_date.strftime('%Y-%m-%d')
+        logger.info(f"Processing update for {run_key}")
 
-        # Placeholder for new data collection implementation
-        # Will be replaced with new implementation from Redo.md
-        logger.info("Data collection implementation pending")
+        results = build_pipeline(db_path).run(run_key=run_key, trade_date=run_key)
         
-        # Return early until new implementation is in place
+        failed_checks = {
+            ticker: [name for name, passed in checks.items() if not passed]
+            for ticker, checks in results['validation'].items()
+            if not all(checks.values())
+        }
+        if failed_checks:
+            logger.warning(f"Validation warnings: {failed_checks}")
+        logger.info(f"Stored {results['stored']}, materialized {results['roi_count']} ROI rows, "
+                    f"{results['fred_rows']} new FRED observations")
         return 0
 
     except requests.RequestException as e:
@@ -1,10 +1,10 @@
-import yfinance as yf
-from sqlalchemy import create_engine, Column, Integer, Float, DateTime, String
+from sqlalchemy import Column, Integer, Float, DateTime, String, Boolean, Index, exists, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
 from datetime import datetime, timedelta
 import logging
-import os
+from storage import get_engine, session_scope
+from data_sources import get_bar_source
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -17,7 +17,7 @@ class MBBCoupon(Base):
     __tablename__ = 'mbb_coupons'
     
     id = Column(Integer, primary_key=True)
-    timestamp = Column(DateTime, nullable=False)
+    timestamp = Column(DateTime, nullable=False, unique=True, index=True)
     open = Column(Float, nullable=False)
     high = Column(Float, nullable=False)
     low = Column(Float, nullable=False)
@@ -27,31 +27,175 @@ class MBBCoupon(Base):
     def __repr__(self):
         return f"<MBBCoupon(timestamp='{self.timestamp}', close='{self.close}')>"
 
-def initialize_db():
-    """Initialize the database and return engine"""
-    db_path = os.path.join(os.path.dirname(__file__), 'mbb_data.db')
-    engine = create_engine(f'sqlite:///{db_path}')
+class MarketBar(Base):
+    """OHLCV bars for every collected instrument (MBB, other MBS ETFs, treasury yields)"""
+    __tablename__ = 'market_bars'
+    __table_args__ = (
+        Index('ix_market_bars_ticker_timestamp', 'ticker', 'timestamp', unique=True),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    ticker = Column(String(16), nullable=False)
+    timestamp = Column(DateTime, nullable=False)
+    open = Column(Float, nullable=False)
+    high = Column(Float, nullable=False)
+    low = Column(Float, nullable=False)
+    close = Column(Float, nullable=False)
+    volume = Column(Integer, nullable=False)
+    
+    def __repr__(self):
+        return f"<MarketBar(ticker='{self.ticker}', timestamp='{self.timestamp}', close='{self.close}')>"
+
+class CollectorCheckpoint(Base):
+    """Last committed bar per instrument and bar size, so the intraday collector can resume"""
+    __tablename__ = 'collector_checkpoints'
+    
+    ticker = Column(String(16), primary_key=True)
+    interval = Column(String(8), primary_key=True)
+    last_bar = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+    
+    def __repr__(self):
+        return f"<CollectorCheckpoint(ticker='{self.ticker}', interval='{self.interval}', last_bar='{self.last_bar}')>"
+
+class BarValidation(Base):
+    """Streaming validation result for one stored bar (see streaming_validation)"""
+    __tablename__ = 'bar_validations'
+    
+    ticker = Column(String(16), primary_key=True)
+    timestamp = Column(DateTime, primary_key=True)
+    passed = Column(Boolean, nullable=False)
+    flags = Column(String(128), nullable=False, default='')
+    volume_percentile = Column(Float)
+    range_pct = Column(Float)
+    # Running return correlation with the validator's reference instrument
+    correlation = Column(Float)
+    checked_at = Column(DateTime, nullable=False)
+    
+    def __repr__(self):
+        return f"<BarValidation(ticker='{self.ticker}', timestamp='{self.timestamp}', flags='{self.flags}')>"
+
+class ReferenceCorrelation(Base):
+    """Rolling daily-return correlation between an instrument and a reference series (see correlation_tracker)"""
+    __tablename__ = 'reference_correlations'
+    
+    ticker = Column(String(16), primary_key=True)
+    reference = Column(String(16), primary_key=True)
+    window = Column(Integer, primary_key=True)
+    date = Column(DateTime, primary_key=True)
+    correlation = Column(Float, nullable=False)
+    pairs = Column(Integer, nullable=False)
+    
+    def __repr__(self):
+        return (f"<ReferenceCorrelation(ticker='{self.ticker}', reference='{self.reference}', "
+                f"window={self.window}, date='{self.date}', correlation={self.correlation:.3f})>")
+
+class QuarantinedBar(Base):
+    """Bar held back from read endpoints by the anomaly detector (see anomaly_detection)"""
+    __tablename__ = 'quarantined_bars'
+    
+    ticker = Column(String(16), primary_key=True)
+    timestamp = Column(DateTime, primary_key=True)
+    reasons = Column(String(128), nullable=False)
+    score = Column(Float)
+    detected_at = Column(DateTime, nullable=False)
+    
+    def __repr__(self):
+        return f"<QuarantinedBar(ticker='{self.ticker}', timestamp='{self.timestamp}', reasons='{self.reasons}')>"
+
+class BarRollup(Base):
+    """OHLCV of an instrument's bars per hour, day or week, with derived rates (see rollups)"""
+    __tablename__ = 'bar_rollups'
+    
+    ticker = Column(String(16), primary_key=True)
+    resolution = Column(String(4), primary_key=True)
+    bucket = Column(DateTime, primary_key=True)
+    open = Column(Float, nullable=False)
+    high = Column(Float, nullable=False)
+    low = Column(Float, nullable=False)
+    close = Column(Float, nullable=False)
+    volume = Column(Integer, nullable=False)
+    bars = Column(Integer, nullable=False)
+    implied_rate = Column(Float)
+    roi = Column(Float)
+    
+    def __repr__(self):
+        return f"<BarRollup(ticker='{self.ticker}', resolution='{self.resolution}', bucket='{self.bucket}')>"
+
+def not_quarantined(model=MBBCoupon, ticker='MBB'):
+    """
+    SQL condition that keeps only bars absent from quarantined_bars
+    
+    Args:
+        model: Bar model being queried (MBBCoupon or MarketBar)
+        ticker: Instrument of the bars (default: MBB for mbb_coupons; MarketBar queries use its ticker column)
+    """
+    if model is MarketBar:
+        ticker = MarketBar.ticker
+    return ~exists().where(QuarantinedBar.ticker == ticker, QuarantinedBar.timestamp == model.timestamp)
+
+# Columns written by the bulk ingestion path, in table order
+BAR_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+def initialize_db(db_path=None):
+    """Initialize the database and return the shared engine"""
+    engine = get_engine(db_path)
     Base.metadata.create_all(engine)
+    _ensure_timestamp_index(engine)
+    _ensure_validation_correlation(engine)
     return engine
 
-def fetch_historical_mbb_data(ticker="MBB", period="3mo"):
+def _ensure_validation_correlation(engine):
+    """Add the correlation column to bar_validations tables created before it existed"""
+    with engine.begin() as conn:
+        columns = [column[1] for column in conn.execute(text("PRAGMA table_info(bar_validations)")).fetchall()]
+        if columns and 'correlation' not in columns:
+            conn.execute(text("ALTER TABLE bar_validations ADD COLUMN correlation FLOAT"))
+            logger.info("Added correlation column to bar_validations")
+
+def _ensure_timestamp_index(engine):
+    """
+    Add the unique timestamp index to databases created before it existed
+    
+    Duplicate bars (which the old per-day dedup let through) are collapsed
+    to their first row so the index can be built.
+    """
+    with engine.begin() as conn:
+        exists = conn.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'ix_mbb_coupons_timestamp'"
+        )).first()
+        if exists:
+            return
+        
+        deleted = conn.execute(text(
+            "DELETE FROM mbb_coupons WHERE id NOT IN (SELECT MIN(id) FROM mbb_coupons GROUP BY timestamp)"
+        )).rowcount
+        conn.execute(text(
+            "CREATE UNIQUE INDEX ix_mbb_coupons_timestamp ON mbb_coupons (timestamp)"
+        ))
+        logger.info(f"Created unique timestamp index on mbb_coupons ({deleted} duplicate bars removed)")
+
+def fetch_historical_mbb_data(ticker="MBB", period="3mo", interval="1d", start=None, end=None, source=None):
     """
-    Fetch historical MBB data from yfinance
+    Fetch historical MBB data from the configured data source (yfinance by default)
     
     Args:
         ticker: The ticker symbol (default: MBB for iShares MBS ETF)
         period: Time period to fetch (default: 3mo for 3 months)
                Options: 1d, 5d, 1mo, 3mo, 6mo, 1y, 2y, 5y, 10y, ytd, max
+        interval: Bar size (e.g. 1m, 5m, 1h, 1d)
+        start: Optional start date; takes precedence over period
+        end: Optional end date (exclusive)
+        source: DataSource to fetch from (default: data_sources.get_bar_source())
     
     Returns:
         DataFrame with historical data
     """
     try:
-        logger.info(f"Fetching historical data for {ticker} over {period}")
-        mbb = yf.Ticker(ticker)
-        hist = mbb.history(period=period)
+        source = source or get_bar_source()
+        hist = source.fetch(ticker, period=period, interval=interval, start=start, end=end)
         
-        if hist.empty:
+        if hist is None or hist.empty:
             logger.warning(f"No data returned for {ticker}")
             return None
             
@@ -61,114 +205,197 @@ def fetch_historical_mbb_data(ticker="MBB", period="3mo"):
         logger.error(f"Error fetching historical data: {str(e)}")
         return None
 
-def populate_historical_data():
-    """Populate database with historical MBB data"""
-    engine = initialize_db()
-    Session = sessionmaker(bind=engine)
-    session = Session()
+def frame_to_bars(hist_data):
+    """
+    Convert a yfinance history frame into bar columns, column-wise
     
-    # Check if we already have data
-    existing_count = session.query(MBBCoupon).count()
-    if existing_count > 0:
-        logger.info(f"Database already contains {existing_count} records. Skipping historical data population.")
-        session.close()
-        return
+    Timestamps keep their exchange wall-clock time (tz-aware indexes are
+    made naive), which is how bars have always been stored.
     
-    # Fetch historical data (3 months)
-    hist_data = fetch_historical_mbb_data(period="3mo")
+    Args:
+        hist_data: DataFrame indexed by timestamp with Open/High/Low/Close/Volume
+        
+    Returns:
+        DataFrame with BAR_COLUMNS, one row per unique timestamp
+    """
+    import pandas as pd
     
-    if hist_data is None or hist_data.empty:
-        logger.error("Failed to fetch historical data")
-        session.close()
-        return
-    
-    # Add historical data to database
-    records_added = 0
-    for index, row in hist_data.iterrows():
-        # Convert pandas timestamp to datetime
-        timestamp = index.to_pydatetime()
+    index = pd.DatetimeIndex(hist_data.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    
+    bars = pd.DataFrame({
+        'timestamp': index,
+        'open': hist_data['Open'].to_numpy(dtype=float),
+        'high': hist_data['High'].to_numpy(dtype=float),
+        'low': hist_data['Low'].to_numpy(dtype=float),
+        'close': hist_data['Close'].to_numpy(dtype=float),
+        'volume': hist_data['Volume'].fillna(0).to_numpy()
+    })
+    
+    # Incomplete bars can't be stored (all columns are NOT NULL)
+    bars = bars.dropna(subset=['open', 'high', 'low', 'close'])
+    bars['volume'] = bars['volume'].astype('int64')
+    
+    # The last occurrence of a timestamp is the most recent revision of that bar
+    return bars.drop_duplicates(subset='timestamp', keep='last').sort_values('timestamp')
+
+def upsert_bars(session, bars, table=None, ticker=None):
+    """
+    Insert or update bars with a single INSERT ... ON CONFLICT statement
+    
+    Existing rows in the incoming time range are read once so each bar can
+    be classified as inserted, updated (values changed) or skipped
+    (identical); only inserted and updated bars are written.
+    
+    Args:
+        session: SQLAlchemy session
+        bars: DataFrame with BAR_COLUMNS (see frame_to_bars)
+        table: Target table (default: mbb_coupons, or market_bars when ticker is given)
+        ticker: Instrument the bars belong to, for multi-ticker tables
+        
+    Returns:
+        dict with 'inserted', 'updated' and 'skipped' counts
+    """
+    import pandas as pd
+    
+    if table is None:
+        table = MarketBar.__table__ if ticker is not None else MBBCoupon.__table__
+    counts = {'inserted': 0, 'updated': 0, 'skipped': 0}
+    if bars is None or bars.empty:
+        return counts
+    
+    # Existing bars over the same range, in one query
+    query = table.select().with_only_columns(*[table.c[col] for col in BAR_COLUMNS]).where(
+        table.c.timestamp.between(bars['timestamp'].min().to_pydatetime(),
+                                  bars['timestamp'].max().to_pydatetime())
+    )
+    if ticker is not None:
+        query = query.where(table.c.ticker == ticker)
+    existing = pd.DataFrame(session.execute(query).fetchall(), columns=BAR_COLUMNS)
+    existing['timestamp'] = pd.to_datetime(existing['timestamp'])
+    
+    merged = bars.merge(existing, on='timestamp', how='left', suffixes=('', '_db'), indicator=True)
+    is_new = (merged['_merge'] == 'left_only').to_numpy()
+    changed = ~is_new & (
+        (merged['open'] != merged['open_db']) |
+        (merged['high'] != merged['high_db']) |
+        (merged['low'] != merged['low_db']) |
+        (merged['close'] != merged['close_db']) |
+        (merged['volume'] != merged['volume_db'])
+    ).to_numpy()
+    
+    counts['inserted'] = int(is_new.sum())
+    counts['updated'] = int(changed.sum())
+    counts['skipped'] = len(merged) - counts['inserted'] - counts['updated']
+    
+    to_write = merged.loc[is_new | changed, BAR_COLUMNS]
+    if not to_write.empty:
+        # Build executemany parameters column-wise with native Python types
+        rows = [dict(zip(BAR_COLUMNS, values)) for values in zip(
+            to_write['timestamp'].dt.to_pydatetime(),
+            *(to_write[col].tolist() for col in BAR_COLUMNS[1:])
+        )]
+        key_columns = ['timestamp']
+        if ticker is not None:
+            key_columns = ['ticker', 'timestamp']
+            for row in rows:
+                row['ticker'] = ticker
         
-        # Create new record
-        new_record = MBBCoupon(
-            timestamp=timestamp,
-            open=float(row['Open']),
-            high=float(row['High']),
-            low=float(row['Low']),
-            close=float(row['Close']),
-            volume=int(row['Volume'])
+        stmt = sqlite_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=key_columns,
+            set_={col: stmt.excluded[col] for col in BAR_COLUMNS[1:]}
         )
+        session.execute(stmt, rows)
+    
+    return counts
+
+def ingest_bars(hist_data):
+    """
+    Bulk-upsert a fetched history frame into the database
+    
+    Args:
+        hist_data: DataFrame as returned by fetch_historical_mbb_data
         
-        session.add(new_record)
-        records_added += 1
+    Returns:
+        dict with 'inserted', 'updated' and 'skipped' counts
+    """
+    bars = frame_to_bars(hist_data)
+    
+    with session_scope() as session:
+        counts = upsert_bars(session, bars)
+    
+    # Changes are committed when the session scope exits
+    logger.info(f"Ingested {len(bars)} bars: {counts['inserted']} inserted, "
+                f"{counts['updated']} updated, {counts['skipped']} skipped")
     
-    # Commit changes
-    session.commit()
-    logger.info(f"Added {records_added} historical records to database")
-    session.close()
+    if counts['inserted'] or counts['updated']:
+        # Readers are served from the price cache once it is built
+        from price_cache import cache_stored_bars
+        cache_stored_bars('MBB', bars)
+        from rollups import roll_up_stored_bars
+        roll_up_stored_bars('MBB', bars['timestamp'].min(), bars['timestamp'].max())
+        
+        # Publish the new latest bar to in-process readers
+        from market_snapshot import refresh_snapshot
+        refresh_snapshot()
+    
+    return counts
+
+def populate_historical_data(period="3mo", interval="1d"):
+    """Populate database with historical MBB data"""
+    initialize_db()
+
+    # Check if we already have data
+    with session_scope() as session:
+        existing_count = session.query(MBBCoupon).count()
+    if existing_count > 0:
+        logger.info(f"Database already contains {existing_count} records. Skipping historical data population.")
+        return None
+
+    # Fetch historical data (3 months by default)
+    hist_data = fetch_historical_mbb_data(period=period, interval=interval)
+
+    if hist_data is None or hist_data.empty:
+        logger.error("Failed to fetch historical data")
+        return None
+
+    return ingest_bars(hist_data)
 
 def update_daily_data():
     """Update database with latest MBB data"""
-    engine = initialize_db()
-    Session = sessionmaker(bind=engine)
-    session = Session()
-    
-    # Get latest data in database
-    latest = session.query(MBBCoupon).order_by(MBBCoupon.timestamp.desc()).first()
-    
+    initialize_db()
+
+    with session_scope() as session:
+        # Get latest data in database
+        latest = session.query(MBBCoupon).order_by(MBBCoupon.timestamp.desc()).first()
+        latest_date = latest.timestamp.date() if latest is not None else None
+
     # If no data exists, populate with historical data
-    if latest is None:
-        session.close()
-        populate_historical_data()
-        return
-    
+    if latest_date is None:
+        return populate_historical_data()
+
     # Calculate date range to fetch (from latest record to today)
-    latest_date = latest.timestamp.date()
     today = datetime.now().date()
-    
+
     # If already up to date, skip
     if latest_date >= today:
         logger.info("Data already up to date")
-        session.close()
-        return
-    
-    # Fetch data for missing period
+        return None
+
+    # Fetch data for missing period (outside any open transaction so readers aren't held up)
     days_diff = (today - latest_date).days
     period = f"{days_diff + 5}d"  # Add a few extra days to ensure overlap
-    
+
     hist_data = fetch_historical_mbb_data(period=period)
-    
+
     if hist_data is None or hist_data.empty:
         logger.error("Failed to fetch recent data")
-        session.close()
-        return
-    
-    # Add new data to database
-    records_added = 0
-    for index, row in hist_data.iterrows():
-        # Convert pandas timestamp to datetime
-        timestamp = index.to_pydatetime()
-        
-        # Skip if record already exists
-        if timestamp.date() <= latest_date:
-            continue
-        
-        # Create new record
-        new_record = MBBCoupon(
-            timestamp=timestamp,
-            open=float(row['Open']),
-            high=float(row['High']),
-            low=float(row['Low']),
-            close=float(row['Close']),
-            volume=int(row['Volume'])
-        )
-        
-        session.add(new_record)
-        records_added += 1
-    
-    # Commit changes
-    session.commit()
-    logger.info(f"Added {records_added} new records to database")
-    session.close()
+        return None
+
+    # Overlapping bars are upserted by timestamp, so same-day bars are kept and revised
+    return ingest_bars(hist_data)
 
 if __name__ == "__main__":
     # When run directly, update the database
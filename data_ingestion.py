@@ -1,7 +1,6 @@
 import os
 import pandas as pd
-from sqlalchemy import create_engine, MetaData, Table, Column, Float, Date, String, inspect, text
-from fredapi import Fred
+from sqlalchemy import MetaData, Table, Column, Float, Date, String, inspect, text
 from dotenv import load_dotenv
 from io import StringIO
 import google.generativeai as genai
@@ -9,19 +8,31 @@ import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from calculations import calculate_roi
+from data_sources import get_series_source
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from storage import engine_for
+import logging
 
 import requests
 import numpy as np
 
-# Define SQLite path constant
-SQLITE_PATH = 'sqlite:///mbs_data.db'
-
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# FRED series ingested into fred_data, keyed by the series name stored there
+FRED_SERIES = {
+    'MORTGAGE30US': '30yr_fixed_rate',
+    # Add treasury yields if needed later
+    # 'GS10': '10yr_treasury_yield'
+}
+FRED_MAX_WORKERS = int(os.getenv('FRED_MAX_WORKERS', 4))
+
 def initialize_schema():
     """Create database tables for the application"""
-    engine = create_engine(SQLITE_PATH)
+    engine = engine_for('daily_roi')
     inspector = inspect(engine)
     metadata = MetaData()
     
@@ -35,40 +46,159 @@ def initialize_schema():
         )
     
     metadata.create_all(engine)
+    _ensure_fred_table(engine_for('fred_data'))
 
-def get_fred_mbs_data():
-    """Get mortgage rate data from FRED"""
-    fred = Fred(api_key=os.getenv('FRED_API_KEY'))
+def _ensure_fred_table(engine):
+    """
+    Create fred_data keyed on (series, date)
     
-    series_map = {
-        'MORTGAGE30US': '30yr_fixed_rate',
-        # Add treasury yields if needed later
-        # 'GS10': '10yr_treasury_yield'
-    }
+    Tables written by the old append-only store_data have no key and repeat
+    every observation once per run; they are rebuilt keeping the most recently
+    written value for each (series, date).
+    """
+    with engine.begin() as conn:
+        columns = conn.execute(text("PRAGMA table_info(fred_data)")).fetchall()
+        if columns and any(column[5] for column in columns):
+            return  # already has a primary key
+        
+        conn.execute(text("""
+            CREATE TABLE fred_data_new (
+                series VARCHAR NOT NULL,
+                date DATE NOT NULL,
+                value FLOAT,
+                PRIMARY KEY (series, date)
+            )
+        """))
+        if columns:
+            conn.execute(text("""
+                INSERT INTO fred_data_new (series, date, value)
+                SELECT series, date(date), value FROM fred_data
+                WHERE rowid IN (SELECT MAX(rowid) FROM fred_data WHERE series IS NOT NULL GROUP BY series, date(date))
+            """))
+            conn.execute(text("DROP TABLE fred_data"))
+            logger.info("Rebuilt fred_data with a (series, date) primary key")
+        conn.execute(text("ALTER TABLE fred_data_new RENAME TO fred_data"))
 
-    df = pd.DataFrame()
-    for series_id, col_name in series_map.items():
-        try:
-            data = fred.get_series(series_id)
-            temp_df = pd.DataFrame({
-                'date': data.index,
-                'value': data.values,
-                'series': col_name,
-                'coupon_rate': None  # Placeholder for future MBS data
-            })
-            df = pd.concat([df, temp_df], ignore_index=True)
-        except Exception as e:
-            print(f"FRED Error: {str(e)}")
+def fred_high_water_marks():
+    """
+    Latest stored observation date per series
     
-    return df
+    Returns:
+        dict of series name -> datetime.date
+    """
+    with engine_for('fred_data').connect() as conn:
+        rows = conn.execute(text("SELECT series, MAX(date) FROM fred_data GROUP BY series")).fetchall()
+    return {series: pd.Timestamp(latest).date() for series, latest in rows if latest is not None}
+
+def get_fred_series(series_id, observation_start=None, source=None):
+    """Fetch a FRED series (optionally only from observation_start on) from the configured series source"""
+    source = source or get_series_source()
+    return source.fetch_series(series_id, observation_start=observation_start)
+
+def get_fred_mbs_data(since=None, rate_limiter=None):
+    """
+    Get mortgage rate data from FRED
+    
+    Args:
+        since: Optional dict of series name -> last stored date; only later
+               observations are fetched for those series
+        rate_limiter: Optional per-host RateLimiter (default: the collectors' shared one)
+        
+    Returns:
+        DataFrame with date, value and series columns
+    """
+    since = since or {}
+    if rate_limiter is None:
+        from instrument_collector import default_rate_limiter
+        rate_limiter = default_rate_limiter
+    
+    def fetch(series_id, col_name):
+        start = since.get(col_name)
+        start = start + timedelta(days=1) if start is not None else None
+        rate_limiter.acquire(get_series_source().host)
+        data = get_fred_series(series_id, observation_start=start)
+        if start is not None:
+            # Cached or revised responses may still reach back further
+            data = data[data.index >= pd.Timestamp(start)]
+        return pd.DataFrame({
+            'date': pd.DatetimeIndex(data.index).date,
+            'value': data.to_numpy(dtype=float),
+            'series': col_name
+        })
+    
+    frames = []
+    with ThreadPoolExecutor(max_workers=FRED_MAX_WORKERS, thread_name_prefix='fred') as pool:
+        futures = {series_id: pool.submit(fetch, series_id, col_name) for series_id, col_name in FRED_SERIES.items()}
+        for series_id, future in futures.items():
+            try:
+                frames.append(future.result())
+            except Exception as e:
+                logger.error(f"FRED Error for {series_id}: {str(e)}")
+    
+    if not frames:
+        return pd.DataFrame(columns=['date', 'value', 'series'])
+    return pd.concat(frames, ignore_index=True)
 
 def store_data(df):
-    """Store data in SQLite"""
-    engine = create_engine(SQLITE_PATH)
+    """
+    Upsert FRED observations into fred_data on (series, date)
+    
+    Returns:
+        int: Number of observations written
+    """
+    if 'series' not in df.columns:
+        return 0
+    fred_df = df[df['series'].notnull() & df['value'].notnull()]
+    if fred_df.empty:
+        return 0
+    
+    rows = [
+        {'series': series, 'date': pd.Timestamp(date).date().isoformat(), 'value': float(value)}
+        for series, date, value in zip(fred_df['series'], fred_df['date'], fred_df['value'])
+    ]
+    with engine_for('fred_data').begin() as conn:
+        conn.execute(text("""
+            INSERT INTO fred_data (series, date, value) VALUES (:series, :date, :value)
+            ON CONFLICT (series, date) DO UPDATE SET value = excluded.value
+        """), rows)
+    return len(rows)
+
+def ingest_fred_data():
+    """
+    Fetch and store FRED observations newer than what is already stored
+    
+    Returns:
+        int: Number of observations written
+    """
+    initialize_schema()
+    since = fred_high_water_marks()
+    df = get_fred_mbs_data(since=since)
+    written = store_data(df)
+    logger.info(f"FRED ingestion wrote {written} new observations (high-water marks: {since})")
+    return written
+
+def store_daily_roi(rows):
+    """
+    Upsert materialized ROI rows into daily_roi
+    
+    Args:
+        rows: Iterable of dicts with date, original_rate, buydown_rate, roi, breakeven_months
+        
+    Returns:
+        int: Number of rows written
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
     
-    if 'series' in df.columns:
-        fred_df = df[df['series'].notnull()]
-        fred_df.to_sql('fred_data', engine, if_exists='append', index=False)
+    with engine_for('daily_roi').begin() as conn:
+        conn.execute(text("""
+            INSERT INTO daily_roi (date, original_rate, buydown_rate, roi, breakeven_months)
+            VALUES (:date, :original_rate, :buydown_rate, :roi, :breakeven_months)
+            ON CONFLICT (date, original_rate, buydown_rate)
+            DO UPDATE SET roi = excluded.roi, breakeven_months = excluded.breakeven_months
+        """), rows)
+    return len(rows)
 
 def send_alert(message_data):
     """Send email alert for data issues"""
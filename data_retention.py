@@ -1,44 +1,219 @@
-from sqlalchemy import create_engine, text
-from datetime import datetime, timedelta
+import argparse
 import logging
+import os
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
 
 logger = logging.getLogger(__name__)
 
-def enforce_data_retention(db_path='sqlite:///mbs_data.db', retention_years=2):
+RETENTION_YEARS = float(os.getenv('RETENTION_YEARS', 2))
+# Expired rows are written here as <table>/year=YYYY/month=MM/part-<first rowid>-<last rowid>.parquet
+RETENTION_ARCHIVE_DIR = os.getenv(
+    'RETENTION_ARCHIVE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'archive')
+)
+RETENTION_ARCHIVE_COMPRESSION = os.getenv('RETENTION_ARCHIVE_COMPRESSION', 'zstd')
+# Rows archived and deleted per write transaction; keeps each write lock short
+RETENTION_BATCH_ROWS = int(os.getenv('RETENTION_BATCH_ROWS', 5000))
+# Free pages released per incremental_vacuum step
+RETENTION_VACUUM_PAGES = int(os.getenv('RETENTION_VACUUM_PAGES', 2000))
+# Pause between batches and vacuum steps so other writers get the lock
+RETENTION_PAUSE_SECONDS = float(os.getenv('RETENTION_PAUSE_SECONDS', 0.05))
+
+# Bar tables (and rows derived from bars) swept by retention, by timestamp
+RETENTION_TABLES = ('mbb_coupons', 'market_bars', 'bar_validations', 'quarantined_bars')
+
+
+def _engine(db_path):
+    """Accept an engine, a SQLAlchemy URL or a file path (default: the shared MBB_DB_PATH engine)"""
+    if hasattr(db_path, 'connect'):
+        return db_path
+    if db_path is None or '://' not in str(db_path):
+        from storage import get_engine
+        return get_engine(db_path)
+    return create_engine(db_path)
+
+
+def _existing_tables(conn, tables):
+    names = {row[0] for row in conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'table'"))}
+    return [table for table in tables if table in names]
+
+
+def archive_rows(frame, table, archive_dir=None, compression=None):
     """
-    Enforce data retention policy by removing data older than specified period
-    
+    Write rows to month-partitioned Parquet files
+
     Args:
-        db_path: Path to SQLite database or SQLAlchemy engine
+        frame: Rows with a 'timestamp' and a '_rowid' column
+        table: Source table name (the first partition level)
+        archive_dir: Archive root (default: RETENTION_ARCHIVE_DIR)
+        compression: Parquet codec (default: RETENTION_ARCHIVE_COMPRESSION)
+
+    Returns:
+        List of files written. Names come from the batch's rowid range, so a
+        retried batch overwrites its own files rather than duplicating rows.
+    """
+    import pandas as pd
+
+    archive_dir = archive_dir or RETENTION_ARCHIVE_DIR
+    first, last = int(frame['_rowid'].min()), int(frame['_rowid'].max())
+    timestamps = pd.to_datetime(frame['timestamp'])
+    paths = []
+    for (year, month), rows in frame.groupby([timestamps.dt.year, timestamps.dt.month], sort=True):
+        directory = os.path.join(archive_dir, table, f"year={year:04d}", f"month={month:02d}")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"part-{first:012d}-{last:012d}.parquet")
+        rows = rows.assign(timestamp=pd.to_datetime(rows['timestamp']))
+        rows.to_parquet(path + '.tmp', index=False, compression=compression or RETENTION_ARCHIVE_COMPRESSION)
+        os.replace(path + '.tmp', path)
+        paths.append(path)
+    return paths
+
+
+def _expire_table(engine, table, cutoff, batch_rows, archive_dir, pause_seconds):
+    """Archive then delete one table's expired rows, one rowid range per transaction"""
+    import pandas as pd
+
+    deleted, after = 0, 0
+    while True:
+        # WAL readers don't block the web app, so the batch is read outside the write transaction
+        with engine.connect() as conn:
+            batch = pd.read_sql(
+                text(f"SELECT rowid AS _rowid, * FROM {table} WHERE rowid > :after AND timestamp < :cutoff "
+                     f"ORDER BY rowid LIMIT :limit"),
+                conn, params={'after': after, 'cutoff': cutoff, 'limit': batch_rows}
+            )
+        if batch.empty:
+            return deleted
+
+        archive_rows(batch, table, archive_dir)
+        first, last = int(batch['_rowid'].min()), int(batch['_rowid'].max())
+        with engine.begin() as conn:
+            deleted += conn.execute(
+                text(f"DELETE FROM {table} WHERE rowid BETWEEN :first AND :last AND timestamp < :cutoff"),
+                {'first': first, 'last': last, 'cutoff': cutoff}
+            ).rowcount
+        after = last
+        logger.debug(f"Archived and deleted {table} rowids {first}-{last}")
+        if pause_seconds:
+            time.sleep(pause_seconds)
+
+
+def incremental_vacuum(engine, pages=RETENTION_VACUUM_PAGES, pause_seconds=RETENTION_PAUSE_SECONDS):
+    """
+    Return free pages to the filesystem a few at a time
+
+    Only works on databases with auto_vacuum=INCREMENTAL (see
+    enable_incremental_vacuum); other databases keep their free pages for reuse.
+
+    Returns:
+        Number of pages released
+    """
+    with engine.connect() as conn:
+        if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() != 2:
+            logger.warning("auto_vacuum is not INCREMENTAL; free pages stay in the file for reuse "
+                           "(run data_retention.py --convert-vacuum once to enable)")
+            return 0
+        start = free = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+        while free:
+            # Each step is its own short write transaction. pysqlite steps a pragma
+            # statement only once (freeing a single page); executescript runs it to completion
+            conn.connection.driver_connection.executescript(f"PRAGMA incremental_vacuum({pages})")
+            conn.commit()
+            remaining = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+            if remaining >= free:
+                break
+            free = remaining
+            if free and pause_seconds:
+                time.sleep(pause_seconds)
+        return start - free
+
+
+def enable_incremental_vacuum(db_path=None):
+    """
+    Switch an existing database to auto_vacuum=INCREMENTAL
+
+    This needs one full VACUUM, which rewrites and locks the whole file, so
+    run it once during a maintenance window rather than from retention.
+    New databases get the setting from storage on creation.
+    """
+    engine = _engine(db_path)
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.exec_driver_sql("VACUUM")
+        mode = conn.exec_driver_sql("PRAGMA auto_vacuum").scalar()
+    logger.info(f"auto_vacuum is now {mode} (2 = INCREMENTAL)")
+    return mode == 2
+
+
+def enforce_data_retention(db_path=None, retention_years=RETENTION_YEARS, tables=RETENTION_TABLES,
+                           archive_dir=None, batch_rows=RETENTION_BATCH_ROWS, pause_seconds=RETENTION_PAUSE_SECONDS):
+    """
+    Enforce data retention policy by archiving, then removing, data older than specified period
+
+    Expired rows are written to compressed, month-partitioned Parquet before
+    they are deleted in bounded rowid batches, and the freed pages are
+    released with incremental_vacuum steps. No step holds the write lock for
+    more than one batch, so the web app never waits on a full VACUUM.
+
+    Args:
+        db_path: SQLAlchemy engine, URL or database file holding every table
+            (default: each table's database, see storage.TABLE_DATABASES)
         retention_years: Number of years to keep data
-        
+        tables: Tables to sweep (each needs a timestamp column)
+        archive_dir: Archive root (default: RETENTION_ARCHIVE_DIR)
+        batch_rows: Rows archived and deleted per transaction
+        pause_seconds: Pause between batches
+
     Returns:
-        int: Number of records deleted
+        int: Number of records deleted (-1 on error)
     """
     try:
-        # Handle both engine objects and connection strings
-        if hasattr(db_path, 'connect'):
-            engine = db_path
-        else:
-            engine = create_engine(db_path)
         cutoff_date = datetime.now() - timedelta(days=365 * retention_years)
-        
-        with engine.connect() as conn:
-            # Delete records older than retention period
-            result = conn.execute(
-                text("DELETE FROM mbs_coupons WHERE timestamp < :cutoff_date"),
-                {"cutoff_date": cutoff_date}
-            )
-            
-            deleted_count = result.rowcount
-            logger.info(f"Data retention policy enforced: {deleted_count} records deleted (older than {cutoff_date})")
-            
-        # Vacuum database to reclaim space - must be outside transaction
-        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
-            conn.execute(text("VACUUM"))
-            
+        if db_path is None:
+            # Each table is swept in the database it lives in (see storage.TABLE_DATABASES)
+            from storage import database_path
+            databases = {}
+            for table in tables:
+                databases.setdefault(database_path(table), []).append(table)
+        else:
+            databases = {db_path: list(tables)}
+
+        deleted_count, released = 0, 0
+        for database, database_tables in databases.items():
+            engine = _engine(database)
+            with engine.connect() as conn:
+                database_tables = _existing_tables(conn, database_tables)
+
+            deleted_here = 0
+            for table in database_tables:
+                deleted = _expire_table(engine, table, cutoff_date, batch_rows, archive_dir, pause_seconds)
+                if deleted:
+                    logger.info(f"Archived and deleted {deleted} {table} rows older than {cutoff_date}")
+                deleted_here += deleted
+
+            if deleted_here:
+                released += incremental_vacuum(engine, pause_seconds=pause_seconds)
+            deleted_count += deleted_here
+        logger.info(f"Data retention policy enforced: {deleted_count} records deleted (older than {cutoff_date}), "
+                    f"{released} pages released")
         return deleted_count
-            
+
     except Exception as e:
         logger.error(f"Error enforcing data retention policy: {str(e)}")
-        return -1
\ No newline at end of file
+        return -1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive and delete expired bars")
+    parser.add_argument('--db', help="Database file (default: each table's database, see storage.TABLE_DATABASES)")
+    parser.add_argument('--years', type=float, default=RETENTION_YEARS, help="Years of data to keep")
+    parser.add_argument('--convert-vacuum', action='store_true',
+                        help="One-time full VACUUM to enable auto_vacuum=INCREMENTAL on an existing database")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.convert_vacuum:
+        enable_incremental_vacuum(args.db)
+    print(f"{enforce_data_retention(args.db, retention_years=args.years)} records deleted")
@@ -0,0 +1,167 @@
+import logging
+import os
+import threading
+from datetime import datetime
+
+from response_cache import cached_fetch, RESPONSE_CACHE_DEFAULT_TTL
+
+logger = logging.getLogger(__name__)
+
+# live:      Yahoo Finance bars and FRED series
+# simulated: deterministic local feed (market_simulator), no network access
+DATA_SOURCE = os.getenv('DATA_SOURCE', 'live').lower()
+
+# Cache lifetime for fetched windows that ended before today
+RESPONSE_CACHE_HISTORICAL_TTL = float(os.getenv('RESPONSE_CACHE_HISTORICAL_TTL', 7 * 24 * 3600))
+# FRED publishes these weekly; revalidation against last_updated avoids refetching
+FRED_CACHE_TTL = float(os.getenv('FRED_CACHE_TTL', 24 * 3600))
+
+
+class DataSource:
+    """
+    Where market data comes from
+
+    Bar sources implement fetch(), returning a yfinance-shaped DataFrame
+    (tz-aware index; Open/High/Low/Close/Volume columns) or None when there is
+    no data. Series sources implement fetch_series(), returning a pandas
+    Series indexed by observation date. ``host`` names the upstream for
+    per-host rate limiting.
+    """
+
+    host = None
+
+    def __init__(self, cache_ttl=None):
+        # Seconds a cached response may be reused (None = source default)
+        self.cache_ttl = cache_ttl
+
+    def fetch(self, ticker, period='5d', interval='1d', start=None, end=None):
+        raise NotImplementedError(f"{type(self).__name__} does not provide bars")
+
+    def fetch_series(self, series_id, observation_start=None):
+        raise NotImplementedError(f"{type(self).__name__} does not provide series")
+
+
+def _history_ttl(start, end):
+    """Windows that closed before today won't change, so they can be cached much longer"""
+    if end is not None and str(end)[:10] < datetime.now().strftime('%Y-%m-%d'):
+        return RESPONSE_CACHE_HISTORICAL_TTL
+    return RESPONSE_CACHE_DEFAULT_TTL
+
+
+class YahooSource(DataSource):
+    """Bar history for any ticker from Yahoo Finance, through the response cache"""
+
+    host = 'query1.finance.yahoo.com'
+
+    def fetch(self, ticker, period='5d', interval='1d', start=None, end=None):
+        params = {'ticker': ticker, 'period': period, 'interval': interval, 'start': start, 'end': end}
+
+        def fetch():
+            # yfinance is heavy to import and only needed when actually fetching
+            import yfinance as yf
+
+            mbb = yf.Ticker(ticker)
+            if start is not None:
+                logger.info(f"Fetching {interval} data for {ticker} from {start} to {end or 'now'}")
+                hist = mbb.history(start=start, end=end, interval=interval)
+            else:
+                logger.info(f"Fetching historical data for {ticker} over {period}")
+                hist = mbb.history(period=period, interval=interval)
+            # Don't record empty responses
+            return None if hist.empty else hist
+
+        ttl = _history_ttl(start, end) if self.cache_ttl is None else self.cache_ttl
+        return cached_fetch('yfinance.history', params, fetch, ttl=ttl)
+
+
+class FredSource(DataSource):
+    """Economic series from FRED, through the response cache"""
+
+    host = 'api.stlouisfed.org'
+
+    def __init__(self, cache_ttl=None):
+        super().__init__(cache_ttl)
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _fred(self):
+        """Create the FRED client on first use (replayed responses don't need an API key)"""
+        with self._lock:
+            if self._client is None:
+                from fredapi import Fred
+                self._client = Fred(api_key=os.getenv('FRED_API_KEY'))
+            return self._client
+
+    def fetch_series(self, series_id, observation_start=None):
+        params = {'series_id': series_id}
+        if observation_start is not None:
+            params['observation_start'] = str(observation_start)
+        return cached_fetch(
+            'fred.series',
+            params,
+            lambda: self._fred().get_series(series_id, observation_start=observation_start),
+            ttl=FRED_CACHE_TTL if self.cache_ttl is None else self.cache_ttl,
+            revalidate=lambda: str(self._fred().get_series_info(series_id)['last_updated'])
+        )
+
+
+def _simulated(**options):
+    # Only pulled in when asked for; the simulator needs pandas/numpy up front
+    from market_simulator import SimulatedMarketSource
+    return SimulatedMarketSource(**options)
+
+
+_BAR_SOURCES = {'live': YahooSource, 'simulated': _simulated}
+_SERIES_SOURCES = {'live': FredSource, 'simulated': _simulated}
+
+_overrides = {}
+_defaults = {}
+_defaults_lock = threading.Lock()
+
+
+def _kind(kind):
+    kind = (kind or DATA_SOURCE).lower()
+    if kind not in _BAR_SOURCES:
+        raise ValueError(f"Unknown data source {kind!r}; expected one of {sorted(_BAR_SOURCES)}")
+    return kind
+
+
+def create_bar_source(kind=None, **options):
+    """Build a new bar source of the given (default: configured) kind"""
+    return _BAR_SOURCES[_kind(kind)](**options)
+
+
+def create_series_source(kind=None, **options):
+    """Build a new series source of the given (default: configured) kind"""
+    return _SERIES_SOURCES[_kind(kind)](**options)
+
+
+def _get(role, factory):
+    if role in _overrides:
+        return _overrides[role]
+    with _defaults_lock:
+        if role not in _defaults:
+            _defaults[role] = factory()
+        return _defaults[role]
+
+
+def get_bar_source():
+    """Return the process-wide bar source (DATA_SOURCE unless overridden)"""
+    return _get('bars', create_bar_source)
+
+
+def get_series_source():
+    """Return the process-wide series source (DATA_SOURCE unless overridden)"""
+    return _get('series', create_series_source)
+
+
+def set_data_source(source):
+    """
+    Route all bar and series fetches through source (None restores DATA_SOURCE)
+
+    Used by benchmarks and load tests to swap in the simulator in-process.
+    """
+    if source is None:
+        _overrides.clear()
+    else:
+        _overrides['bars'] = _overrides['series'] = source
@@ -1,7 +1,5 @@
-import yfinance as yf
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,12 +11,16 @@ import pytz
 MIN_VALID_VOLUME = 100
 IGNORE_ZERO_VOLUME = True
 MAX_TIME_GAP_MINUTES = 90
+MAX_PRICE_SWING_PCT = 2.0
 
 def is_market_hours(dt):
-    """Check if datetime is within US market hours (9:30 AM - 4:00 PM ET)"""
-    if not dt.tzinfo:
-        dt = pytz.utc.localize(dt)
-    et_time = dt.astimezone(pytz.timezone('US/Eastern'))
+    """
+    Check if datetime is within US market hours (9:30 AM - 4:00 PM ET)
+
+    Naive datetimes are exchange wall-clock time, like stored bars (see
+    market_hours_mask, which follows the same convention).
+    """
+    et_time = dt.astimezone(pytz.timezone('US/Eastern')) if dt.tzinfo else dt
     if et_time.weekday() >= 5:  # Weekend
         return False
     return (et_time.hour > 9 or (et_time.hour == 9 and et_time.minute >= 30)) and et_time.hour < 16
@@ -35,32 +37,97 @@ def validate_volume(data_df, min_volume=MIN_VALID_VOLUME, ignore_zero=IGNORE_ZER
         return False
     return True
 
-def validate_time_continuity(data_df, max_gap_minutes=MAX_TIME_GAP_MINUTES):
-    """Check for gaps in timestamp data during market hours"""
+# Regular session in exchange wall-clock minutes since midnight
+MARKET_OPEN_MINUTE = 9 * 60 + 30
+MARKET_CLOSE_MINUTE = 16 * 60
+_MINUTES_PER_DAY = 24 * 60
+
+def _exchange_minutes(timestamps):
+    """
+    Timestamps as int64 exchange wall-clock minutes since the epoch (floored)
+
+    Naive timestamps are already exchange wall-clock time (see
+    data_collector.frame_to_bars); tz-aware ones are converted to New York.
+    """
+    index = pd.DatetimeIndex(timestamps)
+    if index.tz is not None:
+        index = index.tz_convert('America/New_York').tz_localize(None)
+    return index.to_numpy().astype('datetime64[m]').astype('int64')
+
+def market_hours_mask(timestamps):
+    """
+    Vectorized is_market_hours for a whole timestamp column
+
+    Args:
+        timestamps: Series/array of naive exchange wall-clock or tz-aware timestamps
+
+    Returns:
+        numpy bool array, True for weekday timestamps between 9:30 AM and 4:00 PM ET
+    """
+    minutes = _exchange_minutes(timestamps)
+    days, minute_of_day = np.divmod(minutes, _MINUTES_PER_DAY)
+    # 1970-01-01 was a Thursday; shift so Monday == 0
+    weekday = (days + 3) % 7
+    return (weekday < 5) & (minute_of_day >= MARKET_OPEN_MINUTE) & (minute_of_day < MARKET_CLOSE_MINUTE)
+
+def find_time_gaps(data_df, max_gap_minutes=MAX_TIME_GAP_MINUTES):
+    """
+    Locate in-session gaps between consecutive bars
+
+    A gap is in-session when both bars fall inside market hours on the same
+    day; overnight, weekend and holiday breaks are not gaps, and whole
+    missing sessions are left to the backfill job.
+
+    Args:
+        data_df: DataFrame with a 'timestamp' column
+        max_gap_minutes: Report gaps longer than this (0 reports every step)
+
+    Returns:
+        (largest in-session gap in minutes, DataFrame of gaps with
+        start, end and minutes columns, ordered by start)
+    """
     if len(data_df) <= 1:
-        return True
-        
-    sorted_df = data_df.sort_values('timestamp')
-    time_diffs = sorted_df['timestamp'].diff().dropna()
-    
-    # Find largest gap during market hours
-    max_diff = 0
-    for idx, diff in time_diffs.items():
-        prev_time = sorted_df.loc[idx - 1, 'timestamp']
-        curr_time = sorted_df.loc[idx, 'timestamp']
-        
-        if is_market_hours(prev_time) and is_market_hours(curr_time):
-            diff_minutes = diff.total_seconds() / 60
-            if diff_minutes > max_diff:
-                max_diff = diff_minutes
-    
-    if max_diff > max_gap_minutes:
-        logger.warning(f"Market hour time gap exceeds threshold: {max_diff} minutes > {max_gap_minutes} minutes")
-        return False
-    return True
+        return 0.0, pd.DataFrame(columns=['start', 'end', 'minutes'])
 
-# Remove the duplicate validate_time_continuity function
-def validate_price_variance(data_df, max_swing_pct=2.0):
+    index = pd.DatetimeIndex(data_df['timestamp']).sort_values()
+    minutes = _exchange_minutes(index)
+    in_session = market_hours_mask(index)
+    same_day = (minutes[1:] // _MINUTES_PER_DAY) == (minutes[:-1] // _MINUTES_PER_DAY)
+    steps = np.diff(index.to_numpy()) / np.timedelta64(1, 'm')
+    counted = in_session[1:] & in_session[:-1] & same_day
+
+    largest = float(steps[counted].max()) if counted.any() else 0.0
+    positions = np.flatnonzero(counted & (steps > max_gap_minutes))
+    gaps = pd.DataFrame({
+        'start': index[positions],
+        'end': index[positions + 1],
+        'minutes': steps[positions]
+    })
+    return largest, gaps
+
+def validate_time_continuity(data_df, max_gap_minutes=MAX_TIME_GAP_MINUTES, return_gaps=False):
+    """
+    Check for gaps in timestamp data during market hours
+
+    Args:
+        data_df: DataFrame with a 'timestamp' column
+        max_gap_minutes: Longest acceptable in-session gap
+        return_gaps: Also return the offending gaps (see find_time_gaps)
+
+    Returns:
+        True if no in-session gap exceeds max_gap_minutes; with return_gaps,
+        a (passed, gaps DataFrame) tuple
+    """
+    largest, gaps = find_time_gaps(data_df, max_gap_minutes)
+    passed = gaps.empty
+    if not passed:
+        logger.warning(
+            f"Market hour time gap exceeds threshold: {largest} minutes > {max_gap_minutes} minutes "
+            f"({len(gaps)} gaps, first at {gaps['start'].iloc[0]})"
+        )
+    return (passed, gaps) if return_gaps else passed
+
+def validate_price_variance(data_df, max_swing_pct=MAX_PRICE_SWING_PCT):
     """Check if price swings exceed threshold"""
     high_low_pct = ((data_df['high'] - data_df['low']) / data_df['low']) * 100
     if high_low_pct.max() > max_swing_pct:
@@ -68,84 +135,41 @@ def validate_price_variance(data_df, max_swing_pct=2.0):
         return False
     return True
 
-# Remove this duplicate function - KEEP THE MARKET-HOUR AWARE VERSION ABOVE
-# def validate_time_continuity(data_df, max_gap_minutes=20):
-    """Check for gaps in timestamp data"""
-    if len(data_df) <= 1:
-        return True
-        
-    sorted_df = data_df.sort_values('timestamp')
-    time_diffs = sorted_df['timestamp'].diff().dropna()
-    max_diff = time_diffs.max().total_seconds() / 60
-    
-    if max_diff > max_gap_minutes:
-        logger.warning(f"Time gap exceeds threshold: {max_diff} minutes > {max_gap_minutes} minutes")
-        return False
-    return True
-
-def validate_mort_correlation(mbb_data, lookback_days=30, min_correlation=0.7):
+def validate_mort_correlation(mbb_data=None, lookback_days=30, min_correlation=0.7, db_path=None):
     """
-    Compare MBB price movements with Treasury yields as fallback
+    Compare MBB daily returns with ^MORT, falling back to Treasury yields
+
+    Uses the rolling correlations maintained from stored daily bars (see
+    correlation_tracker), so no network round trip is needed. The window
+    is the configured one closest to lookback_days of sessions.
+
+    Args:
+        mbb_data: Unused; MBB closes come from stored daily bars. Kept so
+            existing callers don't change.
+        lookback_days: Calendar days the correlation should cover
+        min_correlation: Lowest acceptable correlation
+        db_path: Database file (default: MBB_DB_PATH)
     """
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=lookback_days)
-    
     try:
-        # First try ^TNX (10-Year Treasury Yield)
-        treasury_data = yf.download('^TNX', 
-                                  start=start_date.strftime('%Y-%m-%d'),
-                                  end=end_date.strftime('%Y-%m-%d'),
-                                  interval='1d')
-        
-        # Fallback to ^TYX (30-Year) if needed
-        if len(treasury_data) < 5:
-            treasury_data = yf.download('^TYX', 
-                                      start=start_date.strftime('%Y-%m-%d'),
-                                      end=end_date.strftime('%Y-%m-%d'),
-                                      interval='1d')
-
-        # Get ^MORT data
-        mort_data = yf.download(
-            "^MORT", 
-            start=start_date.strftime('%Y-%m-%d'),
-            end=end_date.strftime('%Y-%m-%d'),
-            interval='1d'
-        )
-        
-        # Get MBB data if not provided
-        if mbb_data is None or len(mbb_data) == 0:
-            mbb_data = yf.download(
-                "MBB", 
-                start=start_date.strftime('%Y-%m-%d'),
-                end=end_date.strftime('%Y-%m-%d'),
-                interval='1d'
-            )
+        from correlation_tracker import get_tracker, window_for_lookback
         
-        # Ensure we have enough data points
-        if len(mort_data) < 5 or len(mbb_data) < 5:
-            logger.warning(f"Insufficient data points for correlation: MORT={len(mort_data)}, MBB={len(mbb_data)}")
-            return False
-            
-        # Calculate daily returns
-        mort_returns = mort_data['Close'].pct_change().dropna()
-        mbb_returns = mbb_data['Close'].pct_change().dropna()
+        tracker = get_tracker(db_path)
+        # Local only: folds in any daily bars stored since the last update
+        tracker.update()
+        window = window_for_lookback(lookback_days, tracker.windows)
         
-        # Align dates and calculate correlation
-        common_dates = sorted(set(mort_returns.index) & set(mbb_returns.index))
-        if len(common_dates) < 5:
-            logger.warning(f"Insufficient common dates for correlation: {len(common_dates)}")
+        # ^MORT first, then ^TNX (10-Year) and ^TYX (30-Year) as fallbacks
+        latest = [row for row in tracker.latest(window=window) if row['pairs'] >= 5]
+        if not latest:
+            logger.warning(f"Insufficient data points for {window}-day MBB reference correlation")
             return False
-            
-        mort_aligned = mort_returns.loc[common_dates]
-        mbb_aligned = mbb_returns.loc[common_dates]
-        
-        correlation = mort_aligned.corr(mbb_aligned)
         
+        reference, correlation = latest[0]['reference'], latest[0]['correlation']
         if correlation < min_correlation:
-            logger.warning(f"MBB-MORT correlation below threshold: {correlation:.2f} < {min_correlation}")
+            logger.warning(f"MBB-{reference} correlation below threshold: {correlation:.2f} < {min_correlation}")
             return False
             
-        logger.info(f"MBB-MORT correlation: {correlation:.2f}")
+        logger.info(f"MBB-{reference} correlation: {correlation:.2f}")
         return True
         
     except Exception as e:
@@ -0,0 +1,169 @@
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from data_collector import initialize_db, frame_to_bars, upsert_bars
+from data_sources import get_bar_source
+from rate_limiter import RateLimiter, RATE_LIMIT_METRICS_DIR
+from storage import session_scope
+from user_agent_rotation import UserAgentRotator
+
+logger = logging.getLogger(__name__)
+
+# Instruments collected into market_bars (MBS ETFs, treasury yields, mortgage index)
+DEFAULT_INSTRUMENTS = ['MBB', 'VMBS', 'JMBS', '^TNX', '^TYX', '^FVX', '^MORT']
+COLLECTOR_INSTRUMENTS = [
+    ticker.strip() for ticker in os.getenv('COLLECTOR_INSTRUMENTS', ','.join(DEFAULT_INSTRUMENTS)).split(',')
+    if ticker.strip()
+]
+COLLECTOR_MAX_WORKERS = int(os.getenv('COLLECTOR_MAX_WORKERS', 4))
+COLLECTOR_MIN_DELAY_SECONDS = float(os.getenv('COLLECTOR_MIN_DELAY_SECONDS', 3))
+# Requests a host may receive back to back before the delay kicks in
+COLLECTOR_BURST = int(os.getenv('COLLECTOR_BURST', 1))
+
+
+# Process-wide limiter so every collector shares the same per-host budget; its
+# metrics are published per program (collect_data, intraday_collector, ...)
+default_rate_limiter = RateLimiter.from_min_delay(
+    COLLECTOR_MIN_DELAY_SECONDS, burst=COLLECTOR_BURST, user_agent_policy=UserAgentRotator(),
+    metrics_path=os.path.join(
+        RATE_LIMIT_METRICS_DIR, f"{os.path.splitext(os.path.basename(sys.argv[0]))[0] or 'python'}.json"
+    )
+)
+
+
+def _fetch_concurrently(tickers, fetcher, rate_limiter, max_workers, fetch_kwargs):
+    """Yield (ticker, frame, error) as each fetch on the thread pool completes"""
+
+    def fetch_one(ticker):
+        waited = rate_limiter.acquire(fetcher.host)
+        if waited > 0.01:
+            logger.debug(f"Rate limiter held {ticker} for {waited:.2f}s")
+        return fetcher.fetch(ticker, **fetch_kwargs)
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='collector') as pool:
+        futures = {pool.submit(fetch_one, ticker): ticker for ticker in tickers}
+        for future in as_completed(futures):
+            ticker = futures[future]
+            try:
+                yield ticker, future.result(), None
+            except Exception as e:
+                yield ticker, None, e
+
+
+def fetch_instruments(tickers, fetcher=None, rate_limiter=None, max_workers=COLLECTOR_MAX_WORKERS, **fetch_kwargs):
+    """
+    Fetch history for several tickers concurrently on a thread pool
+
+    Args:
+        tickers: Ticker symbols to fetch
+        fetcher: DataSource, or any object with a ``host`` attribute and
+                 ``fetch(ticker, **kwargs)`` (default: configured bar source)
+        rate_limiter: RateLimiter shared across calls (default: process-wide)
+        max_workers: Thread pool size
+        **fetch_kwargs: period/interval/start/end passed to the fetcher
+
+    Returns:
+        dict of ticker -> DataFrame (None when the fetch failed or was empty)
+    """
+    results = {}
+    for ticker, hist_data, error in _fetch_concurrently(
+            tickers, fetcher or get_bar_source(), rate_limiter or default_rate_limiter, max_workers, fetch_kwargs):
+        if error is not None:
+            logger.error(f"Error fetching {ticker}: {str(error)}")
+        results[ticker] = hist_data
+    return results
+
+
+def write_bars(session, ticker, bars):
+    """
+    Upsert bars (see frame_to_bars) for one ticker into market_bars
+
+    MBB bars are also upserted into mbb_coupons, which the web app reads.
+    Nothing is committed, so callers can add their own rows to the transaction.
+
+    Returns:
+        dict with 'inserted', 'updated' and 'skipped' counts for market_bars
+    """
+    counts = upsert_bars(session, bars, ticker=ticker)
+    if ticker == 'MBB':
+        upsert_bars(session, bars)
+    return counts
+
+
+def store_bars(ticker, hist_data, db_path=None):
+    """
+    Upsert a fetched history frame for one ticker in its own transaction
+
+    Returns:
+        dict with 'inserted', 'updated' and 'skipped' counts for market_bars
+    """
+    with session_scope(db_path) as session:
+        return write_bars(session, ticker, frame_to_bars(hist_data))
+
+
+def collect_instruments(instruments=None, fetcher=None, rate_limiter=None, max_workers=COLLECTOR_MAX_WORKERS,
+                        db_path=None, **fetch_kwargs):
+    """
+    Fetch all configured instruments concurrently and upsert them into market_bars
+
+    Fetching runs on the thread pool; writes happen on the calling thread as
+    each fetch completes, so SQLite only ever sees one writer.
+
+    Args:
+        instruments: Ticker symbols (default: COLLECTOR_INSTRUMENTS)
+        fetcher: DataSource (default: configured bar source)
+        rate_limiter: RateLimiter (default: process-wide)
+        max_workers: Thread pool size
+        db_path: Database file (default: MBB_DB_PATH)
+        **fetch_kwargs: period/interval/start/end passed to the fetcher
+
+    Returns:
+        dict of ticker -> {'inserted', 'updated', 'skipped'} counts, or None on failure
+    """
+    instruments = instruments or COLLECTOR_INSTRUMENTS
+    initialize_db(db_path)
+
+    results = {}
+    started = time.perf_counter()
+    for ticker, hist_data, error in _fetch_concurrently(
+            instruments, fetcher or get_bar_source(), rate_limiter or default_rate_limiter, max_workers, fetch_kwargs):
+        results[ticker] = None
+        if error is not None:
+            logger.error(f"Error fetching {ticker}: {str(error)}")
+            continue
+        if hist_data is None or hist_data.empty:
+            logger.warning(f"No data collected for {ticker}")
+            continue
+
+        try:
+            results[ticker] = store_bars(ticker, hist_data, db_path=db_path)
+        except Exception as e:
+            logger.error(f"Error storing {ticker}: {str(e)}")
+            continue
+
+        if results[ticker]['inserted'] or results[ticker]['updated']:
+            bars = frame_to_bars(hist_data)
+            # Readers are served from the price cache once it is built, and long ranges from the rollups
+            from price_cache import cache_stored_bars
+            cache_stored_bars(ticker, bars, db_path=db_path)
+            from rollups import roll_up_stored_bars
+            roll_up_stored_bars(ticker, bars['timestamp'].min(), bars['timestamp'].max(), db_path=db_path)
+
+    elapsed = time.perf_counter() - started
+    collected = sum(1 for counts in results.values() if counts is not None)
+    logger.info(f"Collected {collected}/{len(instruments)} instruments in {elapsed:.2f}s")
+
+    mbb_counts = results.get('MBB')
+    if mbb_counts and (mbb_counts['inserted'] or mbb_counts['updated']):
+        # Publish the new latest bar to in-process readers
+        from market_snapshot import refresh_snapshot
+        refresh_snapshot()
+
+    return results
+
+
+if __name__ == "__main__":
+    collect_instruments()
@@ -0,0 +1,270 @@
+import logging
+import math
+import os
+import re
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import pytz
+
+from data_collector import initialize_db, frame_to_bars, CollectorCheckpoint, MarketBar
+from data_sources import create_bar_source
+from data_validation import is_market_hours
+from instrument_collector import default_rate_limiter, write_bars, COLLECTOR_MAX_WORKERS
+from market_calendar import is_trading_day, next_session_open
+from storage import session_scope
+from streaming_validation import StreamingValidator, write_validations, STREAM_REFERENCE_TICKER
+
+logger = logging.getLogger(__name__)
+
+# The streaming validator's reference is collected too, so every bar gets a running correlation
+INTRADAY_INSTRUMENTS = [
+    ticker.strip() for ticker in os.getenv('INTRADAY_INSTRUMENTS', f'MBB,{STREAM_REFERENCE_TICKER}').split(',')
+    if ticker.strip()
+]
+INTRADAY_INTERVAL = os.getenv('INTRADAY_INTERVAL', '1m')
+# Seconds to wait after a bar closes before asking for it (upstream publishing delay)
+INTRADAY_POLL_LAG_SECONDS = float(os.getenv('INTRADAY_POLL_LAG_SECONDS', 5))
+# Longest sleep outside market hours, so config changes and signals are noticed
+INTRADAY_IDLE_SECONDS = float(os.getenv('INTRADAY_IDLE_SECONDS', 300))
+# How far back a first run (or a long outage) reaches; Yahoo keeps 1m bars for 7 days
+INTRADAY_LOOKBACK_DAYS = int(os.getenv('INTRADAY_LOOKBACK_DAYS', 5))
+
+EASTERN = pytz.timezone('US/Eastern')
+_INTERVAL_UNITS = {'m': 'minutes', 'h': 'hours', 'd': 'days'}
+
+
+def interval_to_timedelta(interval):
+    """Convert a yfinance bar size such as '1m', '15m' or '1h' to a timedelta"""
+    match = re.fullmatch(r'(\d+)([mhd])', interval)
+    if not match:
+        raise ValueError(f"Unsupported interval {interval!r}")
+    return timedelta(**{_INTERVAL_UNITS[match.group(2)]: int(match.group(1))})
+
+
+def _utcnow():
+    return datetime.now(timezone.utc)
+
+
+class IntradayCollector:
+    """
+    Long-running poller that appends closed intraday bars as they appear
+
+    Each poll fetches every instrument from its checkpoint (the last committed
+    bar), upserts only bars that are both newer than the checkpoint and
+    already closed, and advances the checkpoint in the same transaction, so
+    a crash never loses or double-counts a bar. New bars are validated
+    incrementally and their per-bar results are written in that same
+    transaction. After commit the new bars are handed to the registered
+    consumers.
+    """
+
+    def __init__(self, instruments=None, interval=INTRADAY_INTERVAL, fetcher=None, rate_limiter=None,
+                 max_workers=COLLECTOR_MAX_WORKERS, db_path=None, consumers=None, clock=_utcnow,
+                 poll_lag_seconds=INTRADAY_POLL_LAG_SECONDS, idle_seconds=INTRADAY_IDLE_SECONDS, validator=None):
+        """
+        Args:
+            instruments: Ticker symbols (default: INTRADAY_INSTRUMENTS)
+            interval: Bar size to collect
+            fetcher: DataSource (default: configured bar source, uncached)
+            rate_limiter: Shared per-host limiter (default: process-wide)
+            max_workers: Thread pool size for fetching
+            db_path: Database file (default: MBB_DB_PATH)
+            consumers: Callables ``consumer(ticker, bars)`` run after each commit (default: refresh the
+                market snapshot, the price cache and the rollups)
+            clock: Returns the current tz-aware time (injectable for tests)
+            poll_lag_seconds: Delay after a bar closes before polling for it
+            idle_seconds: Longest sleep while the market is closed
+            validator: StreamingValidator checking new bars before they are
+                committed (default: one with the STREAM_* settings)
+        """
+        self.instruments = list(instruments or INTRADAY_INSTRUMENTS)
+        self.interval = interval
+        self.step = interval_to_timedelta(interval)
+        self.fetcher = fetcher or create_bar_source(cache_ttl=0)
+        self.rate_limiter = rate_limiter or default_rate_limiter
+        self.max_workers = max_workers
+        self.db_path = db_path
+        self.consumers = list(consumers) if consumers is not None else [refresh_snapshot_consumer,
+                                                                        self._update_price_cache,
+                                                                        self._update_rollups]
+        self.clock = clock
+        self.poll_lag_seconds = poll_lag_seconds
+        self.idle_seconds = idle_seconds
+        self.validator = validator or StreamingValidator()
+        if self.validator.reference not in self.instruments:
+            logger.warning(f"Reference {self.validator.reference} is not collected intraday; "
+                           f"bar correlations will stay empty")
+        self.checkpoints = {}
+        self._stop = threading.Event()
+
+    def add_consumer(self, consumer):
+        """Register a downstream consumer called as ``consumer(ticker, bars)`` after each commit"""
+        self.consumers.append(consumer)
+
+    def _update_price_cache(self, ticker, bars):
+        """Default consumer: append committed bars to the memory-mapped price cache"""
+        from price_cache import price_cache_consumer
+        price_cache_consumer(ticker, bars, db_path=self.db_path)
+
+    def _update_rollups(self, ticker, bars):
+        """Default consumer: fold committed bars into the hourly, daily and weekly rollups"""
+        from rollups import rollup_consumer
+        rollup_consumer(ticker, bars, db_path=self.db_path)
+
+    def load_checkpoints(self):
+        """
+        Restore the last committed bar per instrument
+
+        Instruments without a checkpoint resume from their newest stored
+        intraday bar, or start INTRADAY_LOOKBACK_DAYS back.
+        """
+        initialize_db(self.db_path)
+        floor = self._now_exchange() - timedelta(days=INTRADAY_LOOKBACK_DAYS)
+        with session_scope(self.db_path) as session:
+            saved = dict(
+                session.query(CollectorCheckpoint.ticker, CollectorCheckpoint.last_bar)
+                .filter(CollectorCheckpoint.interval == self.interval)
+                .all()
+            )
+            for ticker in self.instruments:
+                last_bar = saved.get(ticker)
+                if last_bar is None:
+                    last_bar = session.query(MarketBar.timestamp).filter(
+                        MarketBar.ticker == ticker,
+                        MarketBar.timestamp >= floor
+                    ).order_by(MarketBar.timestamp.desc()).limit(1).scalar()
+                if last_bar is not None and last_bar < floor:
+                    # Older holes are the backfill job's business
+                    logger.warning(f"{ticker} checkpoint {last_bar} is older than the intraday lookback")
+                    last_bar = None
+                self.checkpoints[ticker] = last_bar or floor
+        logger.info(f"Resuming {self.interval} collection from {self.checkpoints}")
+        return self.checkpoints
+
+    def _now_exchange(self):
+        """Current exchange wall-clock time, naive like stored bar timestamps"""
+        return self.clock().astimezone(EASTERN).replace(tzinfo=None)
+
+    def _fetch(self, ticker):
+        self.rate_limiter.acquire(self.fetcher.host)
+        start = self.checkpoints[ticker].date().isoformat()
+        return self.fetcher.fetch(ticker, interval=self.interval, start=start)
+
+    def poll_once(self):
+        """
+        Fetch, store and publish new closed bars for every instrument
+
+        Returns:
+            dict of ticker -> number of new bars committed (None on failure)
+        """
+        if not self.checkpoints:
+            self.load_checkpoints()
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='intraday') as pool:
+            futures = {ticker: pool.submit(self._fetch, ticker) for ticker in self.instruments}
+            # Writes stay on this thread so SQLite only sees one writer
+            for ticker, future in futures.items():
+                try:
+                    results[ticker] = self._commit(ticker, future.result())
+                except Exception as e:
+                    logger.error(f"Error collecting {ticker}: {str(e)}")
+                    results[ticker] = None
+        return results
+
+    def _commit(self, ticker, hist_data):
+        if hist_data is None or hist_data.empty:
+            return 0
+
+        now = self._now_exchange()
+        bars = frame_to_bars(hist_data)
+        # Only bars that have closed, and that we haven't committed yet
+        bars = bars[(bars['timestamp'] > self.checkpoints[ticker]) & (bars['timestamp'] + self.step <= now)]
+        if bars.empty:
+            return 0
+
+        last_bar = bars['timestamp'].iloc[-1].to_pydatetime()
+        try:
+            with session_scope(self.db_path) as session:
+                if ticker not in self.validator:
+                    self.validator.prime(session, ticker, before=bars['timestamp'].iloc[0],
+                                         session_only=self.step < timedelta(days=1))
+                results = self.validator.validate(ticker, bars)
+                write_bars(session, ticker, bars)
+                write_validations(session, ticker, results)
+                session.merge(CollectorCheckpoint(
+                    ticker=ticker, interval=self.interval, last_bar=last_bar, updated_at=datetime.now()
+                ))
+        except Exception:
+            # The rolling state already includes these bars; rebuild it from what was committed
+            self.validator.forget(ticker)
+            raise
+        self.checkpoints[ticker] = last_bar
+
+        latency = (now - (last_bar + self.step)).total_seconds()
+        flagged = int((~results['passed']).sum())
+        logger.info(f"Committed {len(bars)} new {ticker} bars through {last_bar} "
+                    f"({latency:.1f}s after close, {flagged} flagged)")
+
+        for consumer in self.consumers:
+            try:
+                consumer(ticker, bars)
+            except Exception as e:
+                logger.error(f"Consumer {getattr(consumer, '__name__', consumer)} failed for {ticker}: {str(e)}")
+        return len(bars)
+
+    def should_poll(self, now=None):
+        """Whether bars can be closing now: a trading day, in session or just after the close"""
+        now = now or self.clock()
+        grace = self.step + timedelta(seconds=2 * self.poll_lag_seconds)
+        return is_trading_day(now.astimezone(EASTERN).date()) and (
+            is_market_hours(now) or is_market_hours(now - grace)
+        )
+
+    def seconds_until_next_poll(self, now=None):
+        """Sleep until the next bar close plus the poll lag, or toward the next session open"""
+        now = now or self.clock()
+        if self.should_poll(now):
+            step = self.step.total_seconds()
+            next_close = math.floor(now.timestamp() / step) * step + step
+            return max(next_close + self.poll_lag_seconds - now.timestamp(), 0.0)
+        until_open = (next_session_open(now) - now).total_seconds() + self.poll_lag_seconds
+        return max(min(until_open, self.idle_seconds), 0.0)
+
+    def run(self):
+        """Poll until stop() is called; always catches up once on start"""
+        self.load_checkpoints()
+        if self._update_price_cache in self.consumers:
+            # Bars committed before a crash may never have reached the cache
+            from price_cache import reconcile_price_caches
+            reconcile_price_caches(db_path=self.db_path)
+        self.poll_once()
+        while not self._stop.is_set():
+            if self._stop.wait(self.seconds_until_next_poll()):
+                break
+            if self.should_poll():
+                started = time.perf_counter()
+                self.poll_once()
+                logger.debug(f"Poll took {time.perf_counter() - started:.2f}s")
+        logger.info("Intraday collector stopped")
+
+    def stop(self):
+        self._stop.set()
+
+
+def refresh_snapshot_consumer(ticker, bars):
+    """Publish a new latest MBB bar to in-process readers"""
+    if ticker == 'MBB':
+        from market_snapshot import refresh_snapshot
+        refresh_snapshot()
+
+
+if __name__ == "__main__":
+    collector = IntradayCollector()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *args: collector.stop())
+    collector.run()
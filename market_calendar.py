@@ -0,0 +1,79 @@
+import pandas as pd
+from pandas.tseries.holiday import (
+    AbstractHolidayCalendar, Holiday, GoodFriday, USLaborDay, USMartinLutherKingJr,
+    USMemorialDay, USPresidentsDay, USThanksgivingDay, nearest_workday, sunday_to_monday
+)
+from pandas.tseries.offsets import CustomBusinessDay
+
+
+class NYSEHolidayCalendar(AbstractHolidayCalendar):
+    """
+    US equity market holidays (full-day closures)
+
+    Unlike USFederalHolidayCalendar this includes Good Friday and excludes
+    Columbus Day and Veterans Day, when the exchanges are open.
+    """
+    rules = [
+        # A Saturday New Year's Day is not observed on the Friday before
+        Holiday('New Years Day', month=1, day=1, observance=sunday_to_monday),
+        USMartinLutherKingJr,
+        USPresidentsDay,
+        GoodFriday,
+        USMemorialDay,
+        Holiday('Juneteenth', month=6, day=19, start_date='2022-01-01', observance=nearest_workday),
+        Holiday('Independence Day', month=7, day=4, observance=nearest_workday),
+        USLaborDay,
+        USThanksgivingDay,
+        Holiday('Christmas', month=12, day=25, observance=nearest_workday)
+    ]
+
+
+_calendar = NYSEHolidayCalendar()
+TRADING_DAY = CustomBusinessDay(calendar=_calendar)
+
+
+def holidays(start, end):
+    """Return market holidays between start and end (inclusive)"""
+    return _calendar.holidays(start=pd.Timestamp(start), end=pd.Timestamp(end))
+
+
+def trading_days(start, end):
+    """
+    Return the trading sessions between start and end (inclusive)
+
+    Args:
+        start: First date to consider
+        end: Last date to consider
+
+    Returns:
+        DatetimeIndex of session dates (midnight, tz-naive)
+    """
+    start = pd.Timestamp(start).normalize()
+    end = pd.Timestamp(end).normalize()
+    if end < start:
+        return pd.DatetimeIndex([])
+    return pd.date_range(start, end, freq=TRADING_DAY)
+
+
+def is_trading_day(date):
+    """Check whether date is a trading session"""
+    date = pd.Timestamp(date).normalize()
+    return len(trading_days(date, date)) == 1
+
+
+def next_session_open(now):
+    """
+    Return the next regular-session open (9:30 ET) strictly after now
+
+    Args:
+        now: tz-aware datetime
+
+    Returns:
+        tz-aware Timestamp in US/Eastern
+    """
+    now = pd.Timestamp(now).tz_convert('US/Eastern')
+    for day in trading_days(now.date(), now.date() + pd.Timedelta(days=14)):
+        session_open = pd.Timestamp(day.date()).tz_localize('US/Eastern') + pd.Timedelta(hours=9, minutes=30)
+        if session_open > now:
+            return session_open
+    raise ValueError(f"No trading session found in the two weeks after {now}")
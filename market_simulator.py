@@ -0,0 +1,199 @@
+import hashlib
+import re
+import time
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from data_sources import DataSource
+from market_calendar import trading_days
+
+# Instrument profiles: starting level, daily volatility (fraction of level) and shares per session
+INSTRUMENT_PROFILES = {
+    'MBB': (95.0, 0.003, 1_500_000),
+    'VMBS': (46.0, 0.003, 900_000),
+    'JMBS': (45.0, 0.0035, 150_000),
+    '^TNX': (4.3, 0.02, 0),
+    '^TYX': (4.5, 0.018, 0),
+    '^FVX': (4.2, 0.022, 0),
+    '^MORT': (7.0, 0.01, 0),
+}
+# FRED series simulated from an instrument's path
+SERIES_PROFILES = {'MORTGAGE30US': '^MORT', 'GS10': '^TNX'}
+
+# Day 0 of every simulated path; paths are drawn once per (seed, ticker) up to PATH_DAYS
+EPOCH = pd.Timestamp('2000-01-01')
+PATH_DAYS = 40_000
+SESSION_MINUTES = 390
+_INTERVAL_MINUTES = {'m': 1, 'h': 60}
+_PERIOD_UNITS = {'d': 'days', 'wk': 'weeks', 'mo': 'months', 'y': 'years'}
+
+
+def _stable_seed(*parts):
+    """Seed derived from parts that is identical across processes (unlike hash())"""
+    digest = hashlib.sha256('|'.join(map(str, parts)).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'little')
+
+
+def _profile(ticker):
+    if ticker in INSTRUMENT_PROFILES:
+        return INSTRUMENT_PROFILES[ticker]
+    # Unknown tickers (e.g. synthetic load-test symbols) get a stable random profile
+    rng = np.random.default_rng(_stable_seed('profile', ticker))
+    return (float(rng.uniform(20, 200)), float(rng.uniform(0.002, 0.01)), int(rng.integers(10_000, 2_000_000)))
+
+
+@lru_cache(maxsize=1024)
+def _daily_path(seed, ticker):
+    """
+    Per-calendar-day draws since EPOCH for one instrument
+
+    Returns:
+        (levels, wick_noise, volume_noise): session-open levels following a
+        mean-reverting geometric random walk, plus standard-normal draws used
+        for daily bar wicks and volumes
+    """
+    level, volatility, _ = _profile(ticker)
+    rng = np.random.default_rng(_stable_seed(seed, ticker, 'daily'))
+    steps, wick_noise, volume_noise = rng.normal(0, 1, (3, PATH_DAYS))
+    # AR(1) in log space, x[i] = phi * x[i-1] + step[i], evaluated in closed form;
+    # mild mean reversion keeps decades of history in a realistic range
+    phi = 0.999
+    powers = phi ** np.arange(PATH_DAYS)
+    log_path = powers * np.cumsum(steps * volatility / powers)
+    return level * np.exp(log_path - log_path[0]), wick_noise, volume_noise
+
+
+def _bar_minutes(interval):
+    match = re.fullmatch(r'(\d+)([mh])', interval)
+    if not match:
+        return None
+    return int(match.group(1)) * _INTERVAL_MINUTES[match.group(2)]
+
+
+def _resolve_window(period, start, end, now):
+    """Turn yfinance-style period/start/end into an inclusive [first, last] date range"""
+    today = now.normalize().tz_localize(None)
+    last = pd.Timestamp(end).normalize() - pd.Timedelta(days=1) if end is not None else today
+    if start is not None:
+        return pd.Timestamp(start).normalize(), last
+    if period == 'max':
+        return EPOCH, last
+    if period == 'ytd':
+        return pd.Timestamp(year=last.year, month=1, day=1), last
+    match = re.fullmatch(r'(\d+)(d|wk|mo|y)', period)
+    if not match:
+        raise ValueError(f"Unsupported period {period!r}")
+    amount, unit = int(match.group(1)), _PERIOD_UNITS[match.group(2)]
+    if unit == 'days':
+        # Like Yahoo, '5d' means the last five sessions
+        sessions = trading_days(last - pd.Timedelta(days=amount * 2 + 10), last)
+        return sessions[-amount] if len(sessions) >= amount else sessions[0], last
+    return last - pd.DateOffset(**{unit: amount}), last
+
+
+class SimulatedMarketSource(DataSource):
+    """
+    Deterministic local market feed for offline benchmarks and load tests
+
+    Bars follow the trading calendar and look like Yahoo Finance responses
+    (tz-aware New York index, Open/High/Low/Close/Volume). Every session is
+    generated from its own seed, so overlapping windows always agree and the
+    same request returns the same frame. Today's session only includes bars
+    that have started by ``clock()``.
+    """
+
+    host = 'simulated.local'
+
+    def __init__(self, seed=0, latency=0.0, clock=None, cache_ttl=None):
+        """
+        Args:
+            seed: Changes every generated path
+            latency: Seconds each fetch sleeps, to mimic network round trips
+            clock: Returns the current tz-aware time (default: wall clock)
+            cache_ttl: Accepted for interface compatibility; nothing is cached
+        """
+        super().__init__(cache_ttl)
+        self.seed = seed
+        self.latency = latency
+        self.clock = clock or (lambda: pd.Timestamp.now(tz='US/Eastern'))
+
+    def _session_bars(self, ticker, day, minutes, open_level, close_level):
+        """One session of intraday bars bridging open_level to close_level"""
+        _, volatility, daily_volume = _profile(ticker)
+        count = SESSION_MINUTES // minutes
+        rng = np.random.default_rng(_stable_seed(self.seed, ticker, day.date(), minutes))
+
+        # Random walk pinned to the next session's level (a Brownian bridge)
+        walk = np.cumsum(rng.normal(0, volatility / np.sqrt(count), count)) * open_level
+        fraction = np.arange(1, count + 1) / count
+        closes = open_level + walk - fraction * (walk[-1] - (close_level - open_level))
+        opens = np.concatenate(([open_level], closes[:-1]))
+        wick = np.abs(rng.normal(0, volatility / np.sqrt(count) / 2, count)) * open_level
+        highs = np.maximum(opens, closes) + wick
+        lows = np.minimum(opens, closes) - wick[::-1]
+        # U-shaped intraday volume profile
+        shape = 1 + 2 * (fraction - 0.5) ** 2
+        volume = np.floor(daily_volume / count * shape / shape.mean() * rng.lognormal(0, 0.3, count))
+
+        # Epoch nanoseconds; converted to a New York index once for all sessions
+        session_open = pd.Timestamp(day.date()).tz_localize('America/New_York') + pd.Timedelta(hours=9, minutes=30)
+        index = session_open.value + np.arange(count, dtype='int64') * minutes * 60_000_000_000
+        return index, opens, highs, lows, closes, volume
+
+    def fetch(self, ticker, period='5d', interval='1d', start=None, end=None):
+        if self.latency:
+            time.sleep(self.latency)
+
+        now = pd.Timestamp(self.clock()).tz_convert('America/New_York')
+        first, last = _resolve_window(period, start, end, now)
+        sessions = trading_days(max(first, EPOCH), last)
+        # Sessions that haven't opened yet have no bars
+        sessions = sessions[sessions.tz_localize('America/New_York') + pd.Timedelta(hours=9, minutes=30) <= now]
+        if len(sessions) == 0:
+            return None
+
+        path, wick_noise, volume_noise = _daily_path(self.seed, ticker)
+        offsets = (sessions - EPOCH).days.to_numpy()
+        levels, next_levels = path[offsets], path[offsets + 1]
+        minutes = _bar_minutes(interval)
+
+        if minutes is None:
+            # Daily bars, stamped at midnight like Yahoo
+            _, volatility, daily_volume = _profile(ticker)
+            wick = np.abs(wick_noise[offsets]) * volatility / 2 * levels
+            frame = pd.DataFrame({
+                'Open': levels,
+                'High': np.maximum(levels, next_levels) + wick,
+                'Low': np.minimum(levels, next_levels) - wick,
+                'Close': next_levels,
+                'Volume': np.floor(daily_volume * np.exp(0.3 * volume_noise[offsets]))
+            }, index=sessions.tz_localize('America/New_York'))
+        else:
+            parts = [self._session_bars(ticker, day, minutes, level, next_level)
+                     for day, level, next_level in zip(sessions, levels, next_levels)]
+            frame = pd.DataFrame({
+                'Open': np.concatenate([p[1] for p in parts]),
+                'High': np.concatenate([p[2] for p in parts]),
+                'Low': np.concatenate([p[3] for p in parts]),
+                'Close': np.concatenate([p[4] for p in parts]),
+                'Volume': np.concatenate([p[5] for p in parts])
+            }, index=pd.to_datetime(np.concatenate([p[0] for p in parts]), utc=True).tz_convert('America/New_York'))
+            # The current session only has bars that have started
+            frame = frame[frame.index <= now]
+
+        frame['Volume'] = frame['Volume'].astype('int64')
+        return frame if not frame.empty else None
+
+    def fetch_series(self, series_id, observation_start=None):
+        """Weekly (Thursday) observations following the matching instrument's path"""
+        if self.latency:
+            time.sleep(self.latency)
+        ticker = SERIES_PROFILES.get(series_id, series_id)
+        today = pd.Timestamp(self.clock()).tz_convert('America/New_York').normalize().tz_localize(None)
+        dates = pd.date_range(EPOCH, today, freq='W-THU')
+        if observation_start is not None:
+            dates = dates[dates >= pd.Timestamp(observation_start)]
+        values = np.round(_daily_path(self.seed, ticker)[0][(dates - EPOCH).days.to_numpy()], 2)
+        return pd.Series(values, index=dates, name=series_id)
@@ -0,0 +1,185 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, func
+
+from calculations import calculate_implied_rate
+from data_collector import MBBCoupon, not_quarantined
+from storage import session_scope
+
+logger = logging.getLogger(__name__)
+
+# Web workers don't see commits made by a collector in another process, so a
+# snapshot older than this is re-primed from the database on the next read
+SNAPSHOT_MAX_AGE_SECONDS = float(os.getenv('SNAPSHOT_MAX_AGE_SECONDS', 300))
+# After a failed refresh, readers keep the last snapshot this long before retrying
+SNAPSHOT_RETRY_SECONDS = float(os.getenv('SNAPSHOT_RETRY_SECONDS', 30))
+
+# Lookback windows for the high/low range summaries
+RANGE_WINDOWS = {
+    '1w': timedelta(weeks=1),
+    '1m': timedelta(days=30),
+    '52w': timedelta(weeks=52)
+}
+
+
+class MarketSnapshot:
+    """
+    Point-in-time view of the latest MBB bar and its summary statistics
+    """
+
+    __slots__ = ('timestamp', 'open', 'high', 'low', 'close', 'volume', 'implied_rate',
+                 'previous_close', 'change', 'change_pct', 'implied_rate_change',
+                 'ranges')
+
+    def __init__(self, bar, previous_close, ranges):
+        self.timestamp = bar.timestamp
+        self.open = bar.open
+        self.high = bar.high
+        self.low = bar.low
+        self.close = bar.close
+        self.volume = bar.volume
+        self.implied_rate = calculate_implied_rate(bar.close)
+        self.previous_close = previous_close
+
+        if previous_close:
+            self.change = bar.close - previous_close
+            self.change_pct = self.change / previous_close * 100
+            self.implied_rate_change = self.implied_rate - calculate_implied_rate(previous_close)
+        else:
+            self.change = self.change_pct = self.implied_rate_change = None
+
+        self.ranges = ranges
+
+    def to_dict(self):
+        """Return a JSON-serializable representation"""
+        return {
+            'timestamp': self.timestamp.isoformat(),
+            'open': self.open,
+            'high': self.high,
+            'low': self.low,
+            'close': self.close,
+            'volume': self.volume,
+            'implied_rate': self.implied_rate,
+            'previous_close': self.previous_close,
+            'change': self.change,
+            'change_pct': self.change_pct,
+            'implied_rate_change': self.implied_rate_change,
+            'ranges': self.ranges
+        }
+
+
+def load_snapshot(session):
+    """
+    Build a MarketSnapshot from the database
+
+    Args:
+        session: SQLAlchemy session
+
+    Returns:
+        MarketSnapshot, or None if there is no data yet
+    """
+    # Quarantined bars (see anomaly_detection) never become the published price
+    usable = not_quarantined()
+    latest = session.query(MBBCoupon).filter(usable).order_by(MBBCoupon.timestamp.desc()).first()
+    if latest is None:
+        return None
+
+    # Previous trading day's last close
+    day_start = datetime.combine(latest.timestamp.date(), datetime.min.time())
+    previous = session.query(MBBCoupon.close).filter(
+        MBBCoupon.timestamp < day_start, usable
+    ).order_by(MBBCoupon.timestamp.desc()).first()
+
+    # All range summaries in a single conditional aggregate
+    windows = dict(RANGE_WINDOWS, **{'1d': latest.timestamp - day_start})
+    columns = []
+    for name, window in windows.items():
+        in_window = MBBCoupon.timestamp >= latest.timestamp - window
+        columns.append(func.min(case((in_window, MBBCoupon.low))))
+        columns.append(func.max(case((in_window, MBBCoupon.high))))
+
+    cutoff = latest.timestamp - max(windows.values())
+    row = session.query(*columns).filter(MBBCoupon.timestamp >= cutoff, usable).one()
+
+    ranges = {
+        name: {'low': row[2 * i], 'high': row[2 * i + 1]}
+        for i, name in enumerate(windows)
+    }
+
+    return MarketSnapshot(latest, previous.close if previous else None, ranges)
+
+
+class SnapshotStore:
+    """
+    Holds the current MarketSnapshot in memory
+
+    Readers never block: ``get`` returns whatever snapshot reference is
+    current, and ``refresh`` swaps in a fully built replacement. A failed
+    refresh keeps the last snapshot and is retried after retry_seconds, so
+    a database outage doesn't turn every read into another query.
+    """
+
+    def __init__(self, max_age=SNAPSHOT_MAX_AGE_SECONDS, retry_seconds=SNAPSHOT_RETRY_SECONDS, db_path=None,
+                 clock=time.time):
+        """
+        Args:
+            max_age: Seconds before a snapshot is re-primed on read (0 = never)
+            retry_seconds: Seconds to wait after a failed refresh before trying again
+            db_path: Database file (default: MBB_DB_PATH)
+            clock: Returns the current time in seconds
+        """
+        self.max_age = max_age
+        self.retry_seconds = retry_seconds
+        self.db_path = db_path
+        self.clock = clock
+        # (snapshot, refresh_at) published as one reference; refresh_at is None until primed
+        self._state = (None, None)
+        self._refresh_lock = threading.Lock()
+
+    def get(self):
+        """Return the current snapshot, priming it from the database if missing or stale"""
+        snapshot, refresh_at = self._state
+        if refresh_at is None or self.clock() >= refresh_at:
+            # Another thread is already refreshing; serve what we have
+            if refresh_at is not None and self._refresh_lock.locked():
+                return snapshot
+            snapshot = self.refresh()
+        return snapshot
+
+    def refresh(self):
+        """Rebuild the snapshot from the database and publish it atomically"""
+        with self._refresh_lock:
+            try:
+                with session_scope(self.db_path) as session:
+                    snapshot = load_snapshot(session)
+            except Exception as e:
+                logger.error(f"Error refreshing market snapshot: {str(e)}")
+                # Keep serving the last snapshot; back off before the next attempt
+                snapshot = self._state[0]
+                self._state = (snapshot, self.clock() + self.retry_seconds)
+                return snapshot
+
+            # Single reference assignment: readers see the old or the new snapshot, never a mix
+            self._state = (snapshot, self.clock() + self.max_age if self.max_age else float('inf'))
+            return snapshot
+
+    def clear(self):
+        self._state = (None, None)
+
+
+# Process-wide snapshot shared by the web app and an in-process collector
+snapshot_store = SnapshotStore()
+
+
+def get_snapshot():
+    """Return the current market snapshot (or None if there is no data)"""
+    return snapshot_store.get()
+
+
+def refresh_snapshot():
+    """Refresh the market snapshot after new bars are committed"""
+    return snapshot_store.refresh()
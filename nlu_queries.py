@@ -1,6 +1,7 @@
 from data_ingestion import get_fred_mbs_data
-from sqlalchemy import create_engine
+from storage import engine_for
 import google.generativeai as genai
+import pandas as pd
 import os
 
 def handle_nlu_query(query: str) -> str:
@@ -21,8 +22,8 @@ def handle_nlu_query(query: str) -> str:
     
     try:
         response = model.generate_content(prompt)
-        engine = create_engine('sqlite:///mbs_data.db')
-        result = pd.read_sql(response.text, engine)
+        # Every table in the prompt's schema lives in the MBS database
+        result = pd.read_sql(response.text, engine_for('fred_data'))
         return f"Here's what I found:\n{result.to_markdown()}"
     except Exception as e:
         return f"Error processing query: {str(e)}"
\ No newline at end of file
@@ -0,0 +1,313 @@
+import glob
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, Float, DateTime, String, Text, Boolean, Index
+from sqlalchemy.orm import declarative_base
+
+from storage import get_engine, session_scope
+
+logger = logging.getLogger(__name__)
+
+# Where stage outputs are kept so unchanged stages can be skipped and failed runs resumed
+PIPELINE_ARTIFACT_DIR = os.getenv(
+    'PIPELINE_ARTIFACT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'pipeline')
+)
+PIPELINE_MAX_WORKERS = int(os.getenv('PIPELINE_MAX_WORKERS', 4))
+# Stored outputs not written or reused for this many seconds are pruned after each run
+PIPELINE_ARTIFACT_MAX_AGE = float(os.getenv('PIPELINE_ARTIFACT_MAX_AGE', 7 * 86400))
+
+Base = declarative_base()
+
+
+class PipelineRun(Base):
+    """One row per stage execution: status, timing and the fingerprint of its inputs"""
+    __tablename__ = 'pipeline_runs'
+    __table_args__ = (
+        Index('ix_pipeline_runs_pipeline_run', 'pipeline', 'run_id'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    run_id = Column(String(32), nullable=False)
+    pipeline = Column(String(64), nullable=False)
+    run_key = Column(String(64), nullable=False)
+    stage = Column(String(64), nullable=False)
+    status = Column(String(16), nullable=False)  # success | skipped | resumed | failed
+    fingerprint = Column(String(64))
+    started_at = Column(DateTime, nullable=False)
+    duration_seconds = Column(Float, nullable=False)
+    cached = Column(Boolean, nullable=False, default=False)
+    error = Column(Text)
+
+    def __repr__(self):
+        return f"<PipelineRun(run_id='{self.run_id}', stage='{self.stage}', status='{self.status}')>"
+
+
+class Stage:
+    """
+    A pipeline step with declared inputs and outputs
+
+    ``func`` is called with one keyword argument per input and returns a dict
+    with one entry per output (or a bare value when there is one output).
+    Cacheable stages are skipped when the content hash of their inputs
+    matches a previous successful execution; stages that read the outside
+    world (e.g. fetching) should set cacheable=False.
+    """
+
+    def __init__(self, name, func, inputs=(), outputs=(), cacheable=True, version=1):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.cacheable = cacheable
+        self.version = version
+
+    def __repr__(self):
+        return f"<Stage({self.name}: {list(self.inputs)} -> {list(self.outputs)})>"
+
+
+class PipelineError(Exception):
+    """Raised when a pipeline is declared inconsistently"""
+
+
+def content_hash(value):
+    """
+    Stable SHA-256 of an artifact's content
+
+    DataFrames and Series are hashed row-wise with pandas so equal data gives
+    equal hashes regardless of memory layout; dicts, lists and tuples are
+    hashed recursively; anything else by its pickle.
+    """
+    digest = hashlib.sha256()
+
+    def feed(obj):
+        if isinstance(obj, dict):
+            digest.update(b'{')
+            for key in sorted(obj, key=repr):
+                feed(key)
+                feed(obj[key])
+            digest.update(b'}')
+        elif isinstance(obj, (list, tuple)):
+            digest.update(b'[')
+            for item in obj:
+                feed(item)
+            digest.update(b']')
+        elif type(obj).__name__ in ('DataFrame', 'Series'):
+            import pandas as pd
+            labels = list(obj.columns) if obj.ndim == 2 else [obj.name]
+            digest.update(repr(labels).encode('utf-8'))
+            digest.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().tobytes())
+        else:
+            digest.update(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+
+    feed(value)
+    return digest.hexdigest()
+
+
+class ArtifactStore:
+    """Pickled stage outputs on disk, keyed by stage fingerprint"""
+
+    def __init__(self, directory=PIPELINE_ARTIFACT_DIR, max_age=PIPELINE_ARTIFACT_MAX_AGE):
+        self.directory = directory
+        self.max_age = max_age
+
+    def _path(self, fingerprint):
+        return os.path.join(self.directory, fingerprint[:2], f"{fingerprint}.pkl")
+
+    def load(self, fingerprint):
+        """Return stored outputs, or None if they were never stored or can't be read"""
+        try:
+            with open(self._path(fingerprint), 'rb') as f:
+                outputs = pickle.load(f)
+            # Reused outputs count as fresh for pruning
+            os.utime(self._path(fingerprint))
+            return outputs
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def save(self, fingerprint, outputs):
+        path = self._path(fingerprint)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(outputs, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def prune(self):
+        """
+        Remove outputs that were neither written nor reused within max_age seconds
+
+        Returns:
+            Number of artifacts removed
+        """
+        cutoff = time.time() - self.max_age
+        removed = 0
+        for path in glob.glob(os.path.join(self.directory, '*', '*.pkl')):
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        if removed:
+            logger.info(f"Pruned {removed} pipeline artifacts older than {self.max_age:.0f}s")
+        return removed
+
+
+class Pipeline:
+    """
+    Runs declared stages in dependency order, in parallel where possible
+
+    A stage becomes ready as soon as all of its inputs exist. Every stage
+    execution is recorded in pipeline_runs. If the previous run with the same
+    run key (e.g. the trade date) failed, stages that succeeded in it are
+    restored from their stored outputs and the run continues from the
+    failed stage.
+    """
+
+    def __init__(self, name, stages, db_path=None, artifacts=None, max_workers=PIPELINE_MAX_WORKERS):
+        self.name = name
+        self.stages = list(stages)
+        self.db_path = db_path
+        self.artifacts = artifacts or ArtifactStore()
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._validate()
+
+    def _validate(self):
+        produced = {}
+        for stage in self.stages:
+            for output in stage.outputs:
+                if output in produced:
+                    raise PipelineError(f"{output!r} is produced by both {produced[output]} and {stage.name}")
+                produced[output] = stage.name
+        self._producers = produced
+
+    def _fingerprint(self, stage, values, run_key):
+        parts = {'stage': stage.name, 'version': stage.version,
+                 'inputs': {name: content_hash(values[name]) for name in stage.inputs}}
+        if not stage.cacheable:
+            # Only ever reused when resuming the same run key
+            parts['run_key'] = run_key
+        return content_hash(parts)
+
+    def _record(self, run_id, run_key, stage, status, fingerprint, started_at, duration, cached=False, error=None):
+        with self._lock, session_scope(self.db_path) as session:
+            session.add(PipelineRun(
+                run_id=run_id, pipeline=self.name, run_key=run_key, stage=stage.name, status=status,
+                fingerprint=fingerprint, started_at=started_at, duration_seconds=duration,
+                cached=cached, error=error
+            ))
+
+    def _previous_run(self, run_key):
+        """Stage fingerprints that succeeded in the last run, if that run failed"""
+        with session_scope(self.db_path) as session:
+            last = session.query(PipelineRun.run_id).filter(
+                PipelineRun.pipeline == self.name, PipelineRun.run_key == run_key
+            ).order_by(PipelineRun.id.desc()).limit(1).scalar()
+            if last is None:
+                return None, {}
+            rows = session.query(PipelineRun.stage, PipelineRun.status, PipelineRun.fingerprint).filter(
+                PipelineRun.pipeline == self.name, PipelineRun.run_id == last
+            ).all()
+        if not any(status == 'failed' for _, status, _ in rows):
+            return None, {}
+        return last, {stage: fingerprint for stage, status, fingerprint in rows if status != 'failed'}
+
+    def _execute(self, stage, kwargs, run_id, run_key, resumable):
+        """Run (or skip) one stage; returns its outputs"""
+        started_at = datetime.now()
+        started = time.perf_counter()
+        fingerprint = self._fingerprint(stage, kwargs, run_key)
+
+        if stage.cacheable or resumable.get(stage.name) == fingerprint:
+            outputs = self.artifacts.load(fingerprint)
+            if outputs is not None:
+                status = 'skipped' if stage.cacheable else 'resumed'
+                logger.info(f"[{self.name}] {stage.name}: inputs unchanged, reusing stored outputs ({status})")
+                self._record(run_id, run_key, stage, status, fingerprint, started_at,
+                             time.perf_counter() - started, cached=True)
+                return outputs
+
+        try:
+            result = stage.func(**kwargs)
+            if len(stage.outputs) == 1 and not (isinstance(result, dict) and stage.outputs[0] in result):
+                result = {stage.outputs[0]: result}
+            result = result or {}
+            missing = set(stage.outputs) - set(result)
+            if missing:
+                raise PipelineError(f"Stage {stage.name} did not produce {sorted(missing)}")
+            outputs = {name: result[name] for name in stage.outputs}
+            self.artifacts.save(fingerprint, outputs)
+        except Exception as e:
+            duration = time.perf_counter() - started
+            logger.error(f"[{self.name}] {stage.name} failed after {duration:.2f}s: {str(e)}")
+            self._record(run_id, run_key, stage, 'failed', fingerprint, started_at, duration, error=str(e))
+            raise
+
+        duration = time.perf_counter() - started
+        logger.info(f"[{self.name}] {stage.name} finished in {duration:.2f}s")
+        self._record(run_id, run_key, stage, 'success', fingerprint, started_at, duration)
+        return outputs
+
+    def run(self, run_key='default', resume=True, **params):
+        """
+        Execute the pipeline
+
+        Args:
+            run_key: Identifies the logical run (e.g. a trade date) for resuming
+            resume: Restore stages that succeeded in a failed previous run
+            **params: Initial artifacts available as stage inputs
+
+        Returns:
+            dict of every artifact produced (including params)
+
+        Raises:
+            The first exception raised by a stage, after recording it
+        """
+        Base.metadata.create_all(get_engine(self.db_path))
+        run_id = uuid.uuid4().hex
+        values = dict(params)
+
+        resumable = {}
+        if resume:
+            failed_run, resumable = self._previous_run(run_key)
+            if failed_run:
+                logger.info(f"[{self.name}] Resuming failed run {failed_run} for {run_key}")
+
+        unresolved = {
+            name for stage in self.stages for name in stage.inputs
+            if name not in values and name not in self._producers
+        }
+        if unresolved:
+            raise PipelineError(f"No stage or parameter provides {sorted(unresolved)}")
+
+        pending = list(self.stages)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name) as pool:
+            running = {}
+            while pending or running:
+                for stage in [s for s in pending if all(name in values for name in s.inputs)]:
+                    pending.remove(stage)
+                    kwargs = {name: values[name] for name in stage.inputs}
+                    running[pool.submit(self._execute, stage, kwargs, run_id, run_key, resumable)] = stage
+                if not running:
+                    raise PipelineError(f"Stages can never become ready: {[s.name for s in pending]}")
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    running.pop(future)
+                    # Re-raise the first failure; stages already running finish first
+                    values.update(future.result())
+
+        logger.info(f"[{self.name}] Run {run_id} completed in {time.perf_counter() - started:.2f}s")
+        self.artifacts.prune()
+        return values
@@ -0,0 +1,438 @@
+import argparse
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from bar_series import BarSeries
+from data_collector import BAR_COLUMNS
+from storage import database_path, session_scope
+from tiered_storage import hot_extent, quarantined_timestamps, read_bars
+
+logger = logging.getLogger(__name__)
+
+# Instruments kept in the columnar cache
+PRICE_CACHE_TICKERS = [ticker.strip() for ticker in os.getenv('PRICE_CACHE_TICKERS', 'MBB').split(',') if ticker.strip()]
+# Cache root (default: .cache/prices next to the bar database)
+PRICE_CACHE_DIR = os.getenv('PRICE_CACHE_DIR')
+
+# One contiguous file per column; timestamps are datetime64[ns] values of the
+# stored (naive exchange wall-clock) time, i.e. int64 nanoseconds since the epoch
+CACHE_DTYPES = {
+    'timestamp': np.dtype('int64'),
+    'open': np.dtype('float64'),
+    'high': np.dtype('float64'),
+    'low': np.dtype('float64'),
+    'close': np.dtype('float64'),
+    'volume': np.dtype('float64')
+}
+
+
+# Times a reader re-reads meta.json when the generation it names was replaced meanwhile
+MAP_ATTEMPTS = 5
+
+
+def _to_epoch_ns(timestamp):
+    return pd.Timestamp(timestamp).as_unit('ns').value
+
+
+class PriceHistoryCache:
+    """
+    Columnar, memory-mapped copy of an instrument's full bar history
+
+    Each column is a flat binary array, so every process maps the same
+    files and shares one copy in the page cache; reading a window is a
+    binary search on the timestamp column plus array views, with no SQLite
+    query or per-bar Python objects.
+
+    meta.json records the live row count and file generation and is
+    replaced atomically, so readers always see a consistent prefix. New
+    bars after the last cached one are appended in place past that prefix.
+    Anything that rewrites cached rows (a refetched or corrected bar, a
+    daily bar stamped before the day's intraday bars) writes a new
+    generation of files instead, so files readers have mapped never change
+    under them. One writer at a time (the collector or the daily update);
+    readers never block.
+
+    The cache holds every bar, archived and quarantined ones included;
+    read_cached_bars applies the quarantine and returns a BarSeries.
+    """
+
+    def __init__(self, ticker='MBB', db_path=None, directory=None):
+        """
+        Args:
+            ticker: Instrument (MBB mirrors mbb_coupons, others market_bars)
+            db_path: Database file the history is loaded from (default: MBB_DB_PATH)
+            directory: Cache directory (default: PRICE_CACHE_DIR/<ticker>, or
+                .cache/prices/<ticker> next to the database)
+        """
+        self.ticker = ticker
+        self.db_path = db_path
+        if directory is None:
+            root = PRICE_CACHE_DIR or os.path.join(
+                os.path.dirname(os.path.abspath(db_path or database_path('mbb_coupons'))), '.cache', 'prices'
+            )
+            directory = os.path.join(root, ticker)
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._mapped_version = None
+        self._arrays = None
+
+    @property
+    def _meta_path(self):
+        return os.path.join(self.directory, 'meta.json')
+
+    def _column_path(self, column, generation):
+        return os.path.join(self.directory, f"{column}.{generation}.bin")
+
+    def _read_meta(self):
+        try:
+            with open(self._meta_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_meta(self, rows, generation):
+        tmp_path = self._meta_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'ticker': self.ticker, 'rows': rows, 'generation': generation}, f)
+        os.replace(tmp_path, self._meta_path)
+
+    @property
+    def built(self):
+        return os.path.exists(self._meta_path)
+
+    def _meta_version(self):
+        try:
+            stat = os.stat(self._meta_path)
+            return stat.st_mtime_ns, stat.st_size, stat.st_ino
+        except FileNotFoundError:
+            return None
+
+    def _map(self, meta):
+        rows = meta['rows'] if meta else 0
+        return {
+            column: np.memmap(self._column_path(column, meta['generation']), dtype=dtype, mode='r', shape=(rows,))
+            if rows else np.empty(0, dtype=dtype)
+            for column, dtype in CACHE_DTYPES.items()
+        }
+
+    def arrays(self):
+        """
+        Read-only column arrays of the cached history, in timestamp order
+
+        Arrays are memory-mapped and remapped only when the writer has
+        published new rows; an unbuilt cache has empty columns.
+        """
+        version = self._meta_version()
+        with self._lock:
+            if version != self._mapped_version or self._arrays is None:
+                for attempt in range(MAP_ATTEMPTS):
+                    try:
+                        self._arrays = self._map(self._read_meta() if version is not None else None)
+                        break
+                    except FileNotFoundError:
+                        # A writer published a newer generation and removed the one
+                        # we read meta for; map whatever meta names now
+                        if attempt == MAP_ATTEMPTS - 1:
+                            raise
+                        version = self._meta_version()
+                self._mapped_version = version
+            return self._arrays
+
+    def window(self, start=None, end=None):
+        """Row range [i, j) of bars in [start, end), by binary search on the timestamps"""
+        timestamps = self.arrays()['timestamp']
+        i = int(np.searchsorted(timestamps, _to_epoch_ns(start), 'left')) if start is not None else 0
+        j = int(np.searchsorted(timestamps, _to_epoch_ns(end), 'left')) if end is not None else len(timestamps)
+        return i, max(i, j)
+
+    def read(self, start=None, end=None, columns=None):
+        """
+        Zero-copy views of the bars in [start, end)
+
+        Args:
+            start: Range start (default: unbounded)
+            end: Range end, exclusive (default: unbounded)
+            columns: Columns to return (default: all of CACHE_DTYPES)
+
+        Returns:
+            dict of column name -> read-only array view
+        """
+        arrays = self.arrays()
+        i, j = self.window(start, end)
+        return {column: arrays[column][i:j] for column in (columns or CACHE_DTYPES)}
+
+    def _writer(self):
+        """Exclusive lock across processes for the duration of a write"""
+        import fcntl
+
+        os.makedirs(self.directory, exist_ok=True)
+        lock_file = open(os.path.join(self.directory, 'lock'), 'w')
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file
+
+    def rebuild(self):
+        """
+        Load the full history (both storage tiers) into a new generation
+
+        Returns:
+            Number of cached bars
+        """
+        bars = read_bars(self.ticker, include_quarantined=True, db_path=self.db_path)
+        with self._writer():
+            meta = self._read_meta()
+            rows = self._publish(_frame_columns(bars), 0, meta)
+        logger.info(f"Built {self.ticker} price cache with {rows} bars in {self.directory}")
+        return rows
+
+    def update(self, bars=None, since=None):
+        """
+        Fold committed bars into the cache, building it on first use
+
+        Args:
+            bars: Newly stored bars (see data_collector.frame_to_bars)
+            since: Instead of bars, reload stored bars from this timestamp on
+
+        Returns:
+            Number of bars written
+        """
+        if not self.built:
+            return self.rebuild()
+        if bars is None:
+            bars = read_bars(self.ticker, start=since, include_quarantined=True, db_path=self.db_path)
+        if bars.empty:
+            return 0
+
+        new = _frame_columns(bars)
+        with self._writer():
+            meta = self._read_meta()
+            rows = meta['rows']
+            current = self.arrays() if rows else None
+            first = int(np.searchsorted(current['timestamp'], new['timestamp'][0], 'left')) if rows else 0
+
+            if first == rows:
+                self._append(new, meta)
+            else:
+                # Cached bars the new ones don't replace stay, in timestamp order
+                tail = {column: np.asarray(current[column][first:]) for column in CACHE_DTYPES}
+                kept = ~np.isin(tail['timestamp'], new['timestamp'])
+                merged = {column: np.concatenate((tail[column][kept], new[column])) for column in CACHE_DTYPES}
+                order = np.argsort(merged['timestamp'], kind='stable')
+                self._publish({column: values[order] for column, values in merged.items()}, first, meta)
+        logger.debug(f"Cached {len(bars)} {self.ticker} bars")
+        return len(bars)
+
+    def invalidate(self):
+        """
+        Drop the published cache so readers fall back to storage
+
+        The next update() rebuilds it from storage, so bars that failed to
+        reach the cache are not left out for good.
+        """
+        with self._writer():
+            try:
+                os.remove(self._meta_path)
+            except FileNotFoundError:
+                pass
+        logger.warning(f"Invalidated {self.ticker} price cache in {self.directory}")
+
+    def reconcile(self):
+        """
+        Rebuild the cache if it has drifted from SQLite
+
+        The cached bars from the oldest stored bar on must match the stored
+        row count and last timestamp; bars a writer never cached (or cached
+        and then lost) show up as a difference in either.
+
+        Returns:
+            True if the cache was rebuilt
+        """
+        if not self.built:
+            return False
+        rows, first, last = hot_extent(self.ticker, db_path=self.db_path)
+        if not rows:
+            return False
+
+        timestamps = self.arrays()['timestamp']
+        cached_rows = len(timestamps) - int(np.searchsorted(timestamps, _to_epoch_ns(first), 'left'))
+        cached_last = int(timestamps[-1]) if len(timestamps) else None
+        if cached_rows == rows and cached_last == _to_epoch_ns(last):
+            return False
+
+        logger.warning(f"{self.ticker} price cache out of sync with storage ({cached_rows} cached vs {rows} stored "
+                       f"bars, last {pd.Timestamp(cached_last) if cached_last is not None else None} vs {last}); "
+                       f"rebuilding")
+        self.rebuild()
+        return True
+
+    def _append(self, new, meta):
+        """Write rows past the live prefix, then publish the new row count"""
+        rows, generation = meta['rows'], meta['generation']
+        for column, dtype in CACHE_DTYPES.items():
+            with open(self._column_path(column, generation), 'r+b' if rows else 'wb') as f:
+                f.seek(rows * dtype.itemsize)
+                f.write(np.ascontiguousarray(new[column], dtype=dtype).tobytes())
+                f.truncate()
+        self._write_meta(rows + len(new['timestamp']), generation)
+
+    def _publish(self, new, keep_rows, meta):
+        """Write a new generation holding the first keep_rows cached rows followed by new"""
+        generation = meta['generation'] + 1 if meta else 0
+        os.makedirs(self.directory, exist_ok=True)
+        current = self.arrays() if keep_rows else None
+        for column, dtype in CACHE_DTYPES.items():
+            with open(self._column_path(column, generation), 'wb') as f:
+                if keep_rows:
+                    f.write(np.ascontiguousarray(current[column][:keep_rows]).tobytes())
+                f.write(np.ascontiguousarray(new[column], dtype=dtype).tobytes())
+        rows = keep_rows + len(new['timestamp'])
+        self._write_meta(rows, generation)
+
+        # Processes that still map the old files keep them alive until they remap
+        if meta:
+            for column in CACHE_DTYPES:
+                try:
+                    os.remove(self._column_path(column, meta['generation']))
+                except FileNotFoundError:
+                    pass
+        return rows
+
+
+def _frame_columns(bars):
+    """Cache columns from a bar frame, sorted and with one row per timestamp (the last)"""
+    bars = bars.sort_values('timestamp', kind='stable').drop_duplicates('timestamp', keep='last')
+    timestamps = pd.to_datetime(bars['timestamp']).to_numpy().astype('datetime64[ns]').view('int64')
+    columns = {'timestamp': timestamps}
+    for column in BAR_COLUMNS[1:]:
+        columns[column] = bars[column].to_numpy(dtype=CACHE_DTYPES[column])
+    return columns
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_price_cache(ticker='MBB', db_path=None):
+    """Return the process-wide cache for an instrument, so its mapping is shared by all requests"""
+    with _caches_lock:
+        cache = _caches.get((ticker, db_path))
+        if cache is None:
+            cache = _caches[(ticker, db_path)] = PriceHistoryCache(ticker, db_path)
+        return cache
+
+
+def read_cached_bars(ticker='MBB', start=None, end=None, columns=None, include_quarantined=False, session=None,
+                     db_path=None):
+    """
+    Bars for a time range from the price cache, or from storage until it is built
+
+    Args:
+        ticker: Instrument
+        start: Range start (default: unbounded)
+        end: Range end, exclusive (default: unbounded)
+        columns: Bar columns to load (default: BAR_COLUMNS); timestamp is always included
+        include_quarantined: Keep bars the anomaly detector quarantined
+        session: Session for the quarantine lookup (default: a new session on db_path)
+        db_path: Database file (default: MBB_DB_PATH)
+
+    Returns:
+        BarSeries in timestamp order; without quarantined bars in the range
+        its columns are views of the memory-mapped cache
+    """
+    cache = get_price_cache(ticker, db_path)
+    if ticker not in PRICE_CACHE_TICKERS or not cache.built:
+        return BarSeries.from_frame(read_bars(ticker, start, end, columns, include_quarantined, session, db_path))
+
+    columns = ['timestamp'] + [col for col in (columns or BAR_COLUMNS) if col != 'timestamp']
+    window = cache.read(start, end, columns)
+    series = BarSeries(window.pop('timestamp').view('datetime64[ns]'), **window)
+    if include_quarantined or not len(series):
+        return series
+
+    if session is None:
+        with session_scope(db_path) as session:
+            held = _quarantined(session, ticker, series.timestamp)
+    else:
+        held = _quarantined(session, ticker, series.timestamp)
+    return series[~np.isin(series.timestamp, held)] if len(held) else series
+
+
+def _quarantined(session, ticker, timestamps):
+    """Quarantined timestamps within the span of timestamps, archived ones included"""
+    held = quarantined_timestamps(ticker, pd.Timestamp(timestamps[0]).to_pydatetime(),
+                                  (pd.Timestamp(timestamps[-1]) + pd.Timedelta(microseconds=1)).to_pydatetime(), session)
+    return held.to_numpy(dtype='datetime64[ns]')
+
+
+def cache_stored_bars(ticker, bars=None, since=None, db_path=None):
+    """
+    Fold bars a writer just committed into the price cache
+
+    Every path that writes bars calls this after its commit. A failed
+    update invalidates the cache, so readers fall back to storage and the
+    next update rebuilds it instead of serving a cache with a hole.
+
+    Args:
+        ticker: Instrument
+        bars: Newly stored bars (see data_collector.frame_to_bars)
+        since: Instead of bars, reload stored bars from this timestamp on
+        db_path: Database file (default: MBB_DB_PATH)
+
+    Returns:
+        Number of bars cached, or None if the ticker is not cached or the update failed
+    """
+    if ticker not in PRICE_CACHE_TICKERS:
+        return None
+    cache = get_price_cache(ticker, db_path)
+    try:
+        return cache.update(bars, since=since)
+    except Exception as e:
+        logger.error(f"Error updating {ticker} price cache: {str(e)}")
+        try:
+            cache.invalidate()
+        except Exception as e:
+            logger.error(f"Error invalidating {ticker} price cache: {str(e)}")
+        return None
+
+
+def reconcile_price_caches(tickers=None, db_path=None):
+    """
+    Check every cached instrument against SQLite and rebuild the ones that drifted
+
+    Returns:
+        dict of ticker -> True if rebuilt, False if in sync, None on error
+    """
+    results = {}
+    for ticker in tickers or PRICE_CACHE_TICKERS:
+        try:
+            results[ticker] = get_price_cache(ticker, db_path).reconcile()
+        except Exception as e:
+            logger.error(f"Error reconciling {ticker} price cache: {str(e)}")
+            results[ticker] = None
+    return results
+
+
+def price_cache_consumer(ticker, bars, db_path=None):
+    """Intraday collector consumer: append newly committed bars to the price cache"""
+    cache_stored_bars(ticker, bars, db_path=db_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the memory-mapped price history cache")
+    parser.add_argument('--ticker', action='append', help="Instrument to cache (repeatable; default: PRICE_CACHE_TICKERS)")
+    parser.add_argument('--db', help="Database file (default: MBB_DB_PATH)")
+    parser.add_argument('--reconcile', action='store_true',
+                        help="Only rebuild caches that no longer match SQLite")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.reconcile:
+        for ticker, rebuilt in reconcile_price_caches(args.ticker, args.db).items():
+            print(f"{ticker}: {'rebuilt' if rebuilt else 'in sync' if rebuilt is not None else 'failed'}")
+    else:
+        for ticker in args.ticker or PRICE_CACHE_TICKERS:
+            print(f"{ticker}: {PriceHistoryCache(ticker, args.db).rebuild()} bars cached")
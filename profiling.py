@@ -0,0 +1,264 @@
+import cProfile
+import hmac
+import json
+import logging
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from flask import abort, g, jsonify, request, send_file
+
+logger = logging.getLogger(__name__)
+
+# Profiling is opt-in: nothing is profiled unless PROFILING_ENABLED is set
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+PROFILING_DIR = os.getenv('PROFILING_DIR', os.path.join(os.path.dirname(__file__), 'profiles'))
+PROFILING_MAX_PROFILES = int(os.getenv('PROFILING_MAX_PROFILES', 20))
+PROFILING_SAMPLE_INTERVAL = float(os.getenv('PROFILING_SAMPLE_INTERVAL', 0.005))
+# Required (as the X-Admin-Token header) to trigger or read profiles; profiling stays off without it
+PROFILING_ADMIN_TOKEN = os.getenv('PROFILING_ADMIN_TOKEN')
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_QUERY_ARG = '_profile'
+ADMIN_TOKEN_HEADER = 'X-Admin-Token'
+
+
+class StackSampler:
+    """
+    Samples the call stack of a single thread at a fixed interval and
+    aggregates the samples into collapsed stacks (flamegraph input format)
+    """
+
+    def __init__(self, thread_id, interval=PROFILING_SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+
+            # Walk from the innermost frame outwards, then reverse to root-first order
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{code.co_firstlineno}")
+                frame = frame.f_back
+            self.samples[';'.join(reversed(stack))] += 1
+
+    def collapsed(self):
+        """Return samples as 'frame;frame;frame count' lines"""
+        return '\n'.join(f"{stack} {count}" for stack, count in self.samples.most_common())
+
+
+class ProfileStore:
+    """
+    Bounded on-disk ring buffer of request profiles
+
+    Each profile is stored as three files sharing an id:
+    <id>.pstats, <id>.collapsed and <id>.json (metadata)
+    """
+
+    def __init__(self, directory=PROFILING_DIR, max_profiles=PROFILING_MAX_PROFILES):
+        self.directory = directory
+        self.max_profiles = max_profiles
+        self._lock = threading.Lock()
+
+    def save(self, profiler, sampler, metadata):
+        """
+        Write a profile to disk and evict the oldest ones beyond the bound
+
+        Returns:
+            The id of the stored profile
+        """
+        os.makedirs(self.directory, exist_ok=True)
+
+        endpoint = re.sub(r'[^A-Za-z0-9_.-]', '_', metadata.get('endpoint') or 'unknown')
+        profile_id = f"{datetime.now().strftime('%Y%m%dT%H%M%S%f')}_{endpoint}"
+        base = os.path.join(self.directory, profile_id)
+
+        with self._lock:
+            profiler.dump_stats(f"{base}.pstats")
+            with open(f"{base}.collapsed", 'w') as f:
+                f.write(sampler.collapsed())
+            with open(f"{base}.json", 'w') as f:
+                json.dump(dict(metadata, id=profile_id), f)
+            self._evict()
+
+        return profile_id
+
+    def _evict(self):
+        ids = self._profile_ids()
+        for profile_id in ids[:-self.max_profiles] if self.max_profiles > 0 else ids:
+            for ext in ('pstats', 'collapsed', 'json'):
+                try:
+                    os.remove(os.path.join(self.directory, f"{profile_id}.{ext}"))
+                except FileNotFoundError:
+                    pass
+
+    def _profile_ids(self):
+        if not os.path.isdir(self.directory):
+            return []
+        # Ids start with a sortable timestamp, so lexical order is age order
+        return sorted(name[:-5] for name in os.listdir(self.directory) if name.endswith('.json'))
+
+    def list_profiles(self):
+        """Return metadata for all stored profiles, newest first"""
+        profiles = []
+        for profile_id in reversed(self._profile_ids()):
+            try:
+                with open(os.path.join(self.directory, f"{profile_id}.json")) as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                # Evicted by another worker between listing and reading
+                continue
+        return profiles
+
+    def path_for(self, profile_id, kind):
+        """Return the file path for a stored profile artifact, or None"""
+        if kind not in ('pstats', 'collapsed') or not re.fullmatch(r'[A-Za-z0-9_.-]+', profile_id):
+            return None
+        path = os.path.join(self.directory, f"{profile_id}.{kind}")
+        return path if os.path.exists(path) else None
+
+
+def _profiling_requested():
+    """Check whether the current request opted in via header or query flag"""
+    flag = request.headers.get(PROFILE_HEADER) or request.args.get(PROFILE_QUERY_ARG)
+    return flag is not None and flag.lower() in ('1', 'true', 'yes')
+
+
+def _is_admin(admin_token):
+    """Profiles expose code paths and timings, so only admins may trigger or read them"""
+    return hmac.compare_digest(request.headers.get(ADMIN_TOKEN_HEADER, ''), admin_token)
+
+
+def init_profiling(app, store=None, enabled=None, admin_token=None):
+    """
+    Register the per-request profiling hooks and admin endpoints on a Flask app
+
+    Nothing is registered unless profiling is enabled and an admin token is
+    configured. Profiling a request and the /admin/profiles endpoints are
+    then limited to requests carrying the token (the remote address proves
+    nothing behind a reverse proxy).
+
+    Args:
+        app: Flask application
+        store: ProfileStore to write to (default: one using PROFILING_DIR)
+        enabled: Override for PROFILING_ENABLED
+        admin_token: Override for PROFILING_ADMIN_TOKEN
+
+    Returns:
+        The ProfileStore in use, or None when profiling is disabled
+    """
+    if not (PROFILING_ENABLED if enabled is None else enabled):
+        return None
+    admin_token = admin_token if admin_token is not None else PROFILING_ADMIN_TOKEN
+    if not admin_token:
+        logger.warning("Profiling is enabled but PROFILING_ADMIN_TOKEN is not set; leaving it off")
+        return None
+
+    store = store or ProfileStore()
+
+    def require_admin():
+        if not _is_admin(admin_token):
+            abort(403)
+
+    @app.before_request
+    def _start_profiling():
+        if not _profiling_requested() or not _is_admin(admin_token):
+            return
+
+        g.profile_started = time.perf_counter()
+        g.profile_sampler = StackSampler(threading.get_ident())
+        g.profile_sampler.start()
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+    @app.after_request
+    def _stop_profiling(response):
+        profiler = g.pop('profiler', None)
+        if profiler is None:
+            return response
+
+        profiler.disable()
+        sampler = g.pop('profile_sampler')
+        sampler.stop()
+        elapsed_ms = (time.perf_counter() - g.pop('profile_started')) * 1000
+
+        try:
+            profile_id = store.save(profiler, sampler, {
+                'endpoint': request.endpoint,
+                'path': request.full_path,
+                'method': request.method,
+                'status': response.status_code,
+                'elapsed_ms': round(elapsed_ms, 2),
+                'samples': sum(sampler.samples.values()),
+                'created_at': datetime.now().isoformat()
+            })
+            response.headers['X-Profile-Id'] = profile_id
+            logger.info(f"Stored profile {profile_id} ({elapsed_ms:.1f} ms)")
+        except Exception as e:
+            logger.error(f"Error storing request profile: {str(e)}")
+
+        return response
+
+    @app.teardown_request
+    def _teardown_profiling(exc):
+        # after_request is skipped on unhandled errors, so make sure we stop here
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            g.pop('profile_sampler').stop()
+
+    @app.route('/admin/profiles')
+    def list_profiles():
+        require_admin()
+        return jsonify({'profiles': store.list_profiles()})
+
+    @app.route('/admin/profiles/<profile_id>/<kind>')
+    def get_profile(profile_id, kind):
+        require_admin()
+        path = store.path_for(profile_id, kind)
+        if path is None:
+            abort(404)
+        return send_file(path, mimetype='application/octet-stream', as_attachment=True)
+
+    @app.route('/admin/profiles/<profile_id>/summary')
+    def get_profile_summary(profile_id):
+        require_admin()
+        path = store.path_for(profile_id, 'pstats')
+        if path is None:
+            abort(404)
+
+        stats = pstats.Stats(path)
+        stats.sort_stats('cumulative')
+        rows = []
+        for (filename, line, func), (cc, nc, tt, ct, callers) in stats.stats.items():
+            rows.append({
+                'function': f"{os.path.basename(filename)}:{line}({func})",
+                'calls': nc,
+                'total_time': tt,
+                'cumulative_time': ct
+            })
+        rows.sort(key=lambda r: r['cumulative_time'], reverse=True)
+        return jsonify({'id': profile_id, 'functions': rows[:50]})
+
+    logger.info(f"Request profiling enabled, storing up to {store.max_profiles} profiles in {store.directory}")
+    return store
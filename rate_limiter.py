@@ -0,0 +1,224 @@
+import asyncio
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Collectors run in their own processes (cron, daemons); each publishes its
+# limiter metrics here so the web app can report them at /admin/rate_limits
+RATE_LIMIT_METRICS_DIR = os.getenv(
+    'RATE_LIMIT_METRICS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'rate_limits')
+)
+# Seconds between metric publications while requests are being made
+RATE_LIMIT_METRICS_INTERVAL = float(os.getenv('RATE_LIMIT_METRICS_INTERVAL', 5))
+
+
+# Every acquire reserves first and then waits out the reservation, blocking or awaiting
+def _sleep(wait):
+    if wait > 0:
+        time.sleep(wait)
+    return wait
+
+
+async def _sleep_async(wait):
+    if wait > 0:
+        await asyncio.sleep(wait)
+    return wait
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket
+
+    Tokens refill continuously at ``rate`` per second up to ``capacity``
+    (the burst size). Acquiring never sleeps while holding the lock: a caller
+    reserves its token (the balance may go negative) and is told how long to
+    wait, so blocking and asyncio callers share one bucket and are served in
+    arrival order.
+    """
+
+    def __init__(self, rate, capacity=1):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens=1):
+        """
+        Take tokens from the bucket
+
+        Returns:
+            Seconds the caller must wait before using them (0 if available now)
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self, tokens=1):
+        """Block until tokens are available; returns seconds waited"""
+        return _sleep(self.reserve(tokens))
+
+    async def acquire_async(self, tokens=1):
+        """Await until tokens are available without blocking the event loop; returns seconds waited"""
+        return await _sleep_async(self.reserve(tokens))
+
+
+class RateLimiter:
+    """
+    Per-host token-bucket rate limiter shared across threads and coroutines
+
+    Every upstream host gets its own bucket, so requests to one host never
+    wait on another. Time spent waiting is tracked per host (see metrics())
+    and, with a metrics_path, published to a file other processes can read
+    (see read_published_metrics()). An optional user-agent policy (anything
+    with ``get_next_user_agent()``, e.g. UserAgentRotator) supplies request
+    headers via headers() for fetchers that build their own HTTP requests.
+    """
+
+    def __init__(self, rate=None, burst=1, host_limits=None, user_agent_policy=None, metrics_path=None,
+                 metrics_interval=RATE_LIMIT_METRICS_INTERVAL):
+        """
+        Args:
+            rate: Requests per second per host (None or 0 = unlimited)
+            burst: Requests a host may issue back to back after being idle
+            host_limits: Optional {host: (rate, burst)} overrides
+            user_agent_policy: Optional user-agent source for headers()
+            metrics_path: JSON file to publish metrics to (default: not published)
+            metrics_interval: Seconds between publications; metrics are also published at exit
+        """
+        self.rate = rate
+        self.burst = burst
+        self.host_limits = dict(host_limits or {})
+        self.user_agent_policy = user_agent_policy
+        self.metrics_path = metrics_path
+        self.metrics_interval = metrics_interval
+        self._buckets = {}
+        self._metrics = {}
+        self._published = None
+        self._lock = threading.Lock()
+        if metrics_path:
+            atexit.register(self.publish_metrics)
+
+    @classmethod
+    def from_min_delay(cls, min_delay_seconds, burst=1, **kwargs):
+        """Build a limiter that allows one request per min_delay_seconds per host"""
+        return cls(rate=1.0 / min_delay_seconds if min_delay_seconds > 0 else None, burst=burst, **kwargs)
+
+    def _bucket(self, host):
+        with self._lock:
+            if host not in self._buckets:
+                rate, burst = self.host_limits.get(host, (self.rate, self.burst))
+                self._buckets[host] = TokenBucket(rate, burst) if rate else None
+                self._metrics[host] = {'requests': 0, 'throttled': 0, 'wait_seconds': 0.0, 'max_wait_seconds': 0.0}
+            return self._buckets[host]
+
+    def _reserve(self, host):
+        """Reserve a request to host and record it; returns seconds the caller must wait"""
+        bucket = self._bucket(host)
+        wait = bucket.reserve() if bucket else 0.0
+        self._record(host, wait)
+        return wait
+
+    def _record(self, host, wait):
+        with self._lock:
+            stats = self._metrics[host]
+            stats['requests'] += 1
+            if wait > 0:
+                stats['throttled'] += 1
+                stats['wait_seconds'] += wait
+                stats['max_wait_seconds'] = max(stats['max_wait_seconds'], wait)
+            publish = self.metrics_path and (
+                self._published is None or time.monotonic() - self._published >= self.metrics_interval
+            )
+        if wait > 0.01:
+            logger.debug(f"Rate limiting {host}: waiting {wait:.2f} seconds")
+        if publish:
+            self.publish_metrics()
+
+    def acquire(self, host):
+        """
+        Block until a request to host is allowed
+
+        Returns:
+            Seconds spent waiting
+        """
+        return _sleep(self._reserve(host))
+
+    async def acquire_async(self, host):
+        """Asyncio variant of acquire(); returns seconds spent waiting"""
+        return await _sleep_async(self._reserve(host))
+
+    def headers(self):
+        """Request headers from the user-agent policy (empty without one)"""
+        if self.user_agent_policy is None:
+            return {}
+        # Policies such as UserAgentRotator keep unsynchronized rotation state
+        with self._lock:
+            return {'User-Agent': self.user_agent_policy.get_next_user_agent()}
+
+    def metrics(self):
+        """
+        Waiting statistics per host
+
+        Returns:
+            dict of host -> {'requests', 'throttled', 'wait_seconds', 'max_wait_seconds'}
+        """
+        with self._lock:
+            return {host: dict(stats) for host, stats in self._metrics.items()}
+
+    def publish_metrics(self):
+        """
+        Write this process's metrics to metrics_path (atomically)
+
+        Returns:
+            True if written, False without a metrics_path, nothing to report or on error
+        """
+        metrics = self.metrics()
+        if not self.metrics_path or not metrics:
+            return False
+        with self._lock:
+            self._published = time.monotonic()
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.metrics_path)), exist_ok=True)
+            tmp_path = f"{self.metrics_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({'pid': os.getpid(), 'updated_at': datetime.now().isoformat(), 'hosts': metrics}, f)
+            os.replace(tmp_path, self.metrics_path)
+            return True
+        except Exception as e:
+            logger.error(f"Error publishing rate limiter metrics: {str(e)}")
+            return False
+
+
+def read_published_metrics(directory=None):
+    """
+    Metrics published by the collector processes
+
+    Args:
+        directory: Where limiters publish (default: RATE_LIMIT_METRICS_DIR)
+
+    Returns:
+        dict of process name -> {'pid', 'updated_at', 'hosts'}, hosts as in RateLimiter.metrics()
+    """
+    published = {}
+    for path in sorted(glob.glob(os.path.join(directory or RATE_LIMIT_METRICS_DIR, '*.json'))):
+        try:
+            with open(path) as f:
+                published[os.path.basename(path)[:-len('.json')]] = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping unreadable rate limiter metrics {path}: {str(e)}")
+    return published
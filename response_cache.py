@@ -0,0 +1,245 @@
+import glob
+import hashlib
+import json
+import logging
+import os
+import pickle
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Cache location and behaviour (overridable through the environment)
+RESPONSE_CACHE_DIR = os.getenv(
+    'RESPONSE_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'responses')
+)
+# default: serve fresh entries, refetch (or revalidate) stale ones
+# record:  always fetch and overwrite the recording
+# replay:  never touch the network; serve recordings regardless of age
+# off:     bypass the cache entirely
+RESPONSE_CACHE_MODE = os.getenv('RESPONSE_CACHE_MODE', 'default').lower()
+RESPONSE_CACHE_DEFAULT_TTL = float(os.getenv('RESPONSE_CACHE_DEFAULT_TTL', 900))
+# How long an expired entry is kept past its TTL (for revalidation and stale fallback) before pruning
+RESPONSE_CACHE_STALE_SECONDS = float(os.getenv('RESPONSE_CACHE_STALE_SECONDS', 86400))
+# How often a process writing to the cache prunes it
+RESPONSE_CACHE_PRUNE_INTERVAL = float(os.getenv('RESPONSE_CACHE_PRUNE_INTERVAL', 3600))
+
+# Unreferenced blobs younger than this may belong to a store that hasn't written its index entry yet
+ORPHAN_MIN_AGE_SECONDS = 60
+
+CACHE_MODES = ('default', 'record', 'replay', 'off')
+
+
+class CacheMissError(LookupError):
+    """Raised in replay mode when no recorded response exists for a request"""
+
+
+class ResponseCache:
+    """
+    Content-addressed on-disk cache for upstream data fetches
+
+    Responses are pickled and stored once under the SHA-256 of their bytes
+    (objects/ab/abcdef...pkl). Each request key maps to an index entry that
+    points at a blob and records when it was fetched, its TTL and an optional
+    validator (e.g. FRED's last_updated) used for conditional revalidation.
+
+    Responses fetched with ttl=0 and no validator are only recorded in
+    record mode.
+    Writers prune the cache every RESPONSE_CACHE_PRUNE_INTERVAL seconds:
+    entries expired for longer than RESPONSE_CACHE_STALE_SECONDS are dropped,
+    then blobs no entry points at.
+    """
+
+    def __init__(self, directory=RESPONSE_CACHE_DIR, mode=RESPONSE_CACHE_MODE):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown response cache mode {mode!r}; expected one of {CACHE_MODES}")
+        self.directory = directory
+        self.mode = mode
+        self.stats = {'hits': 0, 'misses': 0, 'revalidated': 0, 'stale_served': 0}
+        self._lock = threading.Lock()
+        self._pruned_at = 0.0
+
+    @staticmethod
+    def request_key(namespace, params):
+        """Stable key for a request: hash of namespace plus sorted parameters"""
+        payload = json.dumps([namespace, params], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _index_path(self, key):
+        return os.path.join(self.directory, 'index', f"{key}.json")
+
+    def _blob_path(self, digest):
+        return os.path.join(self.directory, 'objects', digest[:2], f"{digest}.pkl")
+
+    @staticmethod
+    def _atomic_write(path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _read_entry(self, key):
+        try:
+            with open(self._index_path(key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _load_blob(self, entry):
+        with open(self._blob_path(entry['blob']), 'rb') as f:
+            return pickle.load(f)
+
+    def _store(self, key, namespace, params, value, ttl, validator):
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        digest = hashlib.sha256(data).hexdigest()
+
+        with self._lock:
+            # Identical responses share one blob
+            if not os.path.exists(self._blob_path(digest)):
+                self._atomic_write(self._blob_path(digest), data)
+            entry = {
+                'namespace': namespace,
+                'params': params,
+                'blob': digest,
+                'fetched_at': time.time(),
+                'ttl': ttl,
+                'validator': validator
+            }
+            self._atomic_write(self._index_path(key), json.dumps(entry, default=str).encode('utf-8'))
+
+        if self.mode == 'default' and time.time() - self._pruned_at >= RESPONSE_CACHE_PRUNE_INTERVAL:
+            self.prune()
+
+    def prune(self, stale_seconds=RESPONSE_CACHE_STALE_SECONDS):
+        """
+        Drop long-expired entries and the blobs no entry points at
+
+        Args:
+            stale_seconds: How long past its TTL an entry is kept
+
+        Returns:
+            dict with the number of entries and blobs removed
+        """
+        self._pruned_at = now = time.time()
+        removed = {'entries': 0, 'blobs': 0}
+        referenced = set()
+
+        index_dir = os.path.join(self.directory, 'index')
+        for name in os.listdir(index_dir) if os.path.isdir(index_dir) else []:
+            key = name[:-len('.json')]
+            entry = self._read_entry(key)
+            if entry is None:
+                continue
+            if entry['ttl'] is not None and now - entry['fetched_at'] > entry['ttl'] + stale_seconds:
+                try:
+                    os.remove(self._index_path(key))
+                    removed['entries'] += 1
+                except FileNotFoundError:
+                    pass
+                continue
+            referenced.add(entry['blob'])
+
+        for path in glob.glob(os.path.join(self.directory, 'objects', '*', '*.pkl')):
+            digest = os.path.basename(path)[:-len('.pkl')]
+            try:
+                if digest not in referenced and now - os.path.getmtime(path) > ORPHAN_MIN_AGE_SECONDS:
+                    os.remove(path)
+                    removed['blobs'] += 1
+            except FileNotFoundError:
+                pass
+
+        if removed['entries'] or removed['blobs']:
+            logger.info(f"Pruned {removed['entries']} expired entries and {removed['blobs']} blobs "
+                        f"from {self.directory}")
+        return removed
+
+    def _touch(self, key, entry):
+        entry['fetched_at'] = time.time()
+        with self._lock:
+            self._atomic_write(self._index_path(key), json.dumps(entry, default=str).encode('utf-8'))
+
+    def fetch(self, namespace, params, fetch_fn, ttl=RESPONSE_CACHE_DEFAULT_TTL, revalidate=None):
+        """
+        Return a cached response or call fetch_fn and record its result
+
+        Args:
+            namespace: Source/operation name, e.g. 'yfinance.history'
+            params: JSON-serializable request parameters
+            fetch_fn: Zero-argument callable performing the real fetch
+            ttl: Seconds an entry is served without revalidation (None = forever)
+            revalidate: Optional zero-argument callable returning a cheap
+                        validator; if it matches the stored one, a stale entry
+                        is refreshed without refetching
+
+        Returns:
+            The (possibly cached) response; None results are never cached
+        """
+        if self.mode == 'off':
+            return fetch_fn()
+
+        key = self.request_key(namespace, params)
+        entry = self._read_entry(key)
+
+        if self.mode == 'replay':
+            if entry is None:
+                raise CacheMissError(f"No recorded response for {namespace} {params}")
+            self.stats['hits'] += 1
+            return self._load_blob(entry)
+
+        if entry is not None and self.mode == 'default':
+            age = time.time() - entry['fetched_at']
+            if entry['ttl'] is None or age < entry['ttl']:
+                self.stats['hits'] += 1
+                return self._load_blob(entry)
+
+        validator = None
+        if revalidate is not None and self.mode == 'default':
+            try:
+                validator = revalidate()
+            except Exception as e:
+                logger.warning(f"Revalidation failed for {namespace}: {str(e)}")
+            if entry is not None and validator is not None and validator == entry.get('validator'):
+                # Upstream hasn't changed since we recorded it
+                self.stats['revalidated'] += 1
+                self._touch(key, entry)
+                return self._load_blob(entry)
+
+        self.stats['misses'] += 1
+        try:
+            value = fetch_fn()
+        except Exception:
+            if entry is not None:
+                # Better a stale response than none at all
+                logger.warning(f"Fetch failed for {namespace}, serving stale cached response")
+                self.stats['stale_served'] += 1
+                return self._load_blob(entry)
+            raise
+
+        # ttl=0 asks for a fresh response every time; without a validator to revalidate
+        # against, a recording would never be served, so nothing is kept
+        if value is not None and (ttl != 0 or validator is not None or self.mode == 'record'):
+            self._store(key, namespace, params, value, ttl, validator)
+        return value
+
+    def clear(self):
+        """Remove all cached responses"""
+        import shutil
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+_default_cache = None
+
+
+def get_response_cache():
+    """Return the process-wide ResponseCache configured from the environment"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ResponseCache()
+    return _default_cache
+
+
+def cached_fetch(namespace, params, fetch_fn, ttl=RESPONSE_CACHE_DEFAULT_TTL, revalidate=None):
+    """Fetch through the process-wide response cache (see ResponseCache.fetch)"""
+    return get_response_cache().fetch(namespace, params, fetch_fn, ttl=ttl, revalidate=revalidate)
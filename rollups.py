@@ -0,0 +1,283 @@
+import argparse
+import logging
+import os
+
+import pandas as pd
+
+from calculations import calculate_implied_rate, calculate_roi
+from data_collector import initialize_db, BarRollup
+from storage import session_scope
+from tiered_storage import read_bars
+
+logger = logging.getLogger(__name__)
+
+# Instruments rolled up on ingest (implied rate and ROI assume an MBS price series)
+ROLLUP_TICKERS = [ticker.strip() for ticker in os.getenv('ROLLUP_TICKERS', 'MBB').split(',') if ticker.strip()]
+# Fewest buckets a rollup must give over a requested range before the planner picks it
+ROLLUP_MIN_POINTS = int(os.getenv('ROLLUP_MIN_POINTS', 200))
+
+# Bucket widths, finest first
+ROLLUP_RESOLUTIONS = {
+    '1h': pd.Timedelta(hours=1),
+    '1d': pd.Timedelta(days=1),
+    '1w': pd.Timedelta(weeks=1)
+}
+
+ROLLUP_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume', 'bars', 'implied_rate', 'roi']
+
+
+def bucket_start(timestamp, resolution):
+    """Start of the bucket containing timestamp (weeks start on Monday)"""
+    timestamp = pd.Timestamp(timestamp)
+    if resolution == '1h':
+        return timestamp.floor('h')
+    day = timestamp.normalize()
+    return day - pd.Timedelta(days=day.weekday()) if resolution == '1w' else day
+
+
+def _aggregate(bars, keys, count='timestamp'):
+    """OHLCV per bucket key plus the implied rate and ROI of each bucket's close"""
+    if bars.empty:
+        return pd.DataFrame(columns=ROLLUP_COLUMNS)
+    grouped = bars.groupby(keys, sort=True)
+    rollup = pd.DataFrame({
+        'open': grouped['open'].first(),
+        'high': grouped['high'].max(),
+        'low': grouped['low'].min(),
+        'close': grouped['close'].last(),
+        'volume': grouped['volume'].sum(),
+        'bars': grouped[count].count() if count == 'timestamp' else grouped[count].sum()
+    })
+    rollup.index.name = 'timestamp'
+    rollup = rollup.reset_index()
+    rollup['implied_rate'] = [calculate_implied_rate(close) for close in rollup['close']]
+    rollup['roi'] = [calculate_roi(close) for close in rollup['close']]
+    return rollup[ROLLUP_COLUMNS]
+
+
+def aggregate_bars(bars, resolution):
+    """
+    Roll raw bars (see data_collector.BAR_COLUMNS) up to hourly or daily buckets
+
+    Daily bars, stamped at midnight, share the bar tables with intraday bars.
+    Hourly buckets use intraday bars only. A day's bucket uses its intraday
+    bars when it has any and its daily bar otherwise, so the daily rollup
+    reaches as far back as the daily history without counting a day twice.
+
+    Args:
+        bars: Bars in timestamp order
+        resolution: '1h' or '1d'
+
+    Returns:
+        DataFrame with ROLLUP_COLUMNS, timestamp being the bucket start
+    """
+    timestamps = pd.to_datetime(bars['timestamp'])
+    days = timestamps.dt.normalize()
+    at_midnight = timestamps == days
+    if resolution == '1h':
+        intraday = bars[~at_midnight.to_numpy()]
+        return _aggregate(intraday, timestamps[~at_midnight].dt.floor('h').to_numpy())
+    keep = ~at_midnight | ~days.isin(days[~at_midnight])
+    return _aggregate(bars[keep.to_numpy()], days[keep].to_numpy())
+
+
+def _weekly(daily):
+    """Weekly buckets from daily rollup rows"""
+    days = pd.to_datetime(daily['timestamp'])
+    return _aggregate(daily, (days - pd.to_timedelta(days.dt.weekday, unit='D')).to_numpy(), count='bars')
+
+
+def _replace(session, ticker, resolution, start, end, rollup):
+    """Swap a resolution's buckets in [start, end) for freshly computed ones"""
+    query = session.query(BarRollup).filter(BarRollup.ticker == ticker, BarRollup.resolution == resolution)
+    if start is not None:
+        query = query.filter(BarRollup.bucket >= start)
+    if end is not None:
+        query = query.filter(BarRollup.bucket < end)
+    query.delete(synchronize_session=False)
+
+    rows = [
+        {'ticker': ticker, 'resolution': resolution, 'bucket': row.timestamp.to_pydatetime(),
+         'open': row.open, 'high': row.high, 'low': row.low, 'close': row.close, 'volume': int(row.volume),
+         'bars': int(row.bars), 'implied_rate': row.implied_rate, 'roi': row.roi}
+        for row in rollup.itertuples(index=False)
+    ]
+    if rows:
+        session.execute(BarRollup.__table__.insert(), rows)
+    return len(rows)
+
+
+def update_rollups(ticker='MBB', since=None, until=None, session=None, db_path=None):
+    """
+    Recompute the rollup buckets touched by bars in [since, until]
+
+    Hourly and daily buckets are rebuilt from the bars of the touched days
+    (quarantined bars left out, archived bars included) and weekly buckets
+    from the daily rollups of the touched weeks, so an ingest costs a few
+    days of bars however long the history is. The first update for an
+    instrument rebuilds its whole history.
+
+    Args:
+        ticker: Instrument
+        since: Earliest new or changed bar (default: full rebuild)
+        until: Latest new or changed bar (default: unbounded)
+        session: Session to write with (default: a new transaction on db_path)
+        db_path: Database file (default: MBB_DB_PATH)
+
+    Returns:
+        Number of rollup rows written
+    """
+    if session is None:
+        initialize_db(db_path)
+        with session_scope(db_path) as session:
+            return update_rollups(ticker, since, until, session, db_path)
+
+    if since is not None and session.query(BarRollup.bucket).filter(BarRollup.ticker == ticker).first() is None:
+        since = None
+
+    day_start = bucket_start(since, '1d') if since is not None else None
+    day_end = bucket_start(until, '1d') + pd.Timedelta(days=1) if until is not None else None
+    bars = read_bars(ticker, day_start, day_end, session=session)
+
+    written = sum(
+        _replace(session, ticker, resolution, day_start, day_end, aggregate_bars(bars, resolution))
+        for resolution in ('1h', '1d')
+    )
+
+    week_start = bucket_start(day_start, '1w') if day_start is not None else None
+    week_end = bucket_start(day_end - pd.Timedelta(days=1), '1w') + ROLLUP_RESOLUTIONS['1w'] \
+        if day_end is not None else None
+    daily = read_rollups(ticker, '1d', week_start, week_end, session=session)
+    written += _replace(session, ticker, '1w', week_start, week_end, _weekly(daily))
+
+    logger.info(f"Rolled up {len(bars)} {ticker} bars into {written} buckets")
+    return written
+
+
+def read_rollups(ticker, resolution, start=None, end=None, session=None, db_path=None):
+    """
+    Stored rollup buckets in timestamp order
+
+    Args:
+        ticker: Instrument
+        resolution: One of ROLLUP_RESOLUTIONS
+        start: Include the bucket containing start and later ones (default: unbounded)
+        end: Buckets starting before end (default: unbounded)
+        session: Session to read with (default: a new session on db_path)
+        db_path: Database file (default: MBB_DB_PATH)
+
+    Returns:
+        DataFrame with ROLLUP_COLUMNS, timestamp being the bucket start
+    """
+    if session is None:
+        with session_scope(db_path) as session:
+            return read_rollups(ticker, resolution, start, end, session)
+
+    columns = [BarRollup.bucket] + [getattr(BarRollup, col) for col in ROLLUP_COLUMNS[1:]]
+    query = session.query(*columns).filter(BarRollup.ticker == ticker, BarRollup.resolution == resolution)
+    if start is not None:
+        query = query.filter(BarRollup.bucket >= bucket_start(start, resolution))
+    if end is not None:
+        query = query.filter(BarRollup.bucket < end)
+    rollup = pd.DataFrame(query.order_by(BarRollup.bucket).all(), columns=ROLLUP_COLUMNS)
+    rollup['timestamp'] = pd.to_datetime(rollup['timestamp'])
+    return rollup
+
+
+def covers_range(ticker, resolution, rollup, start, end=None, session=None, db_path=None):
+    """
+    Whether a rollup read over [start, end) stands in for every stored bar there
+
+    Daily and weekly buckets include daily-only history, but hourly buckets
+    are built from intraday bars alone: over days that only have a daily bar
+    they are missing, and serving them would drop those days from the range.
+
+    Args:
+        ticker: Instrument
+        resolution: Key of ROLLUP_RESOLUTIONS the rollup was read at
+        rollup: Buckets returned by read_rollups for the range
+        start: Range start
+        end: Range end (default: unbounded)
+        session: Session to read with (default: a new session on db_path)
+        db_path: Database file (default: MBB_DB_PATH)
+
+    Returns:
+        True when the rollup has a bucket on every day with bars in the range
+    """
+    if rollup.empty:
+        return False
+    if resolution != '1h':
+        return True
+    days = read_rollups(ticker, '1d', start, end, session=session, db_path=db_path)['timestamp']
+    # The day start falls in only needs hourly buckets if the range begins at its midnight
+    days = days[days >= pd.Timestamp(start)]
+    return bool(days.isin(rollup['timestamp'].dt.normalize()).all())
+
+
+def choose_resolution(start, end=None, resolution=None, min_points=ROLLUP_MIN_POINTS, max_resolution=None):
+    """
+    Coarsest rollup that satisfies a requested range and resolution
+
+    Args:
+        start: Range start
+        end: Range end (default: now)
+        resolution: Widest acceptable bucket, as a Timedelta or string such
+            as '4h' (default: the range over min_points)
+        min_points: Fewest buckets the range must span when resolution is not given
+        max_resolution: Widest bucket the caller can use whatever the range
+            (e.g. '1h' for analyses that need intraday spread)
+
+    Returns:
+        Key of ROLLUP_RESOLUTIONS, or None when only raw bars are fine enough
+    """
+    if resolution is None:
+        end = pd.Timestamp(end) if end is not None else pd.Timestamp.now()
+        resolution = (end - pd.Timestamp(start)) / min_points
+    resolution = pd.Timedelta(resolution)
+    if max_resolution is not None:
+        resolution = min(resolution, pd.Timedelta(max_resolution))
+    fitting = [name for name, width in ROLLUP_RESOLUTIONS.items() if width <= resolution]
+    return fitting[-1] if fitting else None
+
+
+def roll_up_stored_bars(ticker, since, until=None, db_path=None):
+    """
+    Refresh the rollup buckets touched by bars a writer just committed
+
+    Every path that writes bars calls this after its commit, next to
+    price_cache.cache_stored_bars. A failed update is logged and left for
+    the next update or the daily rebuild to repair.
+
+    Args:
+        ticker: Instrument
+        since: Earliest new or changed bar
+        until: Latest new or changed bar (default: unbounded)
+        db_path: Database file (default: MBB_DB_PATH)
+
+    Returns:
+        Number of rollup rows written, or None if the ticker is not rolled up or the update failed
+    """
+    if ticker not in ROLLUP_TICKERS:
+        return None
+    try:
+        return update_rollups(ticker, since=since, until=until, db_path=db_path)
+    except Exception as e:
+        logger.error(f"Error updating {ticker} rollups: {str(e)}")
+        return None
+
+
+def rollup_consumer(ticker, bars, db_path=None):
+    """Intraday collector consumer: fold newly committed bars into the rollups"""
+    roll_up_stored_bars(ticker, bars['timestamp'].min(), bars['timestamp'].max(), db_path=db_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the hourly, daily and weekly bar rollups")
+    parser.add_argument('--ticker', action='append', help="Instrument to roll up (repeatable; default: ROLLUP_TICKERS)")
+    parser.add_argument('--since', help="Only rebuild buckets from this date on (default: full history)")
+    parser.add_argument('--db', help="Database file (default: MBB_DB_PATH)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    for ticker in args.ticker or ROLLUP_TICKERS:
+        print(f"{ticker}: {update_rollups(ticker, since=args.since, db_path=args.db)} buckets written")
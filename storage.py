@@ -0,0 +1,153 @@
+import logging
+import os
+import threading
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+logger = logging.getLogger(__name__)
+
+# Database locations and SQLite tuning (overridable through the environment)
+MBB_DB_PATH = os.getenv('MBB_DB_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mbb_data.db'))
+MBS_DB_PATH = os.getenv('MBS_DB_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mbs_data.db'))
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+SQLITE_CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', 65536))
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 268435456))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 30000))
+SQLITE_POOL_SIZE = int(os.getenv('SQLITE_POOL_SIZE', 5))
+# Takes effect for new databases; existing ones are converted by data_retention --convert-vacuum
+SQLITE_AUTO_VACUUM = os.getenv('SQLITE_AUTO_VACUUM', 'INCREMENTAL')
+
+# Database files by name
+DATABASE_PATHS = {
+    'mbb': MBB_DB_PATH,
+    'mbs': MBS_DB_PATH
+}
+# Which database each table lives in; tables not listed here live in 'mbb'
+# (bars and everything derived from them, see data_collector)
+TABLE_DATABASES = {
+    # FRED observations and materialized ROI (see data_ingestion)
+    'fred_data': 'mbs',
+    'daily_roi': 'mbs',
+    'mbs_prices': 'mbs'
+}
+
+_engines = {}
+_sessions = {}
+_lock = threading.Lock()
+
+
+def _apply_pragmas(dbapi_connection, connection_record):
+    """Configure every new SQLite connection for concurrent readers and one writer"""
+    cursor = dbapi_connection.cursor()
+    # Must come before the first table is created; lets retention free pages without a full VACUUM
+    cursor.execute(f"PRAGMA auto_vacuum={SQLITE_AUTO_VACUUM}")
+    # WAL lets readers proceed while a writer holds the write lock
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    # Negative cache_size is in KiB rather than pages
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+def get_engine(db_path=None):
+    """
+    Return the shared engine for a SQLite database file, creating it on first use
+
+    Args:
+        db_path: Path to the database file (default: MBB_DB_PATH)
+
+    Returns:
+        SQLAlchemy engine with WAL mode and tuned pragmas on every connection
+    """
+    db_path = os.path.abspath(db_path or MBB_DB_PATH)
+
+    with _lock:
+        engine = _engines.get(db_path)
+        if engine is None:
+            engine = create_engine(
+                f'sqlite:///{db_path}',
+                pool_size=SQLITE_POOL_SIZE,
+                max_overflow=SQLITE_POOL_SIZE * 2,
+                pool_pre_ping=True,
+                connect_args={
+                    'check_same_thread': False,
+                    'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000
+                }
+            )
+            event.listen(engine, 'connect', _apply_pragmas)
+            _engines[db_path] = engine
+            logger.info(f"Created SQLite engine for {db_path}")
+
+    return engine
+
+
+def database_path(table):
+    """Database file a table lives in (see TABLE_DATABASES)"""
+    return DATABASE_PATHS[TABLE_DATABASES.get(table, 'mbb')]
+
+
+def engine_for(table):
+    """Shared engine for the database a table lives in"""
+    return get_engine(database_path(table))
+
+
+def get_scoped_session(db_path=None):
+    """
+    Return the thread-local scoped session registry for a database
+
+    Call ``.remove()`` on the registry when the unit of work ends (the Flask
+    integration in init_app does this at the end of each request).
+    """
+    db_path = os.path.abspath(db_path or MBB_DB_PATH)
+    engine = get_engine(db_path)
+
+    with _lock:
+        registry = _sessions.get(db_path)
+        if registry is None:
+            registry = scoped_session(sessionmaker(bind=engine))
+            _sessions[db_path] = registry
+
+    return registry
+
+
+@contextmanager
+def session_scope(db_path=None):
+    """
+    Provide a transactional scope around a series of operations
+
+    Commits on success, rolls back on error and always closes the session.
+    """
+    session = sessionmaker(bind=get_engine(db_path))()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def init_app(app, db_path=None):
+    """Remove the request-scoped session when each Flask app context ends"""
+    registry = get_scoped_session(db_path)
+
+    @app.teardown_appcontext
+    def _remove_session(exc):
+        registry.remove()
+
+    return registry
+
+
+def dispose_engines():
+    """Dispose all pooled connections (e.g. after forking a worker process)"""
+    with _lock:
+        for registry in _sessions.values():
+            registry.remove()
+        for engine in _engines.values():
+            engine.dispose()
@@ -0,0 +1,358 @@
+import logging
+import math
+import os
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict, deque
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from data_collector import BarValidation, MarketBar
+from data_validation import (
+    MIN_VALID_VOLUME, IGNORE_ZERO_VOLUME, MAX_TIME_GAP_MINUTES, MAX_PRICE_SWING_PCT, market_hours_mask
+)
+
+logger = logging.getLogger(__name__)
+
+# Bars of history behind the rolling volume/range statistics (one session of 1m bars)
+STREAM_VALIDATION_WINDOW = int(os.getenv('STREAM_VALIDATION_WINDOW', 390))
+# Paired returns behind the running correlation with the reference instrument
+STREAM_CORRELATION_WINDOW = int(os.getenv('STREAM_CORRELATION_WINDOW', 390))
+STREAM_REFERENCE_TICKER = os.getenv('STREAM_REFERENCE_TICKER', '^TNX')
+# A bar whose high-low range exceeds this multiple of the rolling median range is flagged
+STREAM_RANGE_OUTLIER_MULTIPLE = float(os.getenv('STREAM_RANGE_OUTLIER_MULTIPLE', 10))
+# Bars seen before the rolling range is trusted for outlier checks
+STREAM_WARMUP_BARS = 30
+
+RESULT_COLUMNS = ['timestamp', 'passed', 'flags', 'volume_percentile', 'range_pct', 'correlation']
+# Rows per upsert statement, well under SQLite's bound-parameter limit
+_WRITE_CHUNK = 500
+
+
+class RollingWindow:
+    """Last N values kept both in arrival order and sorted, for O(log N) ranks and quantiles"""
+
+    def __init__(self, size):
+        self.size = size
+        self.values = deque()
+        self.ordered = []
+
+    def __len__(self):
+        return len(self.values)
+
+    def push(self, value):
+        self.values.append(value)
+        insort(self.ordered, value)
+        if len(self.values) > self.size:
+            oldest = self.values.popleft()
+            del self.ordered[bisect_left(self.ordered, oldest)]
+
+    def percentile(self, value):
+        """Share of the window at or below value, in percent (None while empty)"""
+        if not self.ordered:
+            return None
+        return 100.0 * bisect_right(self.ordered, value) / len(self.ordered)
+
+    def median(self):
+        if not self.ordered:
+            return None
+        middle = len(self.ordered) // 2
+        if len(self.ordered) % 2:
+            return self.ordered[middle]
+        return (self.ordered[middle - 1] + self.ordered[middle]) / 2
+
+
+class RollingCorrelation:
+    """Pearson correlation over the last N (x, y) pairs, updated in O(1) per pair"""
+
+    def __init__(self, size):
+        self.size = size
+        self.pairs = deque()
+        self.sx = self.sy = self.sxx = self.syy = self.sxy = 0.0
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def _add(self, x, y, sign):
+        self.sx += sign * x
+        self.sy += sign * y
+        self.sxx += sign * x * x
+        self.syy += sign * y * y
+        self.sxy += sign * x * y
+
+    def push(self, x, y):
+        self.pairs.append((x, y))
+        self._add(x, y, 1)
+        if len(self.pairs) > self.size:
+            self._add(*self.pairs.popleft(), -1)
+
+    def value(self):
+        n = len(self.pairs)
+        if n < 3:
+            return None
+        cov = self.sxy - self.sx * self.sy / n
+        var_x = self.sxx - self.sx * self.sx / n
+        var_y = self.syy - self.sy * self.sy / n
+        if var_x <= 0 or var_y <= 0:
+            return None
+        return max(-1.0, min(1.0, cov / math.sqrt(var_x * var_y)))
+
+
+class _TickerState:
+    """Rolling statistics for one instrument"""
+
+    def __init__(self, window, correlation_window):
+        self.last_timestamp = None
+        self.last_close = None
+        self.volumes = RollingWindow(window)
+        self.ranges = RollingWindow(window)
+        # timestamp -> return, newest last; what other instruments pair against
+        self.returns = OrderedDict()
+        self.returns_size = max(window, correlation_window)
+        self.correlation = RollingCorrelation(correlation_window)
+        self.bars_seen = 0
+
+
+class StreamingValidator:
+    """
+    Validate bars as they arrive, in O(batch) time
+
+    Keeps per-instrument rolling statistics (last timestamp and close, a
+    window of volumes and high-low ranges, a running return correlation
+    with a reference instrument) instead of re-checking whole histories.
+    Each bar is checked against the state built from the bars before it:
+
+    - out_of_order: not newer than the last validated bar
+    - gap: in-session gap from the previous bar over max_gap_minutes
+    - bad_prices: non-positive prices or high/low not bracketing open/close
+    - low_volume: traded volume below min_volume
+    - price_swing: high-low range over max_swing_pct of the low
+    - range_outlier: range over range_outlier_multiple x the rolling median
+
+    Bars are validated, then stored and checkpointed by the caller; after a
+    failed write call forget() so the state is rebuilt from the database.
+    """
+
+    def __init__(self, window=STREAM_VALIDATION_WINDOW, correlation_window=STREAM_CORRELATION_WINDOW,
+                 reference=STREAM_REFERENCE_TICKER, min_volume=MIN_VALID_VOLUME, ignore_zero=IGNORE_ZERO_VOLUME,
+                 max_gap_minutes=MAX_TIME_GAP_MINUTES, max_swing_pct=MAX_PRICE_SWING_PCT,
+                 range_outlier_multiple=STREAM_RANGE_OUTLIER_MULTIPLE):
+        """
+        Args:
+            window: Bars behind the rolling volume and range statistics
+            correlation_window: Paired returns behind the running correlation
+            reference: Instrument every other instrument's returns are correlated with
+            min_volume: Lowest acceptable traded volume
+            ignore_zero: Don't flag zero-volume bars (indices and yields never trade)
+            max_gap_minutes: Longest acceptable in-session gap between bars
+            max_swing_pct: Largest acceptable high-low range, percent of the low
+            range_outlier_multiple: Flag ranges this many times the rolling median
+        """
+        self.window = window
+        self.correlation_window = correlation_window
+        self.reference = reference
+        self.min_volume = min_volume
+        self.ignore_zero = ignore_zero
+        self.max_gap_minutes = max_gap_minutes
+        self.max_swing_pct = max_swing_pct
+        self.range_outlier_multiple = range_outlier_multiple
+        self.states = {}
+
+    def __contains__(self, ticker):
+        return ticker in self.states
+
+    def forget(self, ticker):
+        """Drop an instrument's state (all state for the reference, whose returns others are paired with)"""
+        if ticker == self.reference:
+            self.states.clear()
+        else:
+            self.states.pop(ticker, None)
+
+    def prime(self, session, ticker, before=None, session_only=False):
+        """
+        Rebuild an instrument's rolling state from its stored bars
+
+        The reference instrument is primed first, so stored history also
+        seeds the running correlation.
+
+        Args:
+            session: SQLAlchemy session
+            ticker: Instrument to prime
+            before: Only use bars older than this timestamp
+            session_only: Skip bars outside market hours (daily bars stored
+                at midnight share market_bars with intraday bars)
+        """
+        if ticker != self.reference and self.reference not in self.states:
+            self.prime(session, self.reference, before, session_only)
+
+        query = session.query(
+            MarketBar.timestamp, MarketBar.open, MarketBar.high, MarketBar.low, MarketBar.close, MarketBar.volume
+        ).filter(MarketBar.ticker == ticker)
+        if before is not None:
+            query = query.filter(MarketBar.timestamp < before)
+        if session_only:
+            bar_time = func.time(MarketBar.timestamp)
+            query = query.filter(bar_time >= '09:30:00', bar_time < '16:00:00')
+        rows = query.order_by(MarketBar.timestamp.desc()).limit(max(self.window, self.correlation_window)).all()
+
+        history = pd.DataFrame(reversed(rows), columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+        if session_only and not history.empty:
+            # Weekend bars pass the time-of-day filter
+            history = history[market_hours_mask(history['timestamp'])]
+        self.states[ticker] = _TickerState(self.window, self.correlation_window)
+        self._run(ticker, history)
+        logger.debug(f"Primed {ticker} validator state from {len(history)} stored bars")
+
+    def validate(self, ticker, bars):
+        """
+        Check a batch of new bars and fold them into the rolling state
+
+        Args:
+            ticker: Instrument the bars belong to
+            bars: DataFrame with BAR_COLUMNS (see data_collector.frame_to_bars)
+
+        Returns:
+            DataFrame with one row per bar: timestamp, passed, flags
+            (comma-separated), volume_percentile, range_pct and the running
+            correlation with the reference instrument (None until enough
+            paired returns have been seen)
+        """
+        results = self._run(ticker, bars)
+        failed = results[~results['passed']]
+        if not failed.empty:
+            logger.warning(
+                f"{len(failed)} of {len(results)} new {ticker} bars failed validation "
+                f"(first {failed['timestamp'].iloc[0]}: {failed['flags'].iloc[0]})"
+            )
+        return results
+
+    def _run(self, ticker, bars):
+        state = self.states.get(ticker)
+        if state is None:
+            state = self.states[ticker] = _TickerState(self.window, self.correlation_window)
+        if bars is None or bars.empty:
+            return pd.DataFrame(columns=RESULT_COLUMNS)
+
+        timestamps = pd.DatetimeIndex(bars['timestamp'])
+        # Session mask and day numbers for the previous bar plus the batch, computed once
+        previous = [state.last_timestamp] if state.last_timestamp is not None else []
+        stamps = pd.DatetimeIndex(previous).append(timestamps)
+        in_session = market_hours_mask(stamps)
+        days = stamps.to_numpy().astype('datetime64[D]')
+        # Position in stamps of the last accepted bar
+        last_position = 0 if previous else None
+
+        columns = [bars[col].to_numpy(dtype=float) for col in ('open', 'high', 'low', 'close', 'volume')]
+        records = []
+        for i, (timestamp, open_, high, low, close, volume) in enumerate(zip(timestamps, *columns)):
+            flags = []
+            position = len(previous) + i
+            last = state.last_timestamp
+            if last is not None and timestamp <= last:
+                flags.append('out_of_order')
+            elif last is not None and in_session[last_position] and in_session[position] \
+                    and days[last_position] == days[position] \
+                    and (timestamp - last).total_seconds() / 60 > self.max_gap_minutes:
+                flags.append('gap')
+
+            if min(open_, high, low, close) <= 0 or high < max(open_, close) or low > min(open_, close):
+                flags.append('bad_prices')
+
+            volume_percentile = state.volumes.percentile(volume)
+            if volume < self.min_volume and not (self.ignore_zero and volume == 0):
+                flags.append('low_volume')
+
+            range_pct = (high - low) / low * 100 if low > 0 else None
+            if range_pct is not None:
+                if range_pct > self.max_swing_pct:
+                    flags.append('price_swing')
+                median_range = state.ranges.median()
+                if state.bars_seen >= STREAM_WARMUP_BARS and median_range \
+                        and range_pct > self.range_outlier_multiple * median_range:
+                    flags.append('range_outlier')
+
+            if 'out_of_order' not in flags:
+                self._update(ticker, state, timestamp, close, volume, range_pct)
+                last_position = position
+            # Correlation with the reference as of this bar (the reference has none with itself)
+            correlation = state.correlation.value() if ticker != self.reference else None
+            records.append((timestamp, not flags, ','.join(flags), volume_percentile, range_pct, correlation))
+
+        return pd.DataFrame.from_records(records, columns=RESULT_COLUMNS)
+
+    def _update(self, ticker, state, timestamp, close, volume, range_pct):
+        state.volumes.push(volume)
+        if range_pct is not None:
+            state.ranges.push(range_pct)
+        state.bars_seen += 1
+
+        if state.last_close and close > 0:
+            ret = close / state.last_close - 1
+            state.returns[timestamp] = ret
+            if len(state.returns) > state.returns_size:
+                state.returns.popitem(last=False)
+            # Each (instrument, reference) pair is counted once, when its later half arrives
+            if ticker == self.reference:
+                for other, other_state in self.states.items():
+                    if other != ticker and timestamp in other_state.returns:
+                        other_state.correlation.push(other_state.returns[timestamp], ret)
+            else:
+                reference = self.states.get(self.reference)
+                if reference is not None and timestamp in reference.returns:
+                    state.correlation.push(ret, reference.returns[timestamp])
+        state.last_timestamp = timestamp
+        state.last_close = close
+
+    def stats(self, ticker):
+        """Current rolling statistics for an instrument (None if it hasn't been seen)"""
+        state = self.states.get(ticker)
+        if state is None:
+            return None
+        return {
+            'last_timestamp': state.last_timestamp,
+            'bars_seen': state.bars_seen,
+            'median_volume': state.volumes.median(),
+            'median_range_pct': state.ranges.median(),
+            'reference': self.reference,
+            'correlation': state.correlation.value(),
+            'correlation_pairs': len(state.correlation)
+        }
+
+
+def write_validations(session, ticker, results):
+    """
+    Upsert per-bar validation results into bar_validations
+
+    Nothing is committed, so results land in the same transaction as the bars.
+
+    Returns:
+        Number of results written
+    """
+    if results is None or results.empty:
+        return 0
+    checked_at = datetime.now()
+    rows = [
+        {
+            'ticker': ticker,
+            'timestamp': timestamp.to_pydatetime(),
+            'passed': bool(passed),
+            'flags': flags,
+            'volume_percentile': None if percentile is None or np.isnan(percentile) else float(percentile),
+            'range_pct': None if range_pct is None or np.isnan(range_pct) else float(range_pct),
+            'correlation': None if correlation is None or np.isnan(correlation) else float(correlation),
+            'checked_at': checked_at
+        }
+        for timestamp, passed, flags, percentile, range_pct, correlation
+        in results[RESULT_COLUMNS].itertuples(index=False)
+    ]
+    for start in range(0, len(rows), _WRITE_CHUNK):
+        statement = sqlite_insert(BarValidation.__table__).values(rows[start:start + _WRITE_CHUNK])
+        session.execute(statement.on_conflict_do_update(
+            index_elements=['ticker', 'timestamp'],
+            set_={col: statement.excluded[col] for col in ('passed', 'flags', 'volume_percentile', 'range_pct',
+                                                           'correlation', 'checked_at')}
+        ))
+    return len(rows)
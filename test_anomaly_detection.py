@@ -0,0 +1,102 @@
+import logging
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from anomaly_detection import detect_anomalies, scan
+from data_collector import frame_to_bars, initialize_db, not_quarantined, MBBCoupon, QuarantinedBar
+from instrument_collector import write_bars
+from market_simulator import SimulatedMarketSource
+from market_snapshot import load_snapshot
+from storage import session_scope
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def simulated_bars(start, end='2024-12-31', interval='1m'):
+    source = SimulatedMarketSource(clock=lambda: pd.Timestamp('2024-12-31 17:00', tz='US/Eastern'))
+    return frame_to_bars(source.fetch('MBB', interval=interval, start=start, end=end))
+
+
+def corrupt(bars):
+    """Inject one of each anomaly into a clean history"""
+    bars = bars.copy()
+    bars.loc[2000, ['close', 'high']] = bars.loc[2000, 'close'] * 1.03           # bad print, reverted next bar
+    bars.loc[4000, 'volume'] = bars.loc[4000, 'volume'] * 1000                   # volume blowout
+    bars.loc[6000:6039, ['open', 'high', 'low', 'close']] = bars.loc[6000, 'close']  # frozen feed
+    bars.loc[8000, 'high'] = bars.loc[8000, 'high'] * 1.02                       # wick far outside the range
+    return bars
+
+
+def test_detects_each_anomaly_without_false_positives():
+    clean = simulated_bars('2024-01-01', '2024-03-01')
+    assert not detect_anomalies(clean)['anomalous'].any()
+
+    scores = detect_anomalies(corrupt(clean).sample(frac=1, random_state=0))
+    flagged = scores[scores['anomalous']].set_index('timestamp')['reasons']
+    timestamps = clean['timestamp']
+    assert flagged[timestamps[2000]] == 'range,spike_revert'
+    assert flagged[timestamps[4000]] == 'volume'
+    assert flagged[timestamps[8000]] == 'range'
+    assert set(flagged[timestamps[6001]:timestamps[6039]]) == {'stale'}
+    # ...followed by the catch-up move once it unfreezes
+    assert flagged[timestamps[6040]] == 'return'
+    # The bar that reverted the spike is not an anomaly
+    assert timestamps[2001] not in flagged.index
+
+    # Daily and intraday bars are scored as separate series
+    daily = simulated_bars('2015-01-01', interval='1d')
+    assert not detect_anomalies(pd.concat([clean, daily]))['anomalous'].any()
+
+
+def test_multi_year_history_scores_quickly():
+    bars = simulated_bars('2022-01-01')
+    started = time.perf_counter()
+    scores = detect_anomalies(bars)
+    assert time.perf_counter() - started < 1.0
+    assert len(scores) == len(bars)
+
+
+def test_quarantine_hides_bars_from_readers():
+    db_path = os.path.join(tempfile.mkdtemp(), 'anomalies.db')
+    initialize_db(db_path)
+    bars = corrupt(simulated_bars('2024-01-01', '2024-03-01'))
+    spike = bars.loc[2000, 'timestamp']
+    with session_scope(db_path) as session:
+        write_bars(session, 'MBB', bars.iloc[:2001])
+
+    # Before the next bar arrives the spike is already out of range; readers skip it
+    assert scan('MBB', db_path=db_path) == 1
+    with session_scope(db_path) as session:
+        assert session.get(QuarantinedBar, ('MBB', spike.to_pydatetime())).reasons == 'return,range'
+        assert load_snapshot(session).timestamp == bars.loc[1999, 'timestamp']
+
+    # Incremental scans rescore only new bars; a full scan sees the reversion too
+    with session_scope(db_path) as session:
+        write_bars(session, 'MBB', bars.iloc[2001:])
+    assert scan('MBB', since=bars.loc[2001, 'timestamp'], db_path=db_path) == 42
+    assert scan('MBB', db_path=db_path) == 43
+
+    with session_scope(db_path) as session:
+        assert session.get(QuarantinedBar, ('MBB', spike.to_pydatetime())).reasons == 'range,spike_revert'
+        assert session.query(MBBCoupon).filter(not_quarantined()).count() == len(bars) - 43
+        assert load_snapshot(session).timestamp == bars['timestamp'].iloc[-1]
+
+    # A corrected refetch releases the bar on the next scan
+    fixed = simulated_bars('2024-01-01', '2024-03-01')
+    with session_scope(db_path) as session:
+        write_bars(session, 'MBB', fixed)
+    assert scan('MBB', db_path=db_path) == 0
+
+
+if __name__ == "__main__":
+    test_detects_each_anomaly_without_false_positives()
+    test_multi_year_history_scores_quickly()
+    test_quarantine_hides_bars_from_readers()
@@ -0,0 +1,130 @@
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+from contextlib import contextmanager
+
+import pandas as pd
+
+import app as app_module
+import storage
+from data_collector import frame_to_bars, initialize_db
+from instrument_collector import write_bars
+from market_simulator import SimulatedMarketSource
+from rollups import update_rollups
+from storage import get_scoped_session, session_scope
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def _client(db_path):
+    """Test client of an app whose default database is db_path"""
+    saved = storage.MBB_DB_PATH, storage.DATABASE_PATHS['mbb'], app_module.Session
+    storage.MBB_DB_PATH = storage.DATABASE_PATHS['mbb'] = db_path
+    app_module.Session = get_scoped_session(db_path)
+    try:
+        yield app_module.create_app().test_client()
+    finally:
+        storage.MBB_DB_PATH, storage.DATABASE_PATHS['mbb'], app_module.Session = saved
+
+
+def _year_of_bars():
+    """A year of 30m MBB bars up to now, stored in a fresh database"""
+    db_path = os.path.join(tempfile.mkdtemp(), 'app.db')
+    initialize_db(db_path)
+    now = pd.Timestamp.now(tz='US/Eastern').floor('min')
+    source = SimulatedMarketSource(clock=lambda: now)
+    start = (now - pd.Timedelta(days=370)).strftime('%Y-%m-%d')
+    bars = frame_to_bars(source.fetch('MBB', interval='30m', start=start)).sort_values('timestamp')
+    with session_scope(db_path) as session:
+        write_bars(session, 'MBB', bars)
+    return db_path
+
+
+HEAVY_MODULES = ['pandas', 'numpy', 'pyarrow', 'matplotlib', 'yfinance']
+
+
+def test_import_defers_heavy_dependencies():
+    # A fresh interpreter, since this one has imported them already
+    directory = tempfile.mkdtemp()
+    env = dict(os.environ, MBB_DB_PATH=os.path.join(directory, 'mbb.db'),
+               MBS_DB_PATH=os.path.join(directory, 'mbs.db'))
+    script = f"import sys, app; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, env=env,
+                            cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+    assert result.stdout.strip() == ''
+
+
+def _mostly_daily_bars():
+    """Daily MBB bars for 400 days up to now with 30m bars for the last few days only"""
+    db_path = os.path.join(tempfile.mkdtemp(), 'app.db')
+    initialize_db(db_path)
+    now = pd.Timestamp.now(tz='US/Eastern').floor('min')
+    source = SimulatedMarketSource(clock=lambda: now)
+    daily_start = (now - pd.Timedelta(days=400)).strftime('%Y-%m-%d')
+    intraday_start = (now - pd.Timedelta(days=4)).strftime('%Y-%m-%d')
+    with session_scope(db_path) as session:
+        write_bars(session, 'MBB', frame_to_bars(source.fetch('MBB', interval='1d', start=daily_start)))
+        write_bars(session, 'MBB', frame_to_bars(source.fetch('MBB', interval='30m', start=intraday_start)))
+    return db_path
+
+
+def test_hourly_rollup_is_skipped_over_daily_history():
+    db_path = _mostly_daily_bars()
+    update_rollups('MBB', db_path=db_path)
+    with _client(db_path) as client:
+        quarter = client.get('/api/mbb_data?range=3m').get_json()
+        year = client.get('/api/mbb_data?range=1y').get_json()
+
+    # Hourly buckets only exist for the last few days, so three months come from the bars
+    assert quarter['resolution'] == 'raw'
+    assert len(quarter['timestamps']) > 60
+    # The daily rollup includes daily-only days and still serves long ranges
+    assert year['resolution'] == '1d'
+    assert len(year['timestamps']) > 240
+
+
+def test_payback_comparison_keeps_intraday_spread_with_rollups():
+    db_path = _year_of_bars()
+    with _client(db_path) as client:
+        before = client.get('/api/payback_comparison?range=1y').get_json()
+
+    # Once rollups exist a year would be served as daily buckets (one rate per day) without the cap
+    update_rollups('MBB', db_path=db_path)
+    with _client(db_path) as client:
+        after = client.get('/api/payback_comparison?range=1y').get_json()
+        data = client.get('/api/mbb_data?range=1y').get_json()
+
+    assert data['resolution'] == '1d'
+    assert len(before['dates']) > 200
+    assert len(after['dates']) > 200
+    assert len(after['one_point_payback']) == len(after['dates'])
+
+
+def test_export_data_writes_named_columns():
+    db_path = _year_of_bars()
+    with _client(db_path) as client:
+        response = client.get('/api/export_data?range=1w')
+
+    lines = response.get_data(as_text=True).split('\r\n')
+    assert lines[0] == 'Timestamp,Open,High,Low,Close,Volume,Implied Rate'
+    assert len(lines) > 50
+    fields = lines[1].split(',')
+    assert len(fields) == 7
+    # Volume stays an integer and the implied rate is filled in for every row
+    assert fields[5].isdigit()
+    assert all(line.split(',')[6] for line in lines[1:] if line)
+
+
+if __name__ == "__main__":
+    test_import_defers_heavy_dependencies()
+    test_hourly_rollup_is_skipped_over_daily_history()
+    test_payback_comparison_keeps_intraday_spread_with_rollups()
+    test_export_data_writes_named_columns()
@@ -0,0 +1,123 @@
+import logging
+import os
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func
+
+from backfill import backfill, find_missing_sessions, plan_fetch_windows
+from data_collector import MBBCoupon, initialize_db, frame_to_bars, upsert_bars
+from market_calendar import trading_days, is_trading_day
+from rate_limiter import RateLimiter
+from rollups import read_rollups, update_rollups
+from storage import session_scope
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def make_daily_frame(start, end):
+    """Daily bars for every trading session in [start, end)"""
+    index = trading_days(start, pd.Timestamp(end) - pd.Timedelta(days=1))
+    close = 95 + np.arange(len(index)) * 0.01
+    return pd.DataFrame({
+        'Open': close, 'High': close + 0.2, 'Low': close - 0.2, 'Close': close,
+        'Volume': np.full(len(index), 1000)
+    }, index=index)
+
+
+class WindowFetcher:
+    """Local fake data source that serves whatever window it's asked for"""
+
+    host = 'fake.local'
+
+    def __init__(self):
+        self.windows = []
+        self._lock = threading.Lock()
+
+    def fetch(self, ticker, period='5d', interval='1d', start=None, end=None):
+        with self._lock:
+            self.windows.append((start, end))
+        return make_daily_frame(start, end)
+
+
+def test_market_calendar_holidays():
+    assert not is_trading_day('2024-03-29')   # Good Friday
+    assert not is_trading_day('2024-06-19')   # Juneteenth
+    assert not is_trading_day('2024-07-04')
+    assert is_trading_day('2024-10-14')       # Columbus Day: markets open
+    assert is_trading_day('2024-11-11')       # Veterans Day: markets open
+    # 2024 has 252 sessions
+    assert len(trading_days('2024-01-01', '2024-12-31')) == 252
+
+
+def test_plan_merges_adjacent_and_bridged_gaps():
+    start, end = '2024-06-03', '2024-06-28'
+    sessions = trading_days(start, end)
+    counts = pd.Series(1, index=sessions)
+    # Gap A: Jun 5-6; gap B: Jun 10 (one present session after A); gap C: Jun 24-25
+    counts = counts.drop(pd.to_datetime(['2024-06-05', '2024-06-06', '2024-06-10', '2024-06-24', '2024-06-25']))
+
+    missing = find_missing_sessions(counts, start, end)
+    assert len(missing) == 5
+
+    windows = plan_fetch_windows(missing, start, end, bridge_sessions=1)
+    assert [(str(s), str(e)) for s, e in windows] == [
+        ('2024-06-05', '2024-06-11'),
+        ('2024-06-24', '2024-06-26')
+    ]
+
+    # Without bridging each gap gets its own window
+    assert len(plan_fetch_windows(missing, start, end, bridge_sessions=0)) == 3
+    # Intraday limits split long windows
+    assert len(plan_fetch_windows(missing, start, end, max_window_sessions=2, bridge_sessions=1)) == 3
+
+
+def test_holidays_are_not_gaps():
+    start, end = '2024-07-01', '2024-07-12'
+    counts = pd.Series(1, index=trading_days(start, end))
+    assert len(find_missing_sessions(counts, start, end)) == 0
+
+
+def test_backfill_heals_gaps():
+    db_path = os.path.join(tempfile.mkdtemp(), 'backfill.db')
+    initialize_db(db_path)
+
+    full = make_daily_frame('2024-01-02', '2024-07-01')
+    holes = (full.index.month == 3) | ((full.index.month == 5) & (full.index.day < 8))
+    with session_scope(db_path) as session:
+        upsert_bars(session, frame_to_bars(full[~holes]))
+    update_rollups('MBB', db_path=db_path)
+
+    fetcher = WindowFetcher()
+    summary = backfill('MBB', start='2024-01-02', end='2024-06-28', fetcher=fetcher,
+                       rate_limiter=RateLimiter(), db_path=db_path)
+
+    assert summary['missing_sessions'] == int(holes.sum())
+    assert len(fetcher.windows) == 2
+    assert summary['inserted'] == int(holes.sum())
+
+    with session_scope(db_path) as session:
+        assert session.query(func.count(MBBCoupon.id)).scalar() == len(full)
+    # The healed days reach the rollups too
+    assert len(read_rollups('MBB', '1d', db_path=db_path)) == len(full)
+
+    # A second pass finds nothing to do
+    fetcher = WindowFetcher()
+    summary = backfill('MBB', start='2024-01-02', end='2024-06-28', fetcher=fetcher,
+                       rate_limiter=RateLimiter(), db_path=db_path)
+    assert summary['missing_sessions'] == 0
+    assert fetcher.windows == []
+
+
+if __name__ == "__main__":
+    test_market_calendar_holidays()
+    test_plan_merges_adjacent_and_bridged_gaps()
+    test_holidays_are_not_gaps()
+    test_backfill_heals_gaps()
@@ -0,0 +1,89 @@
+import logging
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from bar_series import BarSeries
+from calculations import calculate_implied_rate
+from data_collector import frame_to_bars
+from market_simulator import SimulatedMarketSource
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+NOW = pd.Timestamp('2024-06-14 17:00', tz='US/Eastern')
+
+
+def _bars(start='2024-06-03', interval='5m'):
+    source = SimulatedMarketSource(clock=lambda: NOW)
+    return frame_to_bars(source.fetch('MBB', interval=interval, start=start)).sort_values('timestamp')
+
+
+def test_slices_are_views_and_windows_binary_search():
+    bars = _bars()
+    series = BarSeries.from_frame(bars)
+    assert series.columns == ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+    assert len(series) == len(bars)
+
+    head = series[:10]
+    assert np.shares_memory(head.close, series.close)
+    assert len(head) == 10
+
+    start, end = pd.Timestamp('2024-06-05 10:00'), pd.Timestamp('2024-06-06 10:00')
+    window = series.window(start, end)
+    expected = bars[(bars['timestamp'] >= start) & (bars['timestamp'] < end)]
+    assert (window.close == expected['close'].to_numpy()).all()
+    assert np.shares_memory(window.timestamp, series.timestamp)
+    assert len(series.window(end, start)) == 0
+
+
+def test_conversions_match_per_bar_formatting():
+    bars = _bars()
+    series = BarSeries.from_frame(bars)
+
+    assert series.implied_rates().tolist() == [calculate_implied_rate(close) for close in bars['close']]
+    assert series.isoformat() == [timestamp.isoformat() for timestamp in bars['timestamp']]
+
+    records = series.records(['timestamp', 'close', 'volume'])
+    first = bars.iloc[0]
+    assert records[0] == {'timestamp': first['timestamp'].isoformat(), 'close': first['close'],
+                          'volume': int(first['volume'])}
+    assert type(records[0]['volume']) is int
+    assert series.to_dict(['close'])['close'] == bars['close'].tolist()
+
+    # implied_rates() filled in the implied_rate column, which to_frame() carries along
+    frame = series.to_frame()
+    assert frame.columns.tolist() == bars.columns.tolist() + ['implied_rate']
+    pd.testing.assert_frame_equal(frame[bars.columns], bars.reset_index(drop=True))
+    assert frame['volume'].dtype == np.int64
+
+
+def test_year_of_bars_is_an_order_of_magnitude_smaller_than_row_objects():
+    bars = _bars(start='2023-06-14')
+
+    tracemalloc.start()
+    rows = list(bars.itertuples(index=False))
+    dicts = [{'timestamp': row.timestamp, 'open': row.open, 'high': row.high, 'low': row.low, 'close': row.close,
+              'volume': row.volume} for row in rows]
+    row_bytes = tracemalloc.get_traced_memory()[0]
+    del rows, dicts
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    series = BarSeries.from_frame(bars)
+    series_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    assert len(series) > 15000
+    assert series_bytes * 10 < row_bytes
+
+
+if __name__ == "__main__":
+    test_slices_are_views_and_windows_binary_search()
+    test_conversions_match_per_bar_formatting()
+    test_year_of_bars_is_an_order_of_magnitude_smaller_than_row_objects()
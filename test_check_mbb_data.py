@@ -0,0 +1,70 @@
+import logging
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import event
+
+from check_mbb_data import data_status
+from data_collector import initialize_db, frame_to_bars, upsert_bars
+from market_calendar import trading_days
+from storage import get_engine, session_scope
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def seed(db_path, index):
+    close = 95 + np.arange(len(index)) * 0.01
+    frame = pd.DataFrame({
+        'Open': close, 'High': close + 0.2, 'Low': close - 0.2, 'Close': close,
+        'Volume': np.full(len(index), 1000)
+    }, index=index)
+    with session_scope(db_path) as session:
+        upsert_bars(session, frame_to_bars(frame))
+
+
+def test_status_is_holiday_aware_and_single_query():
+    db_path = os.path.join(tempfile.mkdtemp(), 'status.db')
+    initialize_db(db_path)
+
+    sessions = trading_days('2021-01-04', '2024-12-31')
+    dropped = pd.to_datetime(['2023-03-14', '2023-03-15', '2024-08-01'])
+    seed(db_path, sessions.difference(dropped))
+
+    statements = []
+    engine = get_engine(db_path)
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        with session_scope(db_path) as session:
+            status = data_status(session, today='2025-01-02')
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+
+    # Four years of history checked in one round trip
+    assert len(statements) == 1
+    assert status['total_bars'] == len(sessions) - 3
+    # Good Friday, Juneteenth, Thanksgiving etc. are not reported as gaps
+    assert status['missing_sessions'] == ['2023-03-14', '2023-03-15', '2024-08-01']
+    assert status['duplicate_bars'] == {}
+    assert status['non_trading_days_with_data'] == []
+    assert status['sessions_behind'] == 0
+    assert status['daily_counts']['2024-12-31'] == 1
+
+
+def test_empty_database():
+    db_path = os.path.join(tempfile.mkdtemp(), 'empty.db')
+    initialize_db(db_path)
+    with session_scope(db_path) as session:
+        assert data_status(session) == {'ticker': 'MBB', 'total_bars': 0}
+
+
+if __name__ == "__main__":
+    test_status_is_holiday_aware_and_single_query()
+    test_empty_database()
@@ -0,0 +1,100 @@
+import logging
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+import instrument_collector
+from correlation_tracker import CorrelationTracker
+from data_collector import frame_to_bars, initialize_db
+from data_validation import validate_mort_correlation
+from instrument_collector import write_bars
+from market_simulator import SimulatedMarketSource
+from storage import session_scope
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+TICKERS = ['MBB', '^MORT', '^TNX']
+
+
+def store_daily_bars(db_path, start, end):
+    source = SimulatedMarketSource(clock=lambda: pd.Timestamp('2024-12-31 17:00', tz='US/Eastern'))
+    closes = {}
+    with session_scope(db_path) as session:
+        for ticker in TICKERS:
+            bars = frame_to_bars(source.fetch(ticker, start=start, end=end))
+            # ^MORT only publishes some days; returns still pair on common dates
+            if ticker == '^MORT':
+                bars = bars.iloc[::2]
+            write_bars(session, ticker, bars)
+            closes[ticker] = bars.set_index('timestamp')['close']
+    return closes
+
+
+def test_incremental_updates_match_full_recompute():
+    db_path = os.path.join(tempfile.mkdtemp(), 'correlation.db')
+    initialize_db(db_path)
+    store_daily_bars(db_path, '2023-01-01', '2024-06-01')
+
+    tracker = CorrelationTracker(references=['^MORT', '^TNX'], windows=[20, 60], db_path=db_path)
+    assert tracker.update(through='2024-05-31') > 0
+    assert tracker.update(through='2024-05-31') == 0
+
+    # One new session at a time costs one row per reference and window
+    closes = store_daily_bars(db_path, '2024-06-01', '2024-07-01')
+    assert tracker.update(through='2024-06-03') == 4
+
+    started = time.perf_counter()
+    tracker.update(through='2024-06-30')
+    assert time.perf_counter() - started < 1.0
+
+    # A fresh process replays history once and agrees with pandas
+    restarted = CorrelationTracker(references=['^MORT', '^TNX'], windows=[20, 60], db_path=db_path)
+    assert restarted.update(through='2024-06-30') == 0
+
+    returns = {}
+    for ticker in TICKERS:
+        series = pd.read_sql(
+            f"SELECT timestamp, close FROM market_bars WHERE ticker = '{ticker}' ORDER BY timestamp",
+            f'sqlite:///{db_path}', parse_dates=['timestamp'], index_col='timestamp'
+        )['close']
+        returns[ticker] = series.pct_change().dropna()
+    for reference in ('^MORT', '^TNX'):
+        paired = pd.concat([returns['MBB'], returns[reference]], axis=1, join='inner').loc[:'2024-06-30']
+        expected = paired.iloc[-20:].corr().iloc[0, 1]
+        latest = restarted.latest(window=20, reference=reference)[0]
+        assert latest['date'] == paired.index[-1].date().isoformat()
+        assert abs(latest['correlation'] - expected) < 1e-9
+        assert latest['pairs'] == 20
+
+    assert [row['reference'] for row in restarted.latest(window=60)] == ['^MORT', '^TNX']
+    assert len(restarted.history('^TNX', 20, start='2024-06-01')) == len(closes['^TNX'].loc['2024-06-01':'2024-06-30'])
+
+
+def test_validation_never_fetches():
+    db_path = os.path.join(tempfile.mkdtemp(), 'correlation.db')
+    initialize_db(db_path)
+    store_daily_bars(db_path, '2024-01-01', '2024-07-01')
+
+    def no_network(*args, **kwargs):
+        raise AssertionError("validation fetched over the network")
+
+    original = instrument_collector.fetch_instruments
+    instrument_collector.fetch_instruments = no_network
+    try:
+        # Both outcomes come from the locally maintained values
+        assert validate_mort_correlation(lookback_days=30, min_correlation=-1.0, db_path=db_path)
+        assert not validate_mort_correlation(lookback_days=30, min_correlation=1.0, db_path=db_path)
+    finally:
+        instrument_collector.fetch_instruments = original
+
+
+if __name__ == "__main__":
+    test_incremental_updates_match_full_recompute()
+    test_validation_never_fetches()
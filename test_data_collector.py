@@ -0,0 +1,82 @@
+import logging
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_collector import initialize_db, frame_to_bars, upsert_bars, MBBCoupon
+from storage import session_scope
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def _history_frame(start='2024-05-01 09:30', periods=390, freq='1min', seed=1):
+    """Build a frame shaped like yfinance Ticker.history() output"""
+    rng = np.random.default_rng(seed)
+    index = pd.date_range(start, periods=periods, freq=freq, tz='America/New_York')
+    close = 95 + rng.normal(0, 0.05, periods).cumsum()
+    return pd.DataFrame({
+        'Open': close + 0.01,
+        'High': close + 0.05,
+        'Low': close - 0.05,
+        'Close': close,
+        'Volume': rng.integers(100, 10000, periods)
+    }, index=index)
+
+
+def test_frame_to_bars_keeps_wall_clock_time():
+    bars = frame_to_bars(_history_frame(periods=3))
+    assert list(bars['timestamp'].dt.strftime('%H:%M')) == ['09:30', '09:31', '09:32']
+    assert bars['timestamp'].dt.tz is None
+
+
+def test_upsert_counts_and_same_day_bars():
+    """Re-ingesting overlapping windows updates changed bars and keeps same-day intraday bars"""
+    db_path = os.path.join(tempfile.mkdtemp(), 'upsert.db')
+    initialize_db(db_path)
+
+    full_day = _history_frame(periods=390)
+    morning = frame_to_bars(full_day.iloc[:120])
+    with session_scope(db_path) as session:
+        counts = upsert_bars(session, morning)
+    assert counts == {'inserted': 120, 'updated': 0, 'skipped': 0}
+
+    # Full day: first 120 bars unchanged except one revised close, 270 new same-day bars
+    full_day.iloc[10, full_day.columns.get_loc('Close')] += 0.25
+    with session_scope(db_path) as session:
+        counts = upsert_bars(session, frame_to_bars(full_day))
+    assert counts == {'inserted': 270, 'updated': 1, 'skipped': 119}
+
+    with session_scope(db_path) as session:
+        assert session.query(MBBCoupon).count() == 390
+        revised = session.query(MBBCoupon).order_by(MBBCoupon.timestamp).offset(10).first()
+        assert revised.close == float(full_day['Close'].iloc[10])
+
+
+def test_bulk_backfill_is_fast():
+    """A year of 1-minute bars should ingest in seconds"""
+    db_path = os.path.join(tempfile.mkdtemp(), 'backfill.db')
+    initialize_db(db_path)
+
+    hist = _history_frame(start='2023-01-02 09:30', periods=252 * 390)
+    t0 = time.perf_counter()
+    with session_scope(db_path) as session:
+        counts = upsert_bars(session, frame_to_bars(hist))
+    elapsed = time.perf_counter() - t0
+
+    logger.info(f"Upserted {counts['inserted']} bars in {elapsed:.2f}s")
+    assert counts['inserted'] == 252 * 390
+    assert elapsed < 30
+
+
+if __name__ == "__main__":
+    test_frame_to_bars_keeps_wall_clock_time()
+    test_upsert_counts_and_same_day_bars()
+    test_bulk_backfill_is_fast()
@@ -0,0 +1,105 @@
+import logging
+import os
+import sqlite3
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import data_ingestion
+import storage
+from rate_limiter import RateLimiter
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+class FakeFred:
+    """Local stand-in for get_fred_series: weekly observations up to a moving 'today'"""
+
+    def __init__(self, last_date):
+        self.last_date = pd.Timestamp(last_date)
+        self.requests = []
+
+    def __call__(self, series_id, observation_start=None):
+        self.requests.append((series_id, observation_start))
+        index = pd.date_range('2020-01-02', self.last_date, freq='7D')
+        values = pd.Series(3 + np.arange(len(index)) * 0.01, index=index)
+        if observation_start is not None:
+            values = values[values.index >= pd.Timestamp(observation_start)]
+        return values
+
+
+def with_temp_database(test):
+    """Point data_ingestion at a throwaway mbs_data.db and a fake FRED"""
+    def run():
+        db_file = os.path.join(tempfile.mkdtemp(), 'mbs_data.db')
+        original_path, original_fetch = storage.DATABASE_PATHS['mbs'], data_ingestion.get_fred_series
+        storage.DATABASE_PATHS['mbs'] = db_file
+        try:
+            test(db_file)
+        finally:
+            storage.DATABASE_PATHS['mbs'], data_ingestion.get_fred_series = original_path, original_fetch
+    run.__name__ = test.__name__
+    return run
+
+
+def ingest(fake):
+    data_ingestion.get_fred_series = fake
+    data_ingestion.initialize_schema()
+    since = data_ingestion.fred_high_water_marks()
+    df = data_ingestion.get_fred_mbs_data(since=since, rate_limiter=RateLimiter())
+    return data_ingestion.store_data(df)
+
+
+@with_temp_database
+def test_incremental_ingestion_only_moves_new_observations(db_file):
+    fake = FakeFred('2024-05-30')
+    total = ingest(fake)
+    assert fake.requests[-1] == ('MORTGAGE30US', None)
+
+    # Nothing new: nothing written, and the request starts after the high-water mark
+    assert ingest(fake) == 0
+    assert fake.requests[-1] == ('MORTGAGE30US', pd.Timestamp('2024-05-31').date())
+
+    fake.last_date = pd.Timestamp('2024-06-13')
+    assert ingest(fake) == 2
+
+    with sqlite3.connect(db_file) as conn:
+        count, distinct = conn.execute("SELECT COUNT(*), COUNT(DISTINCT date) FROM fred_data").fetchone()
+        assert count == distinct == total + 2
+        assert conn.execute("SELECT MAX(date) FROM fred_data").fetchone()[0] == '2024-06-13'
+
+
+@with_temp_database
+def test_legacy_append_only_table_is_compacted(db_file):
+    legacy = pd.DataFrame({
+        'date': pd.to_datetime(['2024-05-02', '2024-05-09'] * 3),
+        'value': [7.22, 7.09] * 3,
+        'series': '30yr_fixed_rate',
+        'coupon_rate': None
+    })
+    with sqlite3.connect(db_file) as conn:
+        legacy.to_sql('fred_data', conn, index=False)
+
+    data_ingestion.initialize_schema()
+    with sqlite3.connect(db_file) as conn:
+        rows = conn.execute("SELECT series, date, value FROM fred_data ORDER BY date").fetchall()
+    assert rows == [('30yr_fixed_rate', '2024-05-02', 7.22), ('30yr_fixed_rate', '2024-05-09', 7.09)]
+
+    # Revised values replace rather than duplicate
+    data_ingestion.store_data(pd.DataFrame({
+        'date': [pd.Timestamp('2024-05-09')], 'value': [7.10], 'series': ['30yr_fixed_rate']
+    }))
+    with sqlite3.connect(db_file) as conn:
+        assert conn.execute("SELECT COUNT(*), MAX(value) FROM fred_data").fetchone() == (2, 7.22)
+        assert conn.execute("SELECT value FROM fred_data WHERE date = '2024-05-09'").fetchone() == (7.10,)
+
+
+if __name__ == "__main__":
+    test_incremental_ingestion_only_moves_new_observations()
+    test_legacy_append_only_table_is_compacted()
@@ -0,0 +1,89 @@
+import glob
+import logging
+import os
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from data_collector import frame_to_bars, initialize_db
+from data_retention import enforce_data_retention, incremental_vacuum
+from instrument_collector import write_bars
+from market_simulator import SimulatedMarketSource
+from storage import get_engine, session_scope
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def test_archives_then_deletes_in_batches_and_shrinks_file():
+    directory = tempfile.mkdtemp()
+    db_path, archive_dir = os.path.join(directory, 'retention.db'), os.path.join(directory, 'archive')
+    initialize_db(db_path)
+
+    now = pd.Timestamp.now(tz='US/Eastern')
+    source = SimulatedMarketSource(clock=lambda: now)
+    start = (now - pd.DateOffset(years=2, months=3)).strftime('%Y-%m-%d')
+    bars = frame_to_bars(source.fetch('MBB', interval='5m', start=start))
+    with session_scope(db_path) as session:
+        write_bars(session, 'MBB', bars)
+        write_bars(session, 'VMBS', bars)
+
+    cutoff = datetime.now() - timedelta(days=365 * 2)
+    expired = int((bars['timestamp'] < cutoff).sum())
+    size_before = os.path.getsize(db_path)
+
+    deleted = enforce_data_retention(db_path, archive_dir=archive_dir, batch_rows=1000, pause_seconds=0)
+    # mbb_coupons plus both tickers in market_bars
+    assert deleted == 3 * expired
+
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+        assert conn.execute("PRAGMA freelist_count").fetchone()[0] == 0
+        oldest = conn.execute("SELECT MIN(timestamp) FROM mbb_coupons").fetchone()[0]
+        assert pd.Timestamp(oldest) >= cutoff
+        assert conn.execute("SELECT COUNT(*) FROM mbb_coupons").fetchone()[0] == len(bars) - expired
+    assert os.path.getsize(db_path) < size_before
+
+    # Every expired row is in exactly one month partition
+    files = sorted(glob.glob(os.path.join(archive_dir, 'mbb_coupons', 'year=*', 'month=*', '*.parquet')))
+    archived = pd.concat([pd.read_parquet(path) for path in files])
+    assert len(archived) == expired
+    assert archived['timestamp'].is_unique
+    for path in files:
+        month = pd.read_parquet(path)['timestamp'].dt.strftime('year=%Y/month=%m').unique()
+        assert list(month) == [os.path.relpath(os.path.dirname(path), os.path.join(archive_dir, 'mbb_coupons'))]
+    expected = bars[bars['timestamp'] < cutoff].set_index('timestamp')['close']
+    assert archived.set_index('timestamp')['close'].sort_index().equals(expected.sort_index())
+
+    # Nothing left to expire
+    assert enforce_data_retention(db_path, archive_dir=archive_dir, pause_seconds=0) == 0
+
+
+def test_incremental_vacuum_reports_pages_freed():
+    db_path = os.path.join(tempfile.mkdtemp(), 'vacuum.db')
+    initialize_db(db_path)
+    now = pd.Timestamp('2024-06-14 17:00', tz='US/Eastern')
+    bars = frame_to_bars(SimulatedMarketSource(clock=lambda: now).fetch('MBB', interval='5m', start='2024-03-01'))
+    with session_scope(db_path) as session:
+        write_bars(session, 'VMBS', bars)
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("DELETE FROM market_bars")
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    assert free > 100
+
+    # Every step frees up to `pages` pages, and the count is what left the freelist
+    assert incremental_vacuum(get_engine(db_path), pages=40, pause_seconds=0) == free
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("PRAGMA freelist_count").fetchone()[0] == 0
+    assert incremental_vacuum(get_engine(db_path), pages=40, pause_seconds=0) == 0
+
+
+if __name__ == "__main__":
+    test_archives_then_deletes_in_batches_and_shrinks_file()
+    test_incremental_vacuum_reports_pages_freed()
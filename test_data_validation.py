@@ -0,0 +1,59 @@
+import logging
+import time
+
+import pandas as pd
+
+from data_validation import find_time_gaps, is_market_hours, market_hours_mask, validate_time_continuity
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def minute_bars(sessions):
+    """Naive exchange wall-clock 1m timestamps for whole sessions, like stored bars"""
+    index = pd.DatetimeIndex([])
+    for day in pd.bdate_range(sessions[0], sessions[1]):
+        index = index.append(pd.date_range(day + pd.Timedelta(hours=9, minutes=30), periods=390, freq='1min'))
+    return pd.DataFrame({'timestamp': index})
+
+
+def test_mask_matches_scalar_check():
+    aware = pd.date_range('2024-07-05 00:00', '2024-07-08 23:59', freq='7min', tz='UTC')
+    expected = [is_market_hours(ts.to_pydatetime()) for ts in aware]
+    assert list(market_hours_mask(aware)) == expected
+    # Naive timestamps are exchange wall-clock time
+    naive = pd.DatetimeIndex(['2024-07-08 09:29', '2024-07-08 09:30', '2024-07-08 15:59', '2024-07-08 16:00'])
+    assert list(market_hours_mask(naive)) == [False, True, True, False]
+    assert [is_market_hours(ts.to_pydatetime()) for ts in naive] == [False, True, True, False]
+
+
+def test_gaps_are_located_after_reordering():
+    bars = minute_bars(('2024-07-01', '2024-07-03'))
+    assert validate_time_continuity(bars)
+    # Overnight breaks are never gaps
+    assert find_time_gaps(bars)[0] == 1.0
+
+    holed = bars.drop(bars.index[400:500]).sample(frac=1, random_state=0)
+    passed, gaps = validate_time_continuity(holed, return_gaps=True)
+    assert not passed
+    assert gaps.to_dict('records') == [{
+        'start': pd.Timestamp('2024-07-02 09:39'), 'end': pd.Timestamp('2024-07-02 11:20'), 'minutes': 101.0
+    }]
+    assert validate_time_continuity(holed, max_gap_minutes=120)
+
+
+def test_year_of_minute_bars_validates_quickly():
+    bars = minute_bars(('2024-01-01', '2024-12-31'))
+    started = time.perf_counter()
+    assert validate_time_continuity(bars)
+    assert time.perf_counter() - started < 0.5
+
+
+if __name__ == "__main__":
+    test_mask_matches_scalar_check()
+    test_gaps_are_located_after_reordering()
+    test_year_of_minute_bars_validates_quickly()
@@ -0,0 +1,109 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func
+
+from data_collector import MarketBar, MBBCoupon
+from instrument_collector import collect_instruments, fetch_instruments
+from rate_limiter import RateLimiter
+from storage import session_scope
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+class FakeFetcher:
+    """Local fake data source: deterministic daily bars, with simulated latency"""
+
+    host = 'fake.local'
+
+    def __init__(self, latency=0.05, failing=()):
+        self.latency = latency
+        self.failing = set(failing)
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def fetch(self, ticker, period='5d', interval='1d', start=None, end=None):
+        with self._lock:
+            self.calls.append(ticker)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.latency)
+            if ticker in self.failing:
+                raise ConnectionError(f"upstream error for {ticker}")
+
+            rng = np.random.default_rng(sum(map(ord, ticker)))
+            index = pd.date_range('2024-05-01', periods=5, freq='B', tz='America/New_York')
+            close = 50 + rng.normal(0, 1, len(index)).cumsum()
+            return pd.DataFrame({
+                'Open': close, 'High': close + 0.5, 'Low': close - 0.5, 'Close': close,
+                'Volume': rng.integers(1000, 5000, len(index))
+            }, index=index)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def test_collect_instruments_concurrently():
+    db_path = os.path.join(tempfile.mkdtemp(), 'collector.db')
+    fetcher = FakeFetcher(latency=0.2)
+    tickers = ['MBB', 'VMBS', 'JMBS', '^TNX', '^TYX']
+
+    t0 = time.perf_counter()
+    results = collect_instruments(tickers, fetcher=fetcher, rate_limiter=RateLimiter(),
+                                  max_workers=5, db_path=db_path)
+    elapsed = time.perf_counter() - t0
+
+    assert set(results) == set(tickers)
+    assert all(counts == {'inserted': 5, 'updated': 0, 'skipped': 0} for counts in results.values())
+    assert fetcher.max_active > 1
+    assert elapsed < 0.2 * len(tickers)
+
+    with session_scope(db_path) as session:
+        per_ticker = dict(session.query(MarketBar.ticker, func.count()).group_by(MarketBar.ticker).all())
+        assert per_ticker == {ticker: 5 for ticker in tickers}
+        # MBB is also mirrored into the table the web app reads
+        assert session.query(MBBCoupon).count() == 5
+
+    # Re-collecting the same window changes nothing
+    results = collect_instruments(tickers, fetcher=fetcher, rate_limiter=RateLimiter(), db_path=db_path)
+    assert all(counts['skipped'] == 5 for counts in results.values())
+
+
+def test_failed_instrument_does_not_block_others():
+    db_path = os.path.join(tempfile.mkdtemp(), 'failing.db')
+    results = collect_instruments(['MBB', '^MORT'], fetcher=FakeFetcher(failing={'^MORT'}),
+                                  rate_limiter=RateLimiter(), db_path=db_path)
+    assert results['^MORT'] is None
+    assert results['MBB']['inserted'] == 5
+
+
+def test_rate_limiter_spaces_requests_per_host():
+    limiter = RateLimiter.from_min_delay(0.1)
+    fetcher = FakeFetcher(latency=0)
+
+    t0 = time.perf_counter()
+    frames = fetch_instruments(['A', 'B', 'C', 'D'], fetcher=fetcher, rate_limiter=limiter, max_workers=4)
+    elapsed = time.perf_counter() - t0
+
+    assert all(frame is not None for frame in frames.values())
+    # Four requests to one host need at least three delays between them
+    assert elapsed >= 0.3
+
+
+if __name__ == "__main__":
+    test_collect_instruments_concurrently()
+    test_failed_instrument_does_not_block_others()
+    test_rate_limiter_spaces_requests_per_host()
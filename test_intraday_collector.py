@@ -0,0 +1,121 @@
+import logging
+import os
+import tempfile
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytz
+from sqlalchemy import func
+
+from data_collector import BarValidation, CollectorCheckpoint, MarketBar, MBBCoupon
+from intraday_collector import IntradayCollector
+from rate_limiter import RateLimiter
+from storage import session_scope
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+EASTERN = pytz.timezone('US/Eastern')
+
+
+class FakeClock:
+    def __init__(self, wall_clock):
+        self.now = EASTERN.localize(datetime.fromisoformat(wall_clock))
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, **kwargs):
+        self.now = self.now + pd.Timedelta(**kwargs)
+
+
+class MinuteFetcher:
+    """Local fake data source: 1m bars from the open through the current (still forming) minute"""
+
+    host = 'fake.local'
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.starts = []
+
+    def fetch(self, ticker, period='5d', interval='1m', start=None, end=None):
+        self.starts.append(start)
+        now = pd.Timestamp(self.clock()).tz_convert('US/Eastern')
+        session_open = now.normalize() + pd.Timedelta(hours=9, minutes=30)
+        index = pd.date_range(session_open, now.floor('min'), freq='min')
+        close = 95 + np.arange(len(index)) * 0.001
+        return pd.DataFrame({
+            'Open': close, 'High': close + 0.01, 'Low': close - 0.01, 'Close': close,
+            'Volume': np.full(len(index), 100)
+        }, index=index)
+
+
+def test_polls_closed_bars_and_resumes_from_checkpoint():
+    db_path = os.path.join(tempfile.mkdtemp(), 'intraday.db')
+    clock = FakeClock('2024-06-04 10:00:30')
+    fetcher = MinuteFetcher(clock)
+    delivered = []
+
+    def make_collector():
+        return IntradayCollector(['MBB', 'VMBS'], interval='1m', fetcher=fetcher, rate_limiter=RateLimiter(),
+                                 db_path=db_path, clock=clock,
+                                 consumers=[lambda ticker, bars: delivered.append((ticker, len(bars)))])
+
+    collector = make_collector()
+    # 9:30 through 9:59 have closed; the 10:00 bar is still forming
+    assert collector.poll_once() == {'MBB': 30, 'VMBS': 30}
+    assert sorted(delivered) == [('MBB', 30), ('VMBS', 30)]
+
+    clock.advance(minutes=5)
+    assert collector.poll_once() == {'MBB': 5, 'VMBS': 5}
+    assert collector.poll_once() == {'MBB': 0, 'VMBS': 0}
+
+    # "Crash" and restart: a new instance resumes from the persisted checkpoint
+    clock.advance(minutes=2)
+    delivered.clear()
+    restarted = make_collector()
+    assert restarted.load_checkpoints()['MBB'] == datetime(2024, 6, 4, 10, 4)
+    assert restarted.poll_once() == {'MBB': 2, 'VMBS': 2}
+    assert sorted(delivered) == [('MBB', 2), ('VMBS', 2)]
+
+    with session_scope(db_path) as session:
+        assert session.query(func.count(MarketBar.id)).filter(MarketBar.ticker == 'VMBS').scalar() == 37
+        assert session.query(func.count(MBBCoupon.id)).scalar() == 37
+        # Every committed bar was validated in the same transaction
+        assert session.query(BarValidation).filter(BarValidation.passed.is_(True)).count() == 74
+        checkpoint = session.get(CollectorCheckpoint, ('MBB', '1m'))
+        assert checkpoint.last_bar == datetime(2024, 6, 4, 10, 6)
+
+
+def test_schedule_follows_market_hours():
+    clock = FakeClock('2024-06-04 10:00:30')
+    collector = IntradayCollector(['MBB'], interval='1m', clock=clock, poll_lag_seconds=5, idle_seconds=300)
+
+    # In session: wake 5s after the next minute closes
+    assert collector.should_poll()
+    assert abs(collector.seconds_until_next_poll() - 35) < 1e-6
+
+    # The last bar closes at 16:00, so polling continues briefly after the bell
+    clock.now = EASTERN.localize(datetime(2024, 6, 4, 16, 0, 5))
+    assert collector.should_poll()
+    clock.now = EASTERN.localize(datetime(2024, 6, 4, 16, 5))
+    assert not collector.should_poll()
+    assert collector.seconds_until_next_poll() == 300
+
+    # Holidays are skipped even during regular hours
+    clock.now = EASTERN.localize(datetime(2024, 7, 4, 11, 0))
+    assert not collector.should_poll()
+
+    # Shortly before the open, sleep just until it
+    clock.now = EASTERN.localize(datetime(2024, 6, 5, 9, 29))
+    assert abs(collector.seconds_until_next_poll() - 65) < 1e-6
+
+
+if __name__ == "__main__":
+    test_polls_closed_bars_and_resumes_from_checkpoint()
+    test_schedule_follows_market_hours()
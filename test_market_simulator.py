@@ -0,0 +1,84 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+from benchmark_ingest import run_benchmark
+from data_collector import fetch_historical_mbb_data
+from data_ingestion import get_fred_series
+from data_sources import get_bar_source, set_data_source, YahooSource
+from market_calendar import trading_days
+from market_simulator import SimulatedMarketSource
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def fixed_clock(wall_clock):
+    now = pd.Timestamp(wall_clock, tz='US/Eastern')
+    return lambda: now
+
+
+def test_bars_are_deterministic_and_follow_the_calendar():
+    source = SimulatedMarketSource(clock=fixed_clock('2024-07-10 16:30'))
+    bars = source.fetch('MBB', interval='5m', start='2024-07-01', end='2024-07-09')
+
+    # July 4th is a holiday; 78 five-minute bars per session
+    sessions = pd.DatetimeIndex(bars.index.date).unique()
+    assert list(sessions) == list(trading_days('2024-07-01', '2024-07-08'))
+    assert len(bars) == len(sessions) * 78
+    assert bars.index[0] == pd.Timestamp('2024-07-01 09:30', tz='America/New_York')
+    assert list(bars.columns) == ['Open', 'High', 'Low', 'Close', 'Volume']
+    assert (bars['High'] >= bars[['Open', 'Close']].max(axis=1)).all()
+    assert (bars['Low'] <= bars[['Open', 'Close']].min(axis=1)).all()
+
+    # Same request, overlapping window and a fresh instance all agree
+    again = SimulatedMarketSource(clock=fixed_clock('2024-07-10 16:30'))
+    assert again.fetch('MBB', interval='5m', start='2024-07-01', end='2024-07-09').equals(bars)
+    part = source.fetch('MBB', interval='5m', start='2024-07-03', end='2024-07-06')
+    assert bars.loc[part.index].equals(part)
+
+    # Another seed gives another market
+    other = SimulatedMarketSource(seed=1, clock=fixed_clock('2024-07-10 16:30'))
+    assert not np.allclose(other.fetch('MBB', interval='5m', start='2024-07-01', end='2024-07-09')['Close'],
+                           bars['Close'])
+
+
+def test_current_session_is_partial():
+    source = SimulatedMarketSource(clock=fixed_clock('2024-07-10 10:00'))
+    bars = source.fetch('^TNX', interval='1m', period='1d')
+    assert len(bars) == 31
+    assert (bars['Volume'] == 0).all()
+    assert source.fetch('MBB', period='1d').index[-1] == pd.Timestamp('2024-07-10', tz='America/New_York')
+
+
+def test_override_routes_collectors_and_fred_through_simulator():
+    source = SimulatedMarketSource(clock=fixed_clock('2024-07-10 16:30'))
+    assert isinstance(get_bar_source(), YahooSource)
+    set_data_source(source)
+    try:
+        assert get_bar_source() is source
+        assert len(fetch_historical_mbb_data('MBB', period='1mo')) == 21
+        series = get_fred_series('MORTGAGE30US', observation_start='2024-06-01')
+        assert list(series.index.dayofweek.unique()) == [3]
+    finally:
+        set_data_source(None)
+    assert isinstance(get_bar_source(), YahooSource)
+
+
+def test_benchmark_runs_offline():
+    result = run_benchmark(scale=2, days=2, interval='5m', max_workers=4)
+    assert result['instruments'] == 14
+    assert result['bars'] == 14 * 2 * 78
+    assert set(result['seconds']) == {'fetch', 'validate', 'store', 'total'}
+
+
+if __name__ == "__main__":
+    test_bars_are_deterministic_and_follow_the_calendar()
+    test_current_session_is_partial()
+    test_override_routes_collectors_and_fred_through_simulator()
+    test_benchmark_runs_offline()
@@ -0,0 +1,138 @@
+import logging
+import os
+import tempfile
+import threading
+
+import pandas as pd
+
+import market_snapshot
+from data_collector import frame_to_bars, initialize_db
+from instrument_collector import write_bars
+from market_simulator import SimulatedMarketSource
+from market_snapshot import SnapshotStore
+from storage import session_scope
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+NOW = pd.Timestamp('2024-06-14 17:00', tz='US/Eastern')
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _database():
+    """A week of 5m MBB bars, with the last bar held back to commit later"""
+    db_path = os.path.join(tempfile.mkdtemp(), 'snapshot.db')
+    initialize_db(db_path)
+    source = SimulatedMarketSource(clock=lambda: NOW)
+    bars = frame_to_bars(source.fetch('MBB', interval='5m', start='2024-06-10')).sort_values('timestamp')
+    _store(db_path, bars.iloc[:-1])
+    return db_path, bars
+
+
+def _store(db_path, bars):
+    with session_scope(db_path) as session:
+        write_bars(session, 'MBB', bars)
+
+
+def test_snapshot_expires_after_max_age():
+    db_path, bars = _database()
+    clock = _Clock()
+    store = SnapshotStore(max_age=60, db_path=db_path, clock=clock)
+    assert store.get().timestamp == bars['timestamp'].iloc[-2]
+
+    # Bars committed by another process show up once the snapshot is older than max_age
+    _store(db_path, bars.iloc[-1:])
+    clock.now += 59
+    assert store.get().timestamp == bars['timestamp'].iloc[-2]
+    clock.now += 2
+    assert store.get().timestamp == bars['timestamp'].iloc[-1]
+
+    # max_age=0 keeps the snapshot until the next explicit refresh
+    store = SnapshotStore(max_age=0, db_path=db_path, clock=clock)
+    first = store.get()
+    clock.now += 10 ** 6
+    assert store.get() is first
+
+
+def test_failed_refresh_backs_off():
+    db_path, bars = _database()
+    clock = _Clock()
+    store = SnapshotStore(max_age=60, retry_seconds=30, db_path=db_path, clock=clock)
+    last = store.get()
+
+    calls = []
+
+    def failing(session):
+        calls.append(clock.now)
+        raise RuntimeError("database is locked")
+
+    original = market_snapshot.load_snapshot
+    market_snapshot.load_snapshot = failing
+    try:
+        clock.now += 61
+        # The last good snapshot is served, and reads don't query again until the retry delay
+        assert store.get() is last
+        assert store.get() is last
+        clock.now += 29
+        assert store.get() is last
+        assert len(calls) == 1
+        clock.now += 2
+        assert store.get() is last
+        assert len(calls) == 2
+    finally:
+        market_snapshot.load_snapshot = original
+
+    clock.now += 31
+    assert store.get() is not last
+    assert store.get().timestamp == last.timestamp
+
+
+def test_refresh_swaps_without_blocking_readers():
+    db_path, bars = _database()
+    clock = _Clock()
+    store = SnapshotStore(max_age=60, db_path=db_path, clock=clock)
+    old = store.get()
+    _store(db_path, bars.iloc[-1:])
+
+    loading, release = threading.Event(), threading.Event()
+    original = market_snapshot.load_snapshot
+
+    def slow(session):
+        loading.set()
+        release.wait(5)
+        return original(session)
+
+    market_snapshot.load_snapshot = slow
+    try:
+        clock.now += 61
+        refresher = threading.Thread(target=store.refresh)
+        refresher.start()
+        assert loading.wait(5)
+        # A reader during the rebuild gets the complete old snapshot straight away
+        assert store.get() is old
+        release.set()
+        refresher.join(5)
+    finally:
+        market_snapshot.load_snapshot = original
+
+    new = store.get()
+    assert new is not old
+    assert new.timestamp == bars['timestamp'].iloc[-1]
+    assert new.to_dict()['timestamp'] == new.timestamp.isoformat()
+
+
+if __name__ == "__main__":
+    test_snapshot_expires_after_max_age()
+    test_failed_refresh_backs_off()
+    test_refresh_swaps_without_blocking_readers()
@@ -0,0 +1,189 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+from pipeline import ArtifactStore, Pipeline, PipelineRun, Stage, content_hash
+from storage import session_scope
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+class Recorder:
+    """Counts stage executions and can be told to fail a stage once"""
+
+    def __init__(self):
+        self.calls = []
+        self.fail = set()
+        self._lock = threading.Lock()
+
+    def stage(self, name, func, delay=0.0):
+        def run(**kwargs):
+            with self._lock:
+                self.calls.append(name)
+            time.sleep(delay)
+            if name in self.fail:
+                self.fail.discard(name)
+                raise RuntimeError(f"{name} exploded")
+            return func(**kwargs)
+        return run
+
+
+def build(recorder, source, tmp):
+    return Pipeline('test', [
+        Stage('fetch', recorder.stage('fetch', lambda day: source(day)),
+              inputs=['day'], outputs=['raw'], cacheable=False),
+        Stage('validate', recorder.stage('validate', lambda raw: raw[raw['close'] > 0]),
+              inputs=['raw'], outputs=['clean']),
+        Stage('store', recorder.stage('store', lambda clean: len(clean), delay=0.2),
+              inputs=['clean'], outputs=['stored']),
+        Stage('roi', recorder.stage('roi', lambda clean: float(clean['close'].mean()), delay=0.2),
+              inputs=['clean'], outputs=['roi']),
+        Stage('warm', recorder.stage('warm', lambda stored, roi: f"{stored}:{roi:.2f}"),
+              inputs=['stored', 'roi'], outputs=['warmed'])
+    ], db_path=os.path.join(tmp, 'pipeline.db'), artifacts=ArtifactStore(os.path.join(tmp, 'artifacts')))
+
+
+def test_parallel_skip_and_timings():
+    tmp = tempfile.mkdtemp()
+    recorder = Recorder()
+    frame = pd.DataFrame({'close': [95.0, 96.0, -1.0]})
+    pipeline = build(recorder, lambda day: frame, tmp)
+
+    t0 = time.perf_counter()
+    values = pipeline.run(run_key='2024-06-04', day='2024-06-04')
+    elapsed = time.perf_counter() - t0
+
+    assert values['warmed'] == '2:95.50'
+    # store and roi only depend on validate, so they overlap
+    assert elapsed < 0.38
+
+    # Same fetched content: everything downstream of fetch is skipped
+    recorder.calls.clear()
+    pipeline.run(run_key='2024-06-04', day='2024-06-04')
+    assert recorder.calls == ['fetch']
+
+    # New content only reruns what it feeds
+    frame = pd.DataFrame({'close': [95.0, 96.0, 97.0]})
+    pipeline = build(recorder, lambda day: frame, tmp)
+    recorder.calls.clear()
+    assert pipeline.run(run_key='2024-06-05', day='2024-06-05')['warmed'] == '3:96.00'
+    assert sorted(recorder.calls) == ['fetch', 'roi', 'store', 'validate', 'warm']
+
+    with session_scope(pipeline.db_path) as session:
+        rows = session.query(PipelineRun).all()
+        assert len(rows) == 15
+        assert {row.status for row in rows} == {'success', 'skipped'}
+        assert all(row.duration_seconds >= 0 for row in rows)
+
+
+def test_failed_run_resumes_from_failed_stage():
+    tmp = tempfile.mkdtemp()
+    recorder = Recorder()
+    fetched = []
+
+    def source(day):
+        fetched.append(day)
+        return pd.DataFrame({'close': [95.0 + len(fetched)]})
+
+    pipeline = build(recorder, source, tmp)
+    recorder.fail.add('warm')
+    try:
+        pipeline.run(run_key='2024-06-04', day='2024-06-04')
+        assert False, "warm should have failed"
+    except RuntimeError:
+        pass
+
+    recorder.calls.clear()
+    values = pipeline.run(run_key='2024-06-04', day='2024-06-04')
+    # fetch isn't repeated (its recorded output is restored), only the failed stage runs
+    assert recorder.calls == ['warm']
+    assert len(fetched) == 1
+    assert values['warmed'] == '1:96.00'
+
+    with session_scope(pipeline.db_path) as session:
+        statuses = [row.status for row in session.query(PipelineRun).order_by(PipelineRun.id)]
+        assert statuses.count('failed') == 1
+        assert 'resumed' in statuses
+
+
+def test_content_hash_is_value_based():
+    a = pd.DataFrame({'x': [1.0, 2.0]})
+    b = pd.DataFrame({'x': [1.0, 2.0]}).copy()
+    assert content_hash({'t': a}) == content_hash({'t': b})
+    assert content_hash(a) != content_hash(pd.DataFrame({'x': [1.0, 2.5]}))
+    assert content_hash(a) != content_hash(pd.DataFrame({'y': [1.0, 2.0]}))
+
+
+def test_artifact_store_prunes_outputs_nobody_reuses():
+    store = ArtifactStore(tempfile.mkdtemp(), max_age=3600)
+    store.save('aa' * 32, {'x': 1})
+    store.save('bb' * 32, {'x': 2})
+    store.save('cc' * 32, {'x': 3})
+    old = time.time() - 7200
+    for fingerprint in ('aa' * 32, 'bb' * 32):
+        os.utime(store._path(fingerprint), (old, old))
+
+    # Loading an output keeps it alive
+    assert store.load('aa' * 32) == {'x': 1}
+    assert store.prune() == 1
+    assert store.load('bb' * 32) is None
+    assert store.load('aa' * 32) == {'x': 1}
+    assert store.load('cc' * 32) == {'x': 3}
+
+
+def test_daily_update_skips_only_on_unchanged_bars():
+    """Cacheable stages that read stored bars must see a change in them through their inputs"""
+    from daily_update import build_pipeline
+    stages = {stage.name: stage for stage in build_pipeline(os.path.join(tempfile.mkdtemp(), 'pipeline.db')).stages}
+    cacheable = sorted(name for name, stage in stages.items() if stage.cacheable)
+    assert cacheable == ['anomalies', 'correlations', 'retention', 'rollups', 'validate']
+    for name in ('anomalies', 'correlations', 'rollups'):
+        assert 'bar_state' in stages[name].inputs
+    # Stages with effects outside the pipeline's inputs always run
+    for name in ('fetch', 'store', 'materialize_roi', 'fred', 'price_cache', 'bar_state'):
+        assert not stages[name].cacheable
+
+
+def test_bar_watermark_tracks_stored_bars():
+    from daily_update import bar_watermark
+    from data_collector import frame_to_bars, initialize_db
+    from instrument_collector import write_bars
+    from market_simulator import SimulatedMarketSource
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'bars.db')
+    initialize_db(db_path)
+    source = SimulatedMarketSource(clock=lambda: pd.Timestamp('2024-06-14 17:00', tz='US/Eastern'))
+    bars = frame_to_bars(source.fetch('MBB', interval='1d', start='2024-05-01'))
+    with session_scope(db_path) as session:
+        write_bars(session, 'MBB', bars)
+    stored = bar_watermark(db_path)
+
+    # Rewriting the same bars keeps it; a revised close changes it
+    with session_scope(db_path) as session:
+        write_bars(session, 'MBB', bars)
+    assert content_hash(bar_watermark(db_path)) == content_hash(stored)
+    revised = bars.copy()
+    revised.loc[revised.index[3], 'close'] += 0.25
+    with session_scope(db_path) as session:
+        write_bars(session, 'MBB', revised)
+    changed = bar_watermark(db_path)
+    assert changed['mbb_coupons'][0] == stored['mbb_coupons'][0]
+    assert content_hash(changed) != content_hash(stored)
+
+
+if __name__ == "__main__":
+    test_parallel_skip_and_timings()
+    test_failed_run_resumes_from_failed_stage()
+    test_content_hash_is_value_based()
+    test_artifact_store_prunes_outputs_nobody_reuses()
+    test_daily_update_skips_only_on_unchanged_bars()
+    test_bar_watermark_tracks_stored_bars()
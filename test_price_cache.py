@@ -0,0 +1,214 @@
+import logging
+import os
+import tempfile
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import tiered_storage
+from data_collector import frame_to_bars, initialize_db, QuarantinedBar
+from data_retention import enforce_data_retention
+from instrument_collector import write_bars
+from market_simulator import SimulatedMarketSource
+from instrument_collector import collect_instruments
+from price_cache import PriceHistoryCache, cache_stored_bars, get_price_cache, read_cached_bars
+from rate_limiter import RateLimiter
+from storage import session_scope
+from tiered_storage import read_bars
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+NOW = pd.Timestamp('2024-06-14 17:00', tz='US/Eastern')
+
+
+def _database():
+    """60 sessions of 5m MBB bars, with one more week held back to ingest later"""
+    db_path = os.path.join(tempfile.mkdtemp(), 'cache.db')
+    initialize_db(db_path)
+    source = SimulatedMarketSource(clock=lambda: NOW)
+    bars = frame_to_bars(source.fetch('MBB', interval='5m', start='2024-03-01')).sort_values('timestamp')
+    bars = bars.reset_index(drop=True)
+    split = bars['timestamp'].searchsorted(pd.Timestamp('2024-06-10'))
+    with session_scope(db_path) as session:
+        write_bars(session, 'MBB', bars.iloc[:split])
+    return db_path, bars, split
+
+
+def _store(db_path, bars):
+    with session_scope(db_path) as session:
+        write_bars(session, 'MBB', bars)
+
+
+def test_appends_in_place_and_slices_by_binary_search():
+    db_path, bars, split = _database()
+    cache = PriceHistoryCache('MBB', db_path)
+    # Built from storage on first update
+    assert cache.update(bars.iloc[:split]) == split
+    assert cache._read_meta() == {'ticker': 'MBB', 'rows': split, 'generation': 0}
+    columns = cache.arrays()
+    assert isinstance(columns['close'], np.memmap)
+    assert (columns['close'] == bars['close'].iloc[:split].to_numpy()).all()
+
+    # A reader in another process maps the same files and sees new rows once published
+    reader = PriceHistoryCache('MBB', db_path)
+    assert len(reader.arrays()['timestamp']) == split
+
+    # New bars after the last cached one are appended without rewriting anything
+    for day, frame in bars.iloc[split:].groupby(bars['timestamp'].iloc[split:].dt.normalize()):
+        _store(db_path, frame)
+        cache.update(frame)
+    assert cache._read_meta()['generation'] == 0
+    assert len(reader.arrays()['timestamp']) == len(bars)
+    assert os.path.getsize(cache._column_path('close', 0)) == len(bars) * 8
+
+    start, end = pd.Timestamp('2024-05-01 10:00'), pd.Timestamp('2024-05-03 15:30')
+    window = reader.read(start, end, columns=['timestamp', 'close'])
+    expected = bars[(bars['timestamp'] >= start) & (bars['timestamp'] < end)]
+    assert (window['timestamp'].view('datetime64[ns]') == expected['timestamp'].to_numpy()).all()
+    assert (window['close'] == expected['close'].to_numpy()).all()
+    # Slices are views of the mapping, not copies
+    assert np.shares_memory(window['close'], reader.arrays()['close'])
+
+
+def test_rewritten_bars_publish_a_new_generation():
+    db_path, bars, split = _database()
+    cache = PriceHistoryCache('MBB', db_path)
+    cache.rebuild()
+    old_close = cache.arrays()['close']
+
+    # A corrected bar and a daily bar stamped at midnight, before that day's intraday bars
+    corrected = bars.iloc[[split - 5]].assign(close=bars['close'].iloc[split - 5] + 1)
+    daily = bars.iloc[[split - 1]].assign(timestamp=bars['timestamp'].iloc[split - 1].normalize())
+    _store(db_path, pd.concat([corrected, daily]))
+    cache.update(pd.concat([corrected, daily]))
+
+    assert cache._read_meta() == {'ticker': 'MBB', 'rows': split + 1, 'generation': 1}
+    assert not os.path.exists(cache._column_path('close', 0))
+    # The old mapping stays readable for whoever still holds it
+    assert (old_close == bars['close'].iloc[:split].to_numpy()).all()
+
+    stored = read_bars('MBB', db_path=db_path, include_quarantined=True)
+    cached = cache.arrays()
+    assert (cached['timestamp'].view('datetime64[ns]') == stored['timestamp'].to_numpy()).all()
+    assert (cached['close'] == stored['close'].to_numpy()).all()
+
+
+def test_reader_remaps_when_its_generation_is_replaced():
+    db_path, bars, split = _database()
+    writer = PriceHistoryCache('MBB', db_path)
+    writer.rebuild()
+    stale = writer._read_meta()
+    # Publishes generation 1 and deletes generation 0's files
+    writer.rebuild()
+
+    # A reader that read meta just before the writer published
+    reader = PriceHistoryCache('MBB', db_path)
+    reads = [stale]
+    reader._read_meta = lambda: reads.pop() if reads else PriceHistoryCache._read_meta(reader)
+    assert len(reader.arrays()['close']) == split
+    assert reader._mapped_version == reader._meta_version()
+
+
+def test_cached_reads_match_storage():
+    db_path, bars, split = _database()
+    held = bars['timestamp'].iloc[100]
+    with session_scope(db_path) as session:
+        session.add(QuarantinedBar(ticker='MBB', timestamp=held.to_pydatetime(), reasons='return', score=9.0,
+                                   detected_at=datetime.now()))
+
+    start = pd.Timestamp('2024-03-04')
+    # Falls back to storage until the cache is built
+    uncached = read_cached_bars('MBB', start=start, db_path=db_path)
+    PriceHistoryCache('MBB', db_path).rebuild()
+    cached = read_cached_bars('MBB', start=start, db_path=db_path)
+
+    pd.testing.assert_frame_equal(cached.to_frame(), uncached.to_frame())
+    assert np.datetime64(held, 'ns') not in cached.timestamp
+    everything = read_cached_bars('MBB', start=start, include_quarantined=True, db_path=db_path)
+    assert np.datetime64(held, 'ns') in everything.timestamp
+    # Without quarantined bars in the range the series is a view of the mapping
+    assert np.shares_memory(everything.close, get_price_cache('MBB', db_path).arrays()['close'])
+
+
+class _WeekFetcher:
+    """Fetcher serving the held-back week of bars (as the upstream frame frame_to_bars expects)"""
+
+    def __init__(self, hist_data):
+        self.hist_data = hist_data
+        self.host = 'fake'
+
+    def fetch(self, ticker, **kwargs):
+        return self.hist_data
+
+
+def test_every_writer_reaches_the_cache():
+    db_path, bars, split = _database()
+    cache = get_price_cache('MBB', db_path)
+    cache.rebuild()
+
+    # The instrument collector caches what it stores
+    source = SimulatedMarketSource(clock=lambda: NOW)
+    week = source.fetch('MBB', interval='5m', start='2024-06-10')
+    collect_instruments(['MBB'], fetcher=_WeekFetcher(week), rate_limiter=RateLimiter(), db_path=db_path)
+    assert len(cache.arrays()['timestamp']) == len(bars)
+    assert cache.reconcile() is False
+
+    # Bars a writer stored without caching are found by reconciliation
+    extra = bars.iloc[[-1]].assign(timestamp=bars['timestamp'].iloc[-1] + pd.Timedelta(minutes=5))
+    _store(db_path, extra)
+    assert cache.reconcile() is True
+    assert len(cache.arrays()['timestamp']) == len(bars) + 1
+    assert cache.reconcile() is False
+
+    # A failed update drops the cache, so readers fall back to storage and the next update rebuilds it
+    assert cache_stored_bars('MBB', extra.drop(columns=['close']), db_path=db_path) is None
+    assert not cache.built
+    assert len(read_cached_bars('MBB', db_path=db_path)) == len(bars) + 1
+    assert cache_stored_bars('MBB', extra, db_path=db_path) == len(bars) + 1
+    assert cache.built and cache.reconcile() is False
+
+
+def test_archived_quarantine_still_filters_cached_bars():
+    directory = tempfile.mkdtemp()
+    db_path, archive_dir = os.path.join(directory, 'cache.db'), os.path.join(directory, 'archive')
+    initialize_db(db_path)
+    now = pd.Timestamp.now(tz='US/Eastern')
+    start = (now - pd.DateOffset(months=14)).strftime('%Y-%m-%d')
+    bars = frame_to_bars(SimulatedMarketSource(clock=lambda: now).fetch('MBB', interval='30m', start=start))
+    bars = bars.sort_values('timestamp').reset_index(drop=True)
+    held = bars['timestamp'].iloc[10]
+    with session_scope(db_path) as session:
+        write_bars(session, 'MBB', bars)
+        session.add(QuarantinedBar(ticker='MBB', timestamp=held.to_pydatetime(), reasons='return', score=9.0,
+                                   detected_at=datetime.now()))
+    cache = get_price_cache('MBB', db_path)
+    cache.rebuild()
+
+    # Retention moves the old bars and their quarantine rows to the archive; the cache keeps the bars
+    original = tiered_storage.RETENTION_ARCHIVE_DIR
+    tiered_storage.RETENTION_ARCHIVE_DIR = archive_dir
+    try:
+        assert enforce_data_retention(db_path, retention_years=1, archive_dir=archive_dir, pause_seconds=0) > 0
+        with session_scope(db_path) as session:
+            assert session.query(QuarantinedBar).count() == 0
+        series = read_cached_bars('MBB', db_path=db_path)
+        assert len(series) == len(bars) - 1
+        assert not np.isin(held.to_datetime64(), series.timestamp)
+        assert len(read_cached_bars('MBB', include_quarantined=True, db_path=db_path)) == len(bars)
+    finally:
+        tiered_storage.RETENTION_ARCHIVE_DIR = original
+
+
+if __name__ == "__main__":
+    test_appends_in_place_and_slices_by_binary_search()
+    test_rewritten_bars_publish_a_new_generation()
+    test_reader_remaps_when_its_generation_is_replaced()
+    test_cached_reads_match_storage()
+    test_every_writer_reaches_the_cache()
+    test_archived_quarantine_still_filters_cached_bars()
@@ -0,0 +1,114 @@
+import cProfile
+import logging
+import os
+import tempfile
+import threading
+
+from flask import Flask, jsonify
+
+from profiling import init_profiling, ProfileStore, StackSampler
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+TOKEN = 's3cret'
+ADMIN = {'X-Admin-Token': TOKEN}
+
+
+def _app(**kwargs):
+    app = Flask(__name__)
+
+    @app.route('/work')
+    def work():
+        return jsonify({'total': sum(i * i for i in range(20000))})
+
+    # Independent of PROFILING_ADMIN_TOKEN
+    kwargs.setdefault('admin_token', TOKEN)
+    store = init_profiling(app, **kwargs)
+    return app, store
+
+
+def _profile(store, endpoint):
+    profiler = cProfile.Profile()
+    profiler.enable()
+    sum(range(1000))
+    profiler.disable()
+    return store.save(profiler, StackSampler(threading.get_ident()), {'endpoint': endpoint})
+
+
+def test_store_keeps_only_the_newest_profiles():
+    directory = tempfile.mkdtemp()
+    store = ProfileStore(directory, max_profiles=3)
+    ids = [_profile(store, f"endpoint{i}") for i in range(5)]
+
+    assert [profile['id'] for profile in store.list_profiles()] == ids[:1:-1]
+    assert len(os.listdir(directory)) == 3 * 3
+    assert store.path_for(ids[0], 'pstats') is None
+    assert store.path_for(ids[-1], 'pstats') is not None
+    # Only known artifacts, and no path tricks
+    assert store.path_for(ids[-1], 'json') is None
+    assert store.path_for('../' + ids[-1], 'pstats') is None
+
+
+def test_profiling_is_opt_in():
+    # Disabled by default: no hooks, no admin endpoints
+    app, store = _app(store=ProfileStore(tempfile.mkdtemp()))
+    assert store is None
+    client = app.test_client()
+    assert 'X-Profile-Id' not in client.get('/work?_profile=1', headers=ADMIN).headers
+    assert client.get('/admin/profiles', headers=ADMIN).status_code == 404
+
+    # Enabled, but only requests that ask for it are profiled
+    app, store = _app(store=ProfileStore(tempfile.mkdtemp()), enabled=True)
+    client = app.test_client()
+    assert 'X-Profile-Id' not in client.get('/work', headers=ADMIN).headers
+    assert store.list_profiles() == []
+    assert 'X-Profile-Id' in client.get('/work', headers=dict(ADMIN, **{'X-Profile': '1'})).headers
+    assert len(store.list_profiles()) == 1
+
+
+def test_listing_and_summary_endpoints():
+    app, store = _app(store=ProfileStore(tempfile.mkdtemp()), enabled=True)
+    client = app.test_client()
+    profile_id = client.get('/work?_profile=true', headers=ADMIN).headers['X-Profile-Id']
+
+    profiles = client.get('/admin/profiles', headers=ADMIN).get_json()['profiles']
+    assert [profile['id'] for profile in profiles] == [profile_id]
+    assert profiles[0]['endpoint'] == 'work'
+    assert profiles[0]['status'] == 200
+
+    summary = client.get(f'/admin/profiles/{profile_id}/summary', headers=ADMIN).get_json()
+    assert summary['id'] == profile_id
+    assert any('test_profiling.py' in row['function'] for row in summary['functions'])
+    assert client.get(f'/admin/profiles/{profile_id}/pstats', headers=ADMIN).status_code == 200
+    assert client.get(f'/admin/profiles/{profile_id}/collapsed', headers=ADMIN).status_code == 200
+    assert client.get('/admin/profiles/missing/summary', headers=ADMIN).status_code == 404
+
+
+def test_profiles_are_admin_only():
+    # Without a token profiling stays off, wherever the request comes from
+    app, store = _app(store=ProfileStore(tempfile.mkdtemp()), enabled=True, admin_token='')
+    assert store is None
+    client = app.test_client()
+    assert client.get('/admin/profiles').status_code == 404
+    assert 'X-Profile-Id' not in client.get('/work?_profile=1').headers
+
+    # With one it is required from everywhere, localhost included (a reverse proxy looks local)
+    app, store = _app(store=ProfileStore(tempfile.mkdtemp()), enabled=True)
+    client = app.test_client()
+    assert client.get('/admin/profiles').status_code == 403
+    assert client.get('/admin/profiles', headers={'X-Admin-Token': 'wrong'}).status_code == 403
+    assert 'X-Profile-Id' not in client.get('/work?_profile=1').headers
+    profile_id = client.get('/work?_profile=1', headers=ADMIN).headers['X-Profile-Id']
+    assert client.get(f'/admin/profiles/{profile_id}/summary', headers=ADMIN).status_code == 200
+
+
+if __name__ == "__main__":
+    test_store_keeps_only_the_newest_profiles()
+    test_profiling_is_opt_in()
+    test_listing_and_summary_endpoints()
+    test_profiles_are_admin_only()
@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from rate_limiter import RateLimiter, TokenBucket, read_published_metrics
+from user_agent_rotation import UserAgentRotator
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def test_burst_then_steady_rate():
+    bucket = TokenBucket(rate=20, capacity=5)
+    t0 = time.perf_counter()
+    waits = [bucket.acquire() for _ in range(10)]
+    elapsed = time.perf_counter() - t0
+
+    # The first five go out immediately, the rest are paced at 20/s
+    assert waits[:5] == [0.0] * 5
+    assert all(wait > 0 for wait in waits[5:])
+    assert 0.2 <= elapsed < 0.5
+
+
+def test_threads_share_one_bucket_per_host():
+    limiter = RateLimiter(rate=50, burst=1)
+    stamps = []
+    lock = threading.Lock()
+
+    def worker():
+        for _ in range(5):
+            limiter.acquire('a.example')
+            with lock:
+                stamps.append(time.perf_counter())
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    t0 = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # 20 requests at 50/s: the 19 after the first need ~0.38s
+    assert max(stamps) - t0 >= 0.35
+    stats = limiter.metrics()['a.example']
+    assert stats['requests'] == 20
+    assert stats['throttled'] == 19
+    assert stats['wait_seconds'] > 0
+
+    # Another host has its own budget
+    assert limiter.acquire('b.example') == 0.0
+
+
+def test_async_acquire_does_not_block_event_loop():
+    limiter = RateLimiter(rate=20, burst=1)
+
+    async def ticker(ticks):
+        # Keeps running while acquirers are waiting
+        for _ in range(10):
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.01)
+
+    async def main():
+        ticks = []
+        waits = await asyncio.gather(
+            ticker(ticks), *[limiter.acquire_async('a.example') for _ in range(4)]
+        )
+        return ticks, waits[1:]
+
+    ticks, waits = asyncio.run(main())
+    assert len(ticks) == 10
+    assert sorted(waits)[0] == 0.0
+    assert max(waits) >= 0.1
+
+
+def test_unlimited_and_user_agent_policy():
+    limiter = RateLimiter(user_agent_policy=UserAgentRotator())
+    assert all(limiter.acquire('a.example') == 0.0 for _ in range(100))
+    assert limiter.metrics()['a.example']['requests'] == 100
+    agents = {limiter.headers()['User-Agent'] for _ in range(10)}
+    assert len(agents) == 10
+    assert RateLimiter().headers() == {}
+
+    # The collectors' shared limiter rotates user agents
+    from instrument_collector import default_rate_limiter
+    assert 'User-Agent' in default_rate_limiter.headers()
+
+
+def test_metrics_are_published_for_other_processes():
+    directory = tempfile.mkdtemp()
+    limiter = RateLimiter(rate=50, burst=1, metrics_path=os.path.join(directory, 'collect_data.json'),
+                          metrics_interval=3600)
+    assert read_published_metrics(directory) == {}
+
+    # The first request publishes; later ones wait for the interval (or publish_metrics at exit)
+    limiter.acquire('a.example')
+    limiter.acquire('a.example')
+    published = read_published_metrics(directory)
+    assert published['collect_data']['hosts']['a.example']['requests'] == 1
+    assert limiter.publish_metrics()
+    published = read_published_metrics(directory)['collect_data']
+    assert published['pid'] == os.getpid()
+    assert published['hosts'] == limiter.metrics()
+    assert published['hosts']['a.example']['throttled'] == 1
+
+
+def test_user_agent_rotator_wait_if_needed():
+    rotator = UserAgentRotator()
+    rotator.min_delay_seconds = 0.1
+    t0 = time.perf_counter()
+    for _ in range(3):
+        rotator.wait_if_needed()
+    assert time.perf_counter() - t0 >= 0.19
+
+
+if __name__ == "__main__":
+    test_burst_then_steady_rate()
+    test_threads_share_one_bucket_per_host()
+    test_async_acquire_does_not_block_event_loop()
+    test_unlimited_and_user_agent_policy()
+    test_metrics_are_published_for_other_processes()
+    test_user_agent_rotator_wait_if_needed()
@@ -0,0 +1,137 @@
+import json
+import logging
+import os
+import tempfile
+import time
+
+import pandas as pd
+import pytest
+
+from response_cache import ResponseCache, CacheMissError
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+class CountingFetch:
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.value
+
+
+def test_fresh_entries_are_served_from_disk():
+    directory = tempfile.mkdtemp()
+    frame = pd.DataFrame({'Close': [95.0, 95.5]})
+    fetch = CountingFetch(frame)
+
+    first = ResponseCache(directory, mode='default').fetch('test.series', {'id': 'MBB'}, fetch, ttl=60)
+    # A new instance (e.g. the next run) reads the same recording
+    second = ResponseCache(directory, mode='default').fetch('test.series', {'id': 'MBB'}, fetch, ttl=60)
+
+    assert fetch.calls == 1
+    pd.testing.assert_frame_equal(first, second)
+
+
+def test_stale_entry_revalidates_without_refetch():
+    cache = ResponseCache(tempfile.mkdtemp(), mode='default')
+    fetch = CountingFetch(pd.Series([1.0, 2.0]))
+
+    cache.fetch('fred.series', {'series_id': 'X'}, fetch, ttl=0, revalidate=lambda: '2024-05-01')
+    cache.fetch('fred.series', {'series_id': 'X'}, fetch, ttl=0, revalidate=lambda: '2024-05-01')
+    assert fetch.calls == 1
+    assert cache.stats['revalidated'] == 1
+
+    # Validator changed upstream: refetch
+    cache.fetch('fred.series', {'series_id': 'X'}, fetch, ttl=0, revalidate=lambda: '2024-05-08')
+    assert fetch.calls == 2
+
+
+def test_identical_responses_share_a_blob():
+    cache = ResponseCache(tempfile.mkdtemp(), mode='default')
+    cache.fetch('test', {'a': 1}, lambda: [1, 2, 3])
+    cache.fetch('test', {'a': 2}, lambda: [1, 2, 3])
+
+    import os
+    blobs = [name for _, _, files in os.walk(os.path.join(cache.directory, 'objects')) for name in files]
+    assert len(blobs) == 1
+
+
+def test_replay_mode_is_offline():
+    directory = tempfile.mkdtemp()
+    ResponseCache(directory, mode='record').fetch('test', {'a': 1}, lambda: 'recorded')
+
+    replay = ResponseCache(directory, mode='replay')
+
+    def network():
+        raise AssertionError("replay mode must not call upstream")
+
+    assert replay.fetch('test', {'a': 1}, network, ttl=0) == 'recorded'
+    with pytest.raises(CacheMissError):
+        replay.fetch('test', {'a': 2}, network)
+
+
+def test_failed_fetch_serves_stale_entry():
+    cache = ResponseCache(tempfile.mkdtemp(), mode='default')
+    cache.fetch('test', {'a': 1}, lambda: 'old', ttl=0.01)
+    time.sleep(0.02)
+
+    def failing():
+        raise ConnectionError("upstream down")
+
+    assert cache.fetch('test', {'a': 1}, failing, ttl=0.01) == 'old'
+
+
+def _files(directory):
+    return sorted(name for _, _, files in os.walk(directory) for name in files)
+
+
+def test_uncacheable_responses_are_not_recorded():
+    cache = ResponseCache(tempfile.mkdtemp(), mode='default')
+    fetch = CountingFetch([1, 2, 3])
+    for _ in range(3):
+        assert cache.fetch('test', {'a': 1}, fetch, ttl=0) == [1, 2, 3]
+    assert fetch.calls == 3
+    assert _files(cache.directory) == []
+
+    # Record mode still captures them for replay
+    ResponseCache(cache.directory, mode='record').fetch('test', {'a': 1}, fetch, ttl=0)
+    assert len(_files(cache.directory)) == 2
+
+
+def test_prune_drops_expired_entries_and_orphaned_blobs():
+    cache = ResponseCache(tempfile.mkdtemp(), mode='default')
+    cache.fetch('test', {'a': 1}, lambda: 'kept', ttl=60)
+    cache.fetch('test', {'a': 2}, lambda: 'expired', ttl=60)
+    cache.fetch('test', {'a': 3}, lambda: 'forever', ttl=None)
+    expired = cache._read_entry(cache.request_key('test', {'a': 2}))
+    expired['fetched_at'] -= 60 + 3600
+    cache._atomic_write(cache._index_path(cache.request_key('test', {'a': 2})), json.dumps(expired).encode())
+    # A blob whose index entry was lost; blobs this old can't belong to a store in progress
+    cache._atomic_write(cache._blob_path('ff' * 32), b'orphan')
+    for root, _, files in os.walk(os.path.join(cache.directory, 'objects')):
+        for name in files:
+            os.utime(os.path.join(root, name), (time.time() - 3600, time.time() - 3600))
+
+    assert cache.prune(stale_seconds=1800) == {'entries': 1, 'blobs': 2}
+    assert len(_files(cache.directory)) == 4
+    assert cache.fetch('test', {'a': 1}, lambda: 'refetched', ttl=60) == 'kept'
+    assert cache.fetch('test', {'a': 3}, lambda: 'refetched', ttl=None) == 'forever'
+    assert cache.prune(stale_seconds=1800) == {'entries': 0, 'blobs': 0}
+
+
+if __name__ == "__main__":
+    test_fresh_entries_are_served_from_disk()
+    test_stale_entry_revalidates_without_refetch()
+    test_identical_responses_share_a_blob()
+    test_replay_mode_is_offline()
+    test_failed_fetch_serves_stale_entry()
+    test_uncacheable_responses_are_not_recorded()
+    test_prune_drops_expired_entries_and_orphaned_blobs()
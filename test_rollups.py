@@ -0,0 +1,137 @@
+import logging
+import os
+import tempfile
+from datetime import datetime
+
+import pandas as pd
+
+from calculations import calculate_implied_rate
+from data_collector import frame_to_bars, initialize_db, BarRollup, QuarantinedBar
+from instrument_collector import collect_instruments, write_bars
+from market_simulator import SimulatedMarketSource
+from rate_limiter import RateLimiter
+from rollups import aggregate_bars, choose_resolution, read_rollups, update_rollups
+from storage import session_scope
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+NOW = pd.Timestamp('2024-06-14 17:00', tz='US/Eastern')
+
+
+def _bars(start, end=None, interval='5m'):
+    source = SimulatedMarketSource(clock=lambda: NOW)
+    return frame_to_bars(source.fetch('MBB', interval=interval, start=start, end=end)).sort_values('timestamp')
+
+
+def test_aggregates_buckets():
+    bars = _bars('2024-06-03', '2024-06-08')
+    daily_bars = _bars('2024-05-01', '2024-06-08', interval='1d')
+    mixed = pd.concat([bars, daily_bars]).sort_values('timestamp').reset_index(drop=True)
+
+    hourly = aggregate_bars(mixed, '1h')
+    assert hourly['timestamp'].dt.normalize().nunique() == 5
+    first = bars[bars['timestamp'] < pd.Timestamp('2024-06-03 10:00')]
+    assert hourly['open'].iloc[0] == first['open'].iloc[0]
+    assert hourly['close'].iloc[0] == first['close'].iloc[-1]
+    assert hourly['high'].iloc[0] == first['high'].max()
+    assert hourly['volume'].iloc[0] == first['volume'].sum()
+    assert hourly['bars'].sum() == len(bars)
+
+    # Days with intraday bars use them; older days fall back to their daily bar
+    daily = aggregate_bars(mixed, '1d').set_index('timestamp')
+    assert daily.loc['2024-06-03', 'bars'] == len(bars[bars['timestamp'].dt.day == 3])
+    assert daily.loc['2024-05-01', 'bars'] == 1
+    assert daily.loc['2024-05-01', 'close'] == daily_bars['close'].iloc[0]
+    assert list(daily['implied_rate']) == [calculate_implied_rate(close) for close in daily['close']]
+
+
+def test_incremental_update_matches_full_rebuild():
+    directory = tempfile.mkdtemp()
+    incremental_db, full_db = os.path.join(directory, 'incremental.db'), os.path.join(directory, 'full.db')
+    bars = _bars('2024-04-01')
+    for db_path in (incremental_db, full_db):
+        initialize_db(db_path)
+
+    # Ingest a day at a time, rolling up only what each ingest touched
+    for day, frame in bars.groupby(bars['timestamp'].dt.normalize()):
+        with session_scope(incremental_db) as session:
+            write_bars(session, 'MBB', frame)
+            update_rollups('MBB', since=frame['timestamp'].min(), until=frame['timestamp'].max(), session=session)
+    with session_scope(full_db) as session:
+        write_bars(session, 'MBB', bars)
+    update_rollups('MBB', db_path=full_db)
+
+    for resolution in ('1h', '1d', '1w'):
+        incremental = read_rollups('MBB', resolution, db_path=incremental_db)
+        full = read_rollups('MBB', resolution, db_path=full_db)
+        pd.testing.assert_frame_equal(incremental, full)
+    weekly = read_rollups('MBB', '1w', db_path=full_db)
+    assert (weekly['timestamp'].dt.weekday == 0).all()
+    assert weekly['bars'].sum() == len(bars)
+
+    # A quarantined bar drops out of its buckets once they are recomputed
+    held = bars.iloc[-3]
+    with session_scope(full_db) as session:
+        session.add(QuarantinedBar(ticker='MBB', timestamp=held['timestamp'].to_pydatetime(), reasons='return',
+                                   score=9.0, detected_at=datetime.now()))
+    written = update_rollups('MBB', since=held['timestamp'], db_path=full_db)
+    # Only the last day's hours, that day and its week were rewritten
+    assert written == len(read_rollups('MBB', '1h', held['timestamp'].normalize(), db_path=full_db)) + 2
+    with session_scope(full_db) as session:
+        assert session.query(BarRollup).filter(BarRollup.resolution == '1w').count() == len(weekly)
+    assert read_rollups('MBB', '1w', db_path=full_db)['bars'].sum() == len(bars) - 1
+
+
+class _FrameFetcher:
+    """Fetcher serving one upstream frame whatever it is asked for"""
+
+    host = 'fake'
+
+    def __init__(self, hist_data):
+        self.hist_data = hist_data
+
+    def fetch(self, ticker, **kwargs):
+        return self.hist_data
+
+
+def test_collected_bars_reach_the_rollups():
+    db_path = os.path.join(tempfile.mkdtemp(), 'collect.db')
+    initialize_db(db_path)
+    with session_scope(db_path) as session:
+        write_bars(session, 'MBB', _bars('2024-05-27', '2024-06-08'))
+    update_rollups('MBB', db_path=db_path)
+
+    # The collector folds the week it stored into the existing rollups
+    week = SimulatedMarketSource(clock=lambda: NOW).fetch('MBB', interval='5m', start='2024-06-10')
+    collect_instruments(['MBB'], fetcher=_FrameFetcher(week), rate_limiter=RateLimiter(), db_path=db_path)
+    collected = {resolution: read_rollups('MBB', resolution, db_path=db_path) for resolution in ('1h', '1d', '1w')}
+    assert collected['1d']['timestamp'].iloc[-1] == pd.Timestamp('2024-06-14')
+
+    update_rollups('MBB', db_path=db_path)
+    for resolution, rollup in collected.items():
+        pd.testing.assert_frame_equal(rollup, read_rollups('MBB', resolution, db_path=db_path))
+
+
+def test_chooses_coarsest_sufficient_rollup():
+    end = pd.Timestamp('2024-06-14 16:00')
+    assert choose_resolution(end - pd.Timedelta(days=1), end) is None
+    assert choose_resolution(end - pd.Timedelta(weeks=1), end) is None
+    assert choose_resolution(end - pd.Timedelta(days=90), end) == '1h'
+    assert choose_resolution(end - pd.Timedelta(days=365), end) == '1d'
+    assert choose_resolution(end - pd.Timedelta(days=365 * 5), end) == '1w'
+    assert choose_resolution(end - pd.Timedelta(days=365), end, resolution='4h') == '1h'
+    assert choose_resolution(end - pd.Timedelta(days=30), end, resolution='1d') == '1d'
+    assert choose_resolution(end - pd.Timedelta(days=365), end, max_resolution='1h') == '1h'
+    assert choose_resolution(end - pd.Timedelta(weeks=1), end, max_resolution='1h') is None
+
+
+if __name__ == "__main__":
+    test_aggregates_buckets()
+    test_incremental_update_matches_full_rebuild()
+    test_collected_bars_reach_the_rollups()
+    test_chooses_coarsest_sufficient_rollup()
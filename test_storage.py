@@ -0,0 +1,137 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from data_collector import initialize_db, MBBCoupon
+import storage
+from storage import get_engine, session_scope
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def _make_bar(timestamp):
+    return MBBCoupon(timestamp=timestamp, open=95.0, high=95.5, low=94.5, close=95.2, volume=1000)
+
+
+def test_pragmas_applied():
+    """Every pooled connection should run in WAL mode with the tuned pragmas"""
+    db_path = os.path.join(tempfile.mkdtemp(), 'pragmas.db')
+    engine = initialize_db(db_path)
+
+    with engine.connect() as conn:
+        journal_mode = conn.execute(text("PRAGMA journal_mode")).scalar()
+        synchronous = conn.execute(text("PRAGMA synchronous")).scalar()
+        mmap_size = conn.execute(text("PRAGMA mmap_size")).scalar()
+
+    logger.info(f"journal_mode={journal_mode} synchronous={synchronous} mmap_size={mmap_size}")
+    assert journal_mode == 'wal'
+    assert synchronous == 1  # NORMAL
+    assert get_engine(db_path) is engine
+
+
+def test_session_scope_rolls_back_on_error():
+    """A failing unit of work must not leave partial writes or open sessions behind"""
+    db_path = os.path.join(tempfile.mkdtemp(), 'rollback.db')
+    initialize_db(db_path)
+
+    try:
+        with session_scope(db_path) as session:
+            session.add(_make_bar(datetime(2024, 5, 1, 9, 30)))
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+
+    with session_scope(db_path) as session:
+        assert session.query(MBBCoupon).count() == 0
+
+
+def test_readers_responsive_during_ingest():
+    """Load test: readers keep answering quickly while a writer ingests in batches"""
+    db_path = os.path.join(tempfile.mkdtemp(), 'load.db')
+    initialize_db(db_path)
+
+    start = datetime(2024, 1, 2, 9, 30)
+    writer_done = threading.Event()
+    read_latencies = []
+    errors = []
+
+    def writer():
+        try:
+            for batch in range(40):
+                with session_scope(db_path) as session:
+                    session.add_all([
+                        _make_bar(start + timedelta(minutes=batch * 500 + i)) for i in range(500)
+                    ])
+                    # Hold the write transaction open briefly, as a real ingest would
+                    session.flush()
+                    time.sleep(0.01)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            writer_done.set()
+
+    def reader():
+        try:
+            while not writer_done.is_set():
+                t0 = time.perf_counter()
+                with session_scope(db_path) as session:
+                    session.query(MBBCoupon).order_by(MBBCoupon.timestamp.desc()).first()
+                    session.query(MBBCoupon).count()
+                read_latencies.append(time.perf_counter() - t0)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors, errors
+    assert read_latencies
+
+    read_latencies.sort()
+    p99 = read_latencies[int(len(read_latencies) * 0.99) - 1]
+    logger.info(f"{len(read_latencies)} reads during ingest, p99 latency {p99 * 1000:.1f} ms, "
+                f"max {read_latencies[-1] * 1000:.1f} ms")
+
+    # Readers must never wait on the writer's lock (which would be tens of ms per batch)
+    assert p99 < 0.25
+
+    with session_scope(db_path) as session:
+        assert session.query(MBBCoupon).count() == 40 * 500
+
+
+def test_one_engine_per_database():
+    directory = tempfile.mkdtemp()
+    paths = {'mbb': os.path.join(directory, 'mbb.db'), 'mbs': os.path.join(directory, 'mbs.db')}
+    original = dict(storage.DATABASE_PATHS)
+    storage.DATABASE_PATHS.update(paths)
+    try:
+        # Tables resolve to their declared database; undeclared ones live with the bars
+        assert storage.database_path('fred_data') == storage.database_path('daily_roi') == paths['mbs']
+        assert storage.database_path('mbb_coupons') == storage.database_path('bar_rollups') == paths['mbb']
+
+        # Every caller shares one engine (and pool) per database
+        assert storage.engine_for('fred_data') is storage.engine_for('daily_roi') is get_engine(paths['mbs'])
+        assert storage.engine_for('market_bars') is get_engine(paths['mbb'])
+        assert storage.engine_for('fred_data') is not storage.engine_for('market_bars')
+    finally:
+        storage.DATABASE_PATHS.update(original)
+
+
+if __name__ == "__main__":
+    test_pragmas_applied()
+    test_session_scope_rolls_back_on_error()
+    test_readers_responsive_during_ingest()
+    test_one_engine_per_database()
@@ -0,0 +1,129 @@
+import logging
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_collector import BarValidation, frame_to_bars, initialize_db
+from instrument_collector import write_bars
+from market_simulator import SimulatedMarketSource
+from intraday_collector import INTRADAY_INSTRUMENTS
+from storage import session_scope
+from streaming_validation import StreamingValidator, RollingCorrelation, write_validations
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def simulated_bars(ticker, start='2024-06-03', end='2024-06-08', interval='1m'):
+    source = SimulatedMarketSource(clock=lambda: pd.Timestamp('2024-06-10 17:00', tz='US/Eastern'))
+    return frame_to_bars(source.fetch(ticker, interval=interval, start=start, end=end))
+
+
+def test_flags_bad_bars_in_a_batch():
+    bars = simulated_bars('MBB')
+    validator = StreamingValidator()
+    history, batch = bars.iloc[:1000], bars.iloc[1000:1010].copy().reset_index(drop=True)
+    assert validator.validate('MBB', history)['passed'].all()
+
+    batch.loc[2, 'volume'] = 5
+    batch.loc[4, 'high'] = batch.loc[4, 'low'] * 1.05
+    batch.loc[6, 'low'] = batch.loc[6, 'close'] + 0.5
+    batch = batch.drop(index=8)
+    results = validator.validate('MBB', batch)
+    assert dict(zip(results['timestamp'], results['flags']))[batch.loc[4, 'timestamp']] == 'price_swing,range_outlier'
+    assert list(results['flags']) == ['', '', 'low_volume', '', 'price_swing,range_outlier', '', 'bad_prices', '', '']
+
+    # Replayed bars are out of order; in-session holes are gaps, overnight breaks are not
+    assert list(validator.validate('MBB', batch.iloc[-1:])['flags']) == ['out_of_order']
+    assert list(validator.validate('MBB', bars.iloc[1110:1112])['flags']) == ['gap', '']
+    assert validator.validate('MBB', bars.iloc[1112:1600])['passed'].all()
+    assert validator.stats('MBB')['median_volume'] > 100
+
+
+def test_running_correlation_matches_pandas():
+    rng = np.random.default_rng(3)
+    x, y = rng.normal(size=500), rng.normal(size=500)
+    y = 0.6 * x + 0.8 * y
+    rolling = RollingCorrelation(100)
+    for a, b in zip(x, y):
+        rolling.push(a, b)
+    assert abs(rolling.value() - np.corrcoef(x[-100:], y[-100:])[0, 1]) < 1e-9
+
+    # Pairs are matched by timestamp whichever instrument arrives first
+    mbb, tnx = simulated_bars('MBB'), simulated_bars('^TNX')
+    validator = StreamingValidator(correlation_window=2000)
+    for start in range(0, len(mbb), 200):
+        first, second = (mbb, tnx) if start % 400 else (tnx, mbb)
+        validator.validate('MBB' if first is mbb else '^TNX', first.iloc[start:start + 200])
+        validator.validate('MBB' if second is mbb else '^TNX', second.iloc[start:start + 200])
+    expected = mbb['close'].pct_change().corr(tnx['close'].pct_change())
+    stats = validator.stats('MBB')
+    assert stats['correlation_pairs'] == len(mbb) - 1
+    assert abs(stats['correlation'] - expected) < 1e-9
+
+
+def test_results_persist_and_state_primes_from_storage():
+    db_path = os.path.join(tempfile.mkdtemp(), 'stream.db')
+    initialize_db(db_path)
+    bars = simulated_bars('MBB')
+    daily = simulated_bars('MBB', interval='1d')
+
+    live = StreamingValidator()
+    with session_scope(db_path) as session:
+        write_bars(session, 'MBB', daily)
+        write_bars(session, 'MBB', bars.iloc[:1500])
+        write_validations(session, 'MBB', live.validate('MBB', bars.iloc[:1500]))
+
+    # A restarted validator rebuilds the same rolling state from market_bars
+    restarted = StreamingValidator()
+    with session_scope(db_path) as session:
+        restarted.prime(session, 'MBB', before=bars['timestamp'].iloc[1500], session_only=True)
+        batch = bars.iloc[1500:]
+        started = time.perf_counter()
+        expected, results = live.validate('MBB', batch), restarted.validate('MBB', batch)
+        assert time.perf_counter() - started < 1.0
+        write_validations(session, 'MBB', results)
+    pd.testing.assert_frame_equal(results, expected)
+
+    with session_scope(db_path) as session:
+        assert session.query(BarValidation).count() == len(bars)
+        assert session.query(BarValidation).filter(BarValidation.passed.is_(False)).count() == \
+            int((~expected['passed']).sum())
+
+
+def test_correlation_is_persisted_with_each_bar():
+    # The reference is collected intraday by default, so MBB bars always have a partner
+    validator = StreamingValidator()
+    assert validator.reference in INTRADAY_INSTRUMENTS
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'stream.db')
+    initialize_db(db_path)
+    mbb, tnx = simulated_bars('MBB').iloc[:600], simulated_bars('^TNX').iloc[:600]
+    with session_scope(db_path) as session:
+        write_validations(session, '^TNX', validator.validate('^TNX', tnx))
+        results = validator.validate('MBB', mbb)
+        write_validations(session, 'MBB', results)
+    assert results['correlation'].iloc[-1] == validator.stats('MBB')['correlation']
+
+    with session_scope(db_path) as session:
+        stored = dict(session.query(BarValidation.timestamp, BarValidation.correlation)
+                      .filter(BarValidation.ticker == 'MBB').all())
+        assert stored[mbb['timestamp'].iloc[-1]] == results['correlation'].iloc[-1]
+        assert sum(value is not None for value in stored.values()) > len(mbb) // 2
+        # The reference has no correlation with itself
+        assert session.query(BarValidation).filter(BarValidation.ticker == '^TNX',
+                                                   BarValidation.correlation.isnot(None)).count() == 0
+
+
+if __name__ == "__main__":
+    test_flags_bad_bars_in_a_batch()
+    test_running_correlation_matches_pandas()
+    test_results_persist_and_state_primes_from_storage()
+    test_correlation_is_persisted_with_each_bar()
@@ -0,0 +1,102 @@
+import logging
+import os
+import tempfile
+from datetime import datetime
+
+import pandas as pd
+
+from data_collector import frame_to_bars, initialize_db, QuarantinedBar
+from data_retention import archive_rows, enforce_data_retention
+from instrument_collector import write_bars
+from market_simulator import SimulatedMarketSource
+from storage import session_scope
+from tiered_storage import archive_partitions, read_bars
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def _tiered_db():
+    """2y3m of 5m MBB and VMBS bars, with everything older than a year archived"""
+    directory = tempfile.mkdtemp()
+    db_path, archive_dir = os.path.join(directory, 'tiered.db'), os.path.join(directory, 'archive')
+    initialize_db(db_path)
+
+    now = pd.Timestamp.now(tz='US/Eastern')
+    source = SimulatedMarketSource(clock=lambda: now)
+    start = (now - pd.DateOffset(years=2, months=3)).strftime('%Y-%m-%d')
+    bars = frame_to_bars(source.fetch('MBB', interval='5m', start=start)).sort_values('timestamp')
+    bars = bars.reset_index(drop=True)
+
+    # Quarantine one bar that will be archived and one that stays in SQLite
+    held = [bars['timestamp'].iloc[10], bars['timestamp'].iloc[-10]]
+    with session_scope(db_path) as session:
+        write_bars(session, 'MBB', bars)
+        write_bars(session, 'VMBS', bars)
+        for timestamp in held:
+            session.add(QuarantinedBar(ticker='MBB', timestamp=timestamp.to_pydatetime(), reasons='return',
+                                       score=9.0, detected_at=datetime.now()))
+
+    assert enforce_data_retention(db_path, retention_years=1, archive_dir=archive_dir, pause_seconds=0) > 0
+    return db_path, archive_dir, bars, held
+
+
+def test_merges_hot_and_cold_tiers():
+    db_path, archive_dir, bars, held = _tiered_db()
+
+    merged = read_bars('MBB', include_quarantined=True, db_path=db_path, archive_dir=archive_dir)
+    assert merged['timestamp'].is_monotonic_increasing
+    assert merged['timestamp'].is_unique
+    assert len(merged) == len(bars)
+    assert (merged['close'].to_numpy() == bars['close'].to_numpy()).all()
+
+    # Quarantined bars are dropped from both tiers
+    usable = read_bars('MBB', db_path=db_path, archive_dir=archive_dir)
+    assert len(usable) == len(bars) - 2
+    assert not usable['timestamp'].isin(held).any()
+
+    # A range spanning the boundary, with only the columns asked for
+    start, end = bars['timestamp'].iloc[len(bars) // 3], bars['timestamp'].iloc[2 * len(bars) // 3]
+    window = read_bars('VMBS', start=start, end=end, columns=['close'], db_path=db_path, archive_dir=archive_dir)
+    assert list(window.columns) == ['timestamp', 'close']
+    expected = bars[(bars['timestamp'] >= start) & (bars['timestamp'] < end)]
+    assert (window['close'].to_numpy() == expected['close'].to_numpy()).all()
+
+
+def test_prunes_partitions_and_skips_archive_for_recent_ranges():
+    db_path, archive_dir, bars, held = _tiered_db()
+
+    every_month = archive_partitions('mbb_coupons', archive_dir=archive_dir)
+    start = bars['timestamp'].iloc[0] + pd.DateOffset(months=2)
+    pruned = archive_partitions('mbb_coupons', start, start + pd.DateOffset(days=20), archive_dir)
+    assert 0 < len(pruned) < len(every_month)
+    assert all('month=' in path for path in pruned)
+
+    # Recent ranges are answered by SQLite alone, even with the archive gone
+    recent = bars['timestamp'].iloc[-500]
+    for path in every_month:
+        os.remove(path)
+    assert len(read_bars('MBB', start=recent, include_quarantined=True, db_path=db_path,
+                         archive_dir=archive_dir)) == 500
+
+
+def test_interrupted_retention_does_not_duplicate_bars():
+    db_path, archive_dir, bars, held = _tiered_db()
+
+    # Archive recent rows without deleting them, as a crash between the two steps would
+    recent = bars.tail(100).assign(_rowid=range(10**9, 10**9 + 100))
+    archive_rows(recent, 'mbb_coupons', archive_dir)
+
+    merged = read_bars('MBB', include_quarantined=True, db_path=db_path, archive_dir=archive_dir)
+    assert merged['timestamp'].is_unique
+    assert len(merged) == len(bars)
+
+
+if __name__ == "__main__":
+    test_merges_hot_and_cold_tiers()
+    test_prunes_partitions_and_skips_archive_for_recent_ranges()
+    test_interrupted_retention_does_not_duplicate_bars()
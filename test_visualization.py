@@ -0,0 +1,145 @@
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from visualization import BuydownVisualizer
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def _reference_payback_data(visualizer, data, loan_amount=300000):
+    """Row-by-row implementation the vectorized version must reproduce"""
+    result = []
+    for date, group in data.groupby('date'):
+        sorted_rates = sorted(group['original_rate'].unique(), reverse=True)
+        for i in range(len(sorted_rates) - 1):
+            current_rate = sorted_rates[i]
+            for j in range(1, min(len(sorted_rates) - i, 6)):
+                target_rate = sorted_rates[i + j]
+                rate_reduction = (current_rate - target_rate) * 10000
+                monthly_savings = (visualizer._calculate_monthly_payment(current_rate, loan_amount)
+                                   - visualizer._calculate_monthly_payment(target_rate, loan_amount))
+                payback_1pt = loan_amount * 0.01 / monthly_savings if monthly_savings > 0 else float('inf')
+                payback_2pt = loan_amount * 0.02 / monthly_savings if monthly_savings > 0 else float('inf')
+                quality = []
+                for reduction, payback in ((rate_reduction, payback_1pt), (rate_reduction / 2.0, payback_2pt)):
+                    if reduction >= 35:
+                        quality.append('Great' if payback / 12 <= 3.5 else 'Good')
+                    elif reduction >= 25:
+                        quality.append('Neutral')
+                    else:
+                        quality.append('Bad')
+                result.append({
+                    'date': date,
+                    'original_rate': current_rate,
+                    'target_rate': target_rate,
+                    'monthly_savings_1pt': monthly_savings,
+                    'payback_years_1pt': payback_1pt / 12,
+                    'payback_years_2pt': payback_2pt / 12,
+                    'deal_quality_1pt': quality[0],
+                    'deal_quality_2pt': quality[1]
+                })
+    return pd.DataFrame(result)
+
+
+def _sample_rates(days=252, rates_per_day=40, seed=7):
+    rng = np.random.default_rng(seed)
+    dates = np.repeat(pd.bdate_range('2024-01-02', periods=days), rates_per_day)
+    rates = np.round(rng.uniform(0.055, 0.075, size=len(dates)), 3)
+    return pd.DataFrame({'date': dates, 'original_rate': rates, 'original_price': 600 / (rates * 100)})
+
+
+def test_prepare_payback_data_matches_reference():
+    """Vectorized pairs must match the row-by-row implementation exactly"""
+    visualizer = BuydownVisualizer()
+    data = _sample_rates(days=10, rates_per_day=12)
+
+    expected = _reference_payback_data(visualizer, data)
+    actual = visualizer.prepare_payback_data(data)
+
+    assert list(actual.columns) == BuydownVisualizer.PAYBACK_COLUMNS
+    assert len(actual) == len(expected)
+    for column in expected.columns:
+        if not pd.api.types.is_numeric_dtype(expected[column]):
+            assert list(actual[column]) == list(expected[column]), column
+        else:
+            np.testing.assert_allclose(actual[column].astype(float), expected[column].astype(float),
+                                       err_msg=column)
+
+
+def test_prepare_payback_data_empty():
+    visualizer = BuydownVisualizer()
+    empty = pd.DataFrame({'date': pd.to_datetime([]), 'original_rate': [], 'original_price': []})
+    result = visualizer.prepare_payback_data(empty)
+    assert result.empty
+    assert list(result.columns) == BuydownVisualizer.PAYBACK_COLUMNS
+
+
+def _coupon_ladder(days=20, seed=7):
+    """Implied rates in 10bps steps (5.5% to 7.0%) with a little daily drift, as decimals"""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2024-01-02', periods=days)
+    ladder = np.round(np.arange(0.055, 0.0705, 0.001), 4)
+    drift = np.round(rng.uniform(-0.0005, 0.0005, size=days), 4)
+    rates = (ladder[None, :] + drift[:, None]).ravel()
+    return pd.DataFrame({'date': np.repeat(dates, len(ladder)), 'original_rate': rates,
+                         'original_price': 600 / (rates * 100)})
+
+
+def test_deal_quality_uses_basis_points():
+    """Reductions are in bps: a 50bps cut for one point is Great, 30bps is Neutral, 10bps is Bad"""
+    visualizer = BuydownVisualizer()
+    rates = [0.065, 0.064, 0.062, 0.060]
+    data = pd.DataFrame({'date': pd.Timestamp('2024-01-02'), 'original_rate': rates,
+                         'original_price': [600 / (rate * 100) for rate in rates]})
+    payback = visualizer.prepare_payback_data(data).set_index(['original_rate', 'target_rate'])
+
+    assert payback.loc[(0.065, 0.060), 'rate_reduction_1pt'] == pytest.approx(50)
+    assert payback.loc[(0.065, 0.060), 'deal_quality_1pt'] == 'Great'
+    assert payback.loc[(0.065, 0.062), 'deal_quality_1pt'] == 'Neutral'
+    assert payback.loc[(0.065, 0.064), 'deal_quality_1pt'] == 'Bad'
+    assert payback.loc[(0.065, 0.060), 'deal_quality_2pt'] != 'Bad'
+
+
+def test_select_top_deals():
+    """Partial top-k selection must agree with a full sort"""
+    visualizer = BuydownVisualizer()
+    payback = visualizer.prepare_payback_data(_coupon_ladder())
+
+    top = visualizer.select_top_deals(payback, k=5)
+    good = payback[payback['deal_quality_1pt'].isin(['Great', 'Good'])]
+    expected = good.sort_values('payback_years_1pt', kind='stable').head(5)
+
+    assert len(good) > 5
+    assert len(top) == 5
+    assert set(top['deal_quality_1pt']) <= {'Great', 'Good'}
+    np.testing.assert_allclose(top['payback_years_1pt'], expected['payback_years_1pt'])
+
+
+def test_payback_year_of_data_is_fast():
+    visualizer = BuydownVisualizer()
+    data = _sample_rates()
+
+    t0 = time.perf_counter()
+    payback = visualizer.prepare_payback_data(data)
+    visualizer.select_top_deals(payback, k=5)
+    elapsed = time.perf_counter() - t0
+
+    logger.info(f"Payback data for {len(data)} quotes -> {len(payback)} pairs in {elapsed * 1000:.1f} ms")
+    assert elapsed < 0.5
+
+
+if __name__ == "__main__":
+    test_prepare_payback_data_matches_reference()
+    test_prepare_payback_data_empty()
+    test_deal_quality_uses_basis_points()
+    test_select_top_deals()
+    test_payback_year_of_data_is_fast()
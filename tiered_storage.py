@@ -0,0 +1,205 @@
+import glob
+import logging
+import os
+
+from sqlalchemy import func
+
+from data_collector import MarketBar, MBBCoupon, QuarantinedBar, not_quarantined, BAR_COLUMNS
+from data_retention import RETENTION_ARCHIVE_DIR
+from storage import session_scope
+
+logger = logging.getLogger(__name__)
+
+# Recent bars live in SQLite (the hot tier); data_retention moves expired bars
+# to month-partitioned Parquet under RETENTION_ARCHIVE_DIR (the cold tier).
+# read_bars answers a time-range query from whichever tiers it overlaps.
+
+
+def _month_start(timestamp):
+    import pandas as pd
+    return pd.Timestamp(timestamp).to_period('M').to_timestamp()
+
+
+def archive_partitions(table, start=None, end=None, archive_dir=None):
+    """
+    Parquet files of an archived table whose month overlaps [start, end)
+
+    Partitions are pruned by their year=/month= directory names alone, so
+    months outside the range are never opened.
+
+    Args:
+        table: Archived table name
+        start: Range start (default: unbounded)
+        end: Range end, exclusive (default: unbounded)
+        archive_dir: Archive root (default: RETENTION_ARCHIVE_DIR)
+
+    Returns:
+        Sorted list of file paths
+    """
+    import pandas as pd
+
+    first = _month_start(start) if start is not None else None
+    last = pd.Timestamp(end) if end is not None else None
+    paths = []
+    for directory in glob.glob(os.path.join(archive_dir or RETENTION_ARCHIVE_DIR, table, 'year=*', 'month=*')):
+        month_dir, year_dir = os.path.basename(directory), os.path.basename(os.path.dirname(directory))
+        try:
+            month = pd.Timestamp(year=int(year_dir[len('year='):]), month=int(month_dir[len('month='):]), day=1)
+        except ValueError:
+            continue
+        if (first is not None and month < first) or (last is not None and month >= last):
+            continue
+        paths.extend(glob.glob(os.path.join(directory, '*.parquet')))
+    return sorted(paths)
+
+
+def _read_archive(table, start, end, columns, ticker=None, archive_dir=None):
+    """Rows of an archived table in [start, end), reading only the requested columns"""
+    import pandas as pd
+
+    filters = []
+    if start is not None:
+        filters.append(('timestamp', '>=', pd.Timestamp(start)))
+    if end is not None:
+        filters.append(('timestamp', '<', pd.Timestamp(end)))
+    if ticker is not None:
+        filters.append(('ticker', '==', ticker))
+
+    # Row-group statistics let the reader skip chunks outside the filters
+    frames = [
+        pd.read_parquet(path, columns=columns, filters=filters or None)
+        for path in archive_partitions(table, start, end, archive_dir)
+    ]
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)
+
+
+def _read_hot(session, ticker, start, end, columns, include_quarantined):
+    import pandas as pd
+
+    model = MBBCoupon if ticker == 'MBB' else MarketBar
+    query = session.query(*[getattr(model, col) for col in columns])
+    if model is MarketBar:
+        query = query.filter(MarketBar.ticker == ticker)
+    if start is not None:
+        query = query.filter(model.timestamp >= start)
+    if end is not None:
+        query = query.filter(model.timestamp < end)
+    if not include_quarantined:
+        query = query.filter(not_quarantined(model, ticker))
+    return pd.DataFrame(query.order_by(model.timestamp).all(), columns=columns)
+
+
+def _hot_start(session, ticker):
+    """Oldest bar still in SQLite; everything before it has been archived"""
+    model = MBBCoupon if ticker == 'MBB' else MarketBar
+    query = session.query(func.min(model.timestamp))
+    if model is MarketBar:
+        query = query.filter(MarketBar.ticker == ticker)
+    return query.scalar()
+
+
+def hot_extent(ticker='MBB', session=None, db_path=None):
+    """
+    Row count and timestamp span of an instrument's bars in SQLite (the hot tier)
+
+    Returns:
+        (rows, first, last); first and last are None when nothing is stored
+    """
+    if session is None:
+        with session_scope(db_path) as session:
+            return hot_extent(ticker, session)
+
+    model = MBBCoupon if ticker == 'MBB' else MarketBar
+    query = session.query(func.count(), func.min(model.timestamp), func.max(model.timestamp))
+    if model is MarketBar:
+        query = query.filter(MarketBar.ticker == ticker)
+    rows, first, last = query.one()
+    return rows, first, last
+
+
+def quarantined_timestamps(ticker='MBB', start=None, end=None, session=None, db_path=None, archive_dir=None):
+    """
+    Timestamps of quarantined bars in [start, end), from SQLite and the archive
+
+    Retention archives quarantine rows alongside the bars they hold back, so
+    ranges reaching back before the oldest SQLite bar also read the archived
+    quarantine partitions they overlap.
+
+    Returns:
+        Series of timestamps (datetime64), unordered
+    """
+    import pandas as pd
+
+    if session is None:
+        with session_scope(db_path) as session:
+            return quarantined_timestamps(ticker, start, end, session, db_path, archive_dir)
+
+    query = session.query(QuarantinedBar.timestamp).filter(QuarantinedBar.ticker == ticker)
+    if start is not None:
+        query = query.filter(QuarantinedBar.timestamp >= start)
+    if end is not None:
+        query = query.filter(QuarantinedBar.timestamp < end)
+    held = pd.Series([row[0] for row in query.all()], dtype='datetime64[ns]')
+
+    hot_start = _hot_start(session, ticker)
+    if hot_start is None or start is None or pd.Timestamp(start) < hot_start:
+        archived = _read_archive('quarantined_bars', start, end, ['timestamp'], ticker, archive_dir)
+        if not archived.empty:
+            held = pd.concat([held, pd.to_datetime(archived['timestamp'])], ignore_index=True)
+    return held
+
+
+def read_bars(ticker='MBB', start=None, end=None, columns=None, include_quarantined=False, session=None,
+              db_path=None, archive_dir=None):
+    """
+    Bars for a time range, merged from SQLite and the Parquet archive
+
+    Ranges that start at or after the oldest bar still in SQLite never touch
+    the archive. Older ranges read only the month partitions they overlap,
+    and only the requested columns of those, up to the oldest SQLite bar;
+    rows archived but not yet deleted (an interrupted retention run) are
+    therefore read from SQLite only, never twice.
+
+    Args:
+        ticker: Instrument (MBB reads mbb_coupons, others market_bars)
+        start: Range start (default: unbounded)
+        end: Range end, exclusive (default: unbounded)
+        columns: Bar columns to return (default: BAR_COLUMNS); timestamp is always included
+        include_quarantined: Keep bars the anomaly detector quarantined
+        session: Session to read SQLite with (default: a new session on db_path)
+        db_path: Database file (default: MBB_DB_PATH)
+        archive_dir: Archive root (default: RETENTION_ARCHIVE_DIR)
+
+    Returns:
+        DataFrame with the requested columns in timestamp order
+    """
+    import pandas as pd
+
+    columns = ['timestamp'] + [col for col in (columns or BAR_COLUMNS) if col != 'timestamp']
+    if session is None:
+        with session_scope(db_path) as session:
+            return read_bars(ticker, start, end, columns, include_quarantined, session, db_path, archive_dir)
+
+    hot = _read_hot(session, ticker, start, end, columns, include_quarantined)
+    hot_start = _hot_start(session, ticker)
+    if hot_start is not None and start is not None and pd.Timestamp(start) >= hot_start:
+        return hot
+
+    cold_end = hot_start if end is None or (hot_start is not None and hot_start < pd.Timestamp(end)) else end
+    table, table_ticker = ('mbb_coupons', None) if ticker == 'MBB' else ('market_bars', ticker)
+    cold = _read_archive(table, start, cold_end, columns, table_ticker, archive_dir)
+    if cold.empty:
+        return hot
+
+    if not include_quarantined:
+        held = quarantined_timestamps(ticker, start, cold_end, session, archive_dir=archive_dir)
+        cold = cold[~pd.to_datetime(cold['timestamp']).isin(held)]
+
+    logger.debug(f"Read {len(cold)} archived and {len(hot)} stored {ticker} bars")
+    cold = cold.assign(timestamp=pd.to_datetime(cold['timestamp']))
+    hot = hot.assign(timestamp=pd.to_datetime(hot['timestamp']))
+    frames = [frame for frame in (cold.sort_values('timestamp'), hot) if not frame.empty]
+    return pd.concat(frames, ignore_index=True)
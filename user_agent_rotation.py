@@ -2,6 +2,8 @@ import random
 import logging
 import time
 
+from rate_limiter import TokenBucket
+
 logger = logging.getLogger(__name__)
 
 class UserAgentRotator:
@@ -23,9 +25,17 @@ class UserAgentRotator:
             "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36 Edg/91.0.864.59"
         ]
         self.last_used_index = -1
-        self.request_timestamps = []
         self.min_delay_seconds = 3  # Minimum delay between requests
     
+    @property
+    def min_delay_seconds(self):
+        return self._min_delay_seconds
+    
+    @min_delay_seconds.setter
+    def min_delay_seconds(self, seconds):
+        self._min_delay_seconds = seconds
+        self._bucket = TokenBucket(1.0 / seconds) if seconds > 0 else None
+    
     def get_next_user_agent(self):
         """Get the next user agent in rotation"""
         self.last_used_index = (self.last_used_index + 1) % len(self.user_agents)
@@ -38,24 +48,8 @@ class UserAgentRotator:
     def wait_if_needed(self):
         """
         Enforce delay between requests to comply with rate limits
-        Returns the number of seconds waited
+        Returns the time the request may go out (after any wait)
         """
-        now = time.time()
-        
-        # Clean up old timestamps (older than 60 seconds)
-        self.request_timestamps = [ts for ts in self.request_timestamps if now - ts < 60]
-        
-        # If we have recent requests, check if we need to wait
-        if self.request_timestamps:
-            last_request = max(self.request_timestamps)
-            time_since_last = now - last_request
-            
-            if time_since_last < self.min_delay_seconds:
-                wait_time = self.min_delay_seconds - time_since_last
-                logger.debug(f"Rate limiting: Waiting {wait_time:.2f} seconds")
-                time.sleep(wait_time)
-                now = time.time()  # Update current time after waiting
-        
-        # Record this request
-        self.request_timestamps.append(now)
-        return now
\ No newline at end of file
+        if self._bucket is not None:
+            self._bucket.acquire()
+        return time.time()
@@ -1,9 +1,5 @@
-import matplotlib.pyplot as plt
-import pandas as pd
-import numpy as np
 import io
 import base64
-from matplotlib.figure import Figure
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,6 +9,18 @@ class BuydownVisualizer:
     Creates visualizations for mortgage rate buydown analysis
     """
     
+    # Column order of the frame returned by prepare_payback_data
+    PAYBACK_COLUMNS = [
+        'date', 'original_rate', 'target_rate',
+        'rate_reduction_1pt', 'rate_reduction_2pt',
+        'reduction_per_point_1pt', 'reduction_per_point_2pt',
+        'buydown_cost_1pt', 'buydown_cost_2pt',
+        'monthly_savings_1pt', 'monthly_savings_2pt',
+        'payback_months_1pt', 'payback_months_2pt',
+        'payback_years_1pt', 'payback_years_2pt',
+        'deal_quality_1pt', 'deal_quality_2pt'
+    ]
+    
     def __init__(self, theme='default'):
         """
         Initialize visualizer with theme settings
@@ -21,10 +29,23 @@ class BuydownVisualizer:
             theme: Visual theme ('default', 'dark', 'light')
         """
         self.theme = theme
-        self._setup_theme()
+        self._plt = None
+    
+    def _pyplot(self):
+        """
+        Import pyplot and apply the theme on first use
+        
+        matplotlib is slow to import, so it is only loaded once a chart is drawn.
+        """
+        if self._plt is None:
+            import matplotlib.pyplot as plt
+            self._plt = plt
+            self._setup_theme()
+        return self._plt
     
     def _setup_theme(self):
         """Configure matplotlib theme based on settings"""
+        plt = self._plt
         if self.theme == 'dark':
             plt.style.use('dark_background')
         elif self.theme == 'light':
@@ -44,6 +65,7 @@ class BuydownVisualizer:
         Returns:
             Matplotlib figure
         """
+        plt = self._pyplot()
         fig, ax = plt.subplots(figsize=figsize)
         
         # Plot ROI vs original rate
@@ -79,6 +101,7 @@ class BuydownVisualizer:
         Returns:
             Matplotlib figure
         """
+        plt = self._pyplot()
         fig, ax = plt.subplots(figsize=figsize)
         
         # Filter data if rate is specified
@@ -136,6 +159,7 @@ class BuydownVisualizer:
         Returns:
             Matplotlib figure
         """
+        plt = self._pyplot()
         fig, ax = plt.subplots(figsize=figsize)
         
         # Calculate cost per basis point if needed
@@ -208,7 +232,6 @@ class BuydownVisualizer:
             Enhanced figure with tooltips
         """
         from matplotlib.backend_bases import MouseEvent
-        import matplotlib.pyplot as plt
         
         # Create annotation object for tooltip
         annot = fig.axes[0].annotate("", xy=(0, 0), xytext=(20, 20),
@@ -272,6 +295,8 @@ class BuydownVisualizer:
         Returns:
             Filtered DataFrame
         """
+        import pandas as pd
+        
         filtered_data = data.copy()
         
         if start_date is not None:
@@ -355,6 +380,7 @@ class BuydownVisualizer:
         Returns:
             Matplotlib figure
         """
+        plt = self._pyplot()
         fig, ax = plt.subplots(figsize=figsize)
         
         # Calculate payback periods
@@ -401,115 +427,148 @@ class BuydownVisualizer:
         
         return fig
     
-    def prepare_payback_data(self, data, loan_amount=300000):
+    def prepare_payback_data(self, data, loan_amount=300000, max_steps=5):
         """
         Prepare data for payback period comparison visualization
         
+        For every date, each rate is paired with the next ``max_steps`` lower
+        rates (10bps increments). All pairs for all dates are computed at once
+        with array operations.
+        
         Args:
-            data: DataFrame with historical rate and price data
+            data: DataFrame with date, original_rate (decimal, e.g. 0.065) and
+                  original_price columns
             loan_amount: Loan amount for calculations
+            max_steps: Number of lower rates to pair each rate with
             
         Returns:
             DataFrame with payback periods and rate reductions
         """
-        result = []
+        import numpy as np
+        import pandas as pd
+        
+        # One price per (date, rate): the first observation, highest rate first
+        quotes = data[['date', 'original_rate', 'original_price']].dropna(subset=['date', 'original_rate'])
+        quotes = quotes.drop_duplicates(subset=['date', 'original_rate'], keep='first')
+        quotes = quotes.sort_values(['date', 'original_rate'], ascending=[True, False], kind='stable')
+        
+        dates = quotes['date'].to_numpy()
+        rates = quotes['original_rate'].to_numpy(dtype=float)
+        date_codes = pd.factorize(quotes['date'], sort=True)[0]
+        n = len(rates)
+        
+        # Pair row i with row i + step while both rows belong to the same date
+        current_idx, target_idx = [], []
+        positions = np.arange(n)
+        for step in range(1, max_steps + 1):
+            candidates = positions[:n - step] if n > step else positions[:0]
+            same_date = date_codes[candidates] == date_codes[candidates + step]
+            current_idx.append(candidates[same_date])
+            target_idx.append(candidates[same_date] + step)
+        
+        current_idx = np.concatenate(current_idx) if current_idx else np.array([], dtype=int)
+        target_idx = np.concatenate(target_idx) if target_idx else np.array([], dtype=int)
+        
+        # Order by date, then current rate, then step (as the row-by-row version did)
+        order = np.lexsort((target_idx, current_idx))
+        current_idx = current_idx[order]
+        target_idx = target_idx[order]
+        
+        payments = self._calculate_monthly_payment(rates, loan_amount)
+        monthly_savings = payments[current_idx] - payments[target_idx]
+        rate_reduction = (rates[current_idx] - rates[target_idx]) * 10000  # Decimal rates to basis points
+        
+        buydown_cost_1pt = loan_amount * 0.01  # 1% of loan amount
+        buydown_cost_2pt = loan_amount * 0.02  # 2% of loan amount
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            payback_months_1pt = np.where(monthly_savings > 0, buydown_cost_1pt / monthly_savings, np.inf)
+            payback_months_2pt = np.where(monthly_savings > 0, buydown_cost_2pt / monthly_savings, np.inf)
+        
+        # Determine deal quality based on rate reduction per point
+        # Bad deal: 100bps for 0.25% reduction or less
+        # Good deal: 100bps for 0.35% reduction or more
+        # Great deal: Payback period of 1-3.5 years
+        def deal_quality(reduction_per_point, payback_months):
+            return np.select(
+                [(reduction_per_point >= 35) & (payback_months / 12 <= 3.5),
+                 reduction_per_point >= 35,
+                 reduction_per_point >= 25],
+                ['Great', 'Good', 'Neutral'],
+                default='Bad'
+            )
+        
+        reduction_per_point_1pt = rate_reduction / 1.0
+        reduction_per_point_2pt = rate_reduction / 2.0
+        
+        return pd.DataFrame({
+            'date': dates[current_idx],
+            'original_rate': rates[current_idx],
+            'target_rate': rates[target_idx],
+            'rate_reduction_1pt': rate_reduction,
+            'rate_reduction_2pt': rate_reduction,
+            'reduction_per_point_1pt': reduction_per_point_1pt,
+            'reduction_per_point_2pt': reduction_per_point_2pt,
+            'buydown_cost_1pt': np.full(len(current_idx), buydown_cost_1pt),
+            'buydown_cost_2pt': np.full(len(current_idx), buydown_cost_2pt),
+            'monthly_savings_1pt': monthly_savings,
+            'monthly_savings_2pt': monthly_savings,
+            'payback_months_1pt': payback_months_1pt,
+            'payback_months_2pt': payback_months_2pt,
+            'payback_years_1pt': payback_months_1pt / 12,
+            'payback_years_2pt': payback_months_2pt / 12,
+            'deal_quality_1pt': deal_quality(reduction_per_point_1pt, payback_months_1pt),
+            'deal_quality_2pt': deal_quality(reduction_per_point_2pt, payback_months_2pt)
+        }, columns=self.PAYBACK_COLUMNS)
+    
+    def select_top_deals(self, payback_data, k=5, qualities=('Great', 'Good'), points=1):
+        """
+        Select the k deals with the shortest payback without sorting every row
         
-        # Group by date
-        for date, group in data.groupby('date'):
-            # Sort rates from highest to lowest
-            sorted_rates = sorted(group['original_rate'].unique(), reverse=True)
-            sorted_prices = [group[group['original_rate'] == rate]['original_price'].iloc[0] for rate in sorted_rates]
+        Args:
+            payback_data: DataFrame from prepare_payback_data
+            k: Number of deals to return
+            qualities: Deal quality labels to consider
+            points: Which buydown to rank by (1 or 2 points)
             
-            # Calculate for each rate (except the lowest)
-            for i in range(len(sorted_rates) - 1):
-                # Current rate and price
-                current_rate = sorted_rates[i]
-                current_price = sorted_prices[i]
-                
-                # Calculate 10bps increments
-                for j in range(1, min(len(sorted_rates) - i, 6)):  # Up to 50bps in 10bps increments
-                    target_rate = sorted_rates[i + j]
-                    target_price = sorted_prices[i + j]
-                    rate_reduction = (current_rate - target_rate) * 100  # Convert to basis points
-                    
-                    # Calculate for 1-point buydown
-                    buydown_cost_1pt = loan_amount * 0.01  # 1% of loan amount
-                    
-                    # Calculate for 2-point buydown
-                    buydown_cost_2pt = loan_amount * 0.02  # 2% of loan amount
-                    
-                    # Calculate monthly payment at both rates
-                    payment_current = self._calculate_monthly_payment(current_rate, loan_amount)
-                    payment_target = self._calculate_monthly_payment(target_rate, loan_amount)
-                    monthly_savings = payment_current - payment_target
-                    
-                    # Calculate payback periods
-                    payback_months_1pt = buydown_cost_1pt / monthly_savings if monthly_savings > 0 else float('inf')
-                    payback_months_2pt = buydown_cost_2pt / monthly_savings if monthly_savings > 0 else float('inf')
-                    
-                    # Determine deal quality based on rate reduction per point
-                    # Bad deal: 100bps for 0.25% reduction or less
-                    # Good deal: 100bps for 0.35% reduction or more
-                    # Great deal: Payback period of 1-3.5 years
-                    
-                    # For 1-point buydown
-                    reduction_per_point_1pt = rate_reduction / 1.0
-                    if reduction_per_point_1pt >= 35:  # 0.35% or more reduction per point
-                        deal_quality_1pt = 'Great' if payback_months_1pt/12 <= 3.5 else 'Good'
-                    elif reduction_per_point_1pt >= 25:  # 0.25% reduction per point
-                        deal_quality_1pt = 'Neutral'
-                    else:
-                        deal_quality_1pt = 'Bad'
-                    
-                    # For 2-point buydown
-                    reduction_per_point_2pt = rate_reduction / 2.0
-                    if reduction_per_point_2pt >= 35:  # 0.35% or more reduction per point
-                        deal_quality_2pt = 'Great' if payback_months_2pt/12 <= 3.5 else 'Good'
-                    elif reduction_per_point_2pt >= 25:  # 0.25% reduction per point
-                        deal_quality_2pt = 'Neutral'
-                    else:
-                        deal_quality_2pt = 'Bad'
-                    
-                    # Store results
-                    result.append({
-                        'date': date,
-                        'original_rate': current_rate,
-                        'target_rate': target_rate,
-                        'rate_reduction_1pt': rate_reduction,
-                        'rate_reduction_2pt': rate_reduction,
-                        'reduction_per_point_1pt': reduction_per_point_1pt,
-                        'reduction_per_point_2pt': reduction_per_point_2pt,
-                        'buydown_cost_1pt': buydown_cost_1pt,
-                        'buydown_cost_2pt': buydown_cost_2pt,
-                        'monthly_savings_1pt': monthly_savings,
-                        'monthly_savings_2pt': monthly_savings,
-                        'payback_months_1pt': payback_months_1pt,
-                        'payback_months_2pt': payback_months_2pt,
-                        'payback_years_1pt': payback_months_1pt / 12,
-                        'payback_years_2pt': payback_months_2pt / 12,
-                        'deal_quality_1pt': deal_quality_1pt,
-                        'deal_quality_2pt': deal_quality_2pt
-                    })
-        
-        return pd.DataFrame(result)
+        Returns:
+            DataFrame with at most k rows, shortest payback first
+        """
+        import numpy as np
+        
+        quality = payback_data[f'deal_quality_{points}pt'].to_numpy()
+        payback = payback_data[f'payback_years_{points}pt'].to_numpy(dtype=float)
+        
+        candidates = np.flatnonzero(np.isin(quality, list(qualities)))
+        if len(candidates) > k:
+            # Partial selection of the k smallest, then sort only those k
+            candidates = candidates[np.argpartition(payback[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(payback[candidates], kind='stable')]
+        
+        return payback_data.iloc[candidates]
     
     def _calculate_monthly_payment(self, annual_rate, loan_amount, loan_term_years=30):
         """
         Calculate monthly mortgage payment
         
         Args:
-            annual_rate: Annual interest rate (decimal)
+            annual_rate: Annual interest rate (decimal), scalar or array
             loan_amount: Loan principal amount
             loan_term_years: Loan term in years
             
         Returns:
-            Monthly payment amount
+            Monthly payment amount (array if annual_rate is an array)
         """
+        import numpy as np
+        
         loan_term_months = loan_term_years * 12
-        monthly_rate = annual_rate / 12
+        monthly_rate = np.asarray(annual_rate, dtype=float) / 12
         
-        if monthly_rate == 0:
-            return loan_amount / loan_term_months
-            
-        payment = (monthly_rate * loan_amount) / (1 - (1 + monthly_rate) ** -loan_term_months)
-        return payment
\ No newline at end of file
+        with np.errstate(divide='ignore', invalid='ignore'):
+            payment = np.where(
+                monthly_rate == 0,
+                loan_amount / loan_term_months,
+                (monthly_rate * loan_amount) / (1 - (1 + monthly_rate) ** -loan_term_months)
+            )
+        
+        return payment if payment.ndim else float(payment)
\ No newline at end of file